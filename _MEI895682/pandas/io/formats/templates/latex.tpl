@@ -1,5 +0,0 @@
-{% if environment == "longtable" %}
-{% include "latex_longtable.tpl" %}
-{% else %}
-{% include "latex_table.tpl" %}
-{% endif %}
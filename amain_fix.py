@@ -8,16 +8,20 @@ import pandas as pd
 import os
 import sys
 
+import po_trace
+
 def format_amain_csv(input_file, output_file=None):
     """Process an input file into AMAIN format with no headers"""
     print(f"Reading {input_file}...")
     
     # Try to read the input file
     try:
-        if input_file.lower().endswith('.csv'):
-            df = pd.read_csv(input_file)
-        else:
-            df = pd.read_excel(input_file)
+        with po_trace.stage('read', file=input_file) as stage:
+            if input_file.lower().endswith('.csv'):
+                df = pd.read_csv(input_file)
+            else:
+                df = pd.read_excel(input_file)
+            stage.set(rows=len(df), columns=df.shape[1])
     except Exception as e:
         print(f"Error reading file: {str(e)}")
         return
@@ -25,8 +29,9 @@ def format_amain_csv(input_file, output_file=None):
     print(f"Found {len(df)} rows in file")
     
     # Try to find SKU and QTY columns
-    sku_columns = [col for col in df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
-    qty_columns = [col for col in df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
+    with po_trace.stage('column detection', columns=df.shape[1]):
+        sku_columns = [col for col in df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
+        qty_columns = [col for col in df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
     
     if not sku_columns or not qty_columns:
         print("Error: Could not find SKU and QTY columns. File must have columns for item SKU and quantity.")
@@ -43,22 +48,33 @@ def format_amain_csv(input_file, output_file=None):
         base = os.path.splitext(input_file)[0]
         output_file = f"{base}_AMAIN_fixed.csv"
     
-    # Write the CSV file without headers
-    with open(output_file, 'w') as f:
-        # Write each row without headers
-        for _, row in df.iterrows():
-            f.write(f"{row[sku_col]},{row[qty_col]}\n")
+    # Build all rows column-wise, then write the CSV without headers in one go
+    with po_trace.stage('transform', vendor='AMAIN') as stage:
+        skus = df[sku_col].tolist()
+        qtys = df[qty_col].tolist()
+        content = ''.join([f"{sku},{qty}\n" for sku, qty in zip(skus, qtys)])
+        stage.set(rows=len(skus))
+    
+    with po_trace.stage('write', file=output_file, bytes=len(content)):
+        with open(output_file, 'w') as f:
+            f.write(content)
     
     print(f"Successfully created AMAIN-compatible file: {output_file}")
     print("This file format will work with AMAIN's import system without 'Invalid quantity found' errors")
 
 if __name__ == "__main__":
+    # --trace PATH [--trace-format json|chrome] records each stage
+    trace_options, argv = po_trace.parse_known_args(sys.argv[1:])
+    po_trace.start(trace_options)
+    
     # Check if a file was provided
-    if len(sys.argv) < 2:
-        print("Usage: python amain_fix.py <input_file.csv>")
+    if len(argv) < 1:
+        print("Usage: python amain_fix.py <input_file.csv> [output_file] [--trace trace.json]")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
+    input_file = argv[0]
+    output_file = argv[1] if len(argv) > 1 else None
+    
+    format_amain_csv(input_file, output_file)
     
-    format_amain_csv(input_file, output_file) 
\ No newline at end of file
+    po_trace.finish(trace_options)
\ No newline at end of file
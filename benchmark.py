@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Formatter throughput benchmark
+
+Synthesises POs in CSV, XLSX and INV form and times each stage separately:
+reading the file, column/vendor detection, each vendor formatter and writing
+its output. Every case runs in a fresh process so its peak RSS can be
+reported. Results can be saved as JSON and compared with an earlier run to
+spot regressions between commits.
+
+Usage:
+    python benchmark.py [--rows 10 1000 100000] [--formats csv xlsx inv]
+                        [--json results.json] [--compare baseline.json]
+    python benchmark.py --writers [--rows 1000 100000]
+    python benchmark.py --fast-csv [--rows 100000 1000000]
+
+--writers times the FastServe/Stephens SKU/QTY line writer against the
+previous row-by-row iterrows implementation instead. --fast-csv times a
+whole CSV to FastServe conversion three ways: read_csv plus the iterrows
+writer, the chunked pandas stream and the memory-mapped fast path.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import po_engine
+from create_sample_data import SAMPLE_DATA
+
+
+# Synthetic input layouts: the FastServe export and the sample PO workbook
+LAYOUTS = ['fastserve', 'sample']
+
+FORMATS = ['csv', 'xlsx', 'inv']
+
+# Rows in the FastServe layout template (see 17633_FastServe.csv)
+FASTSERVE_TEMPLATE = {
+    'PO_NUMBER': [17633, 17633, 17633],
+    'ITEM_NUMBER': ['AAN1828', 'AAN244', 'TRA8219'],
+    'DESCRIPTION': [
+        '1/150 Convair Space Shuttlecraft w/Launching Pad, Figures & Base (formerly Revell)',
+        '1/136 Martin P6M Seamaster Seaplane (formerly Revell)',
+        'Body, Ford Bronco, Clear',
+    ],
+    'QTY': [1, 1, 2],
+    'UNIT_PRICE': [24.99, 21.99, 59.95],
+    'TOTAL': [24.99, 21.99, 119.9],
+}
+
+# A stage slower than the baseline by more than this ratio is a regression
+REGRESSION_RATIO = 1.25
+
+# Stages faster than this (seconds) are too noisy to compare
+MIN_COMPARE_SECONDS = 0.01
+
+
+def iterrows_lines(formatted_df):
+    """The original row-by-row writer, kept as the baseline"""
+    lines = []
+    for index, row in formatted_df.iterrows():
+        lines.append(str(row['Sku']))
+        lines.append(str(int(row['Qty'])))
+    return lines
+
+
+def sample_frame(rows):
+    """A Sku/Qty frame shaped like a vendor PO"""
+    return pd.DataFrame({
+        'Sku': [f"AAN{index}" for index in range(rows)],
+        'Qty': [index % 12 + 1 for index in range(rows)],
+    })
+
+
+def synthetic_po(layout, rows):
+    """
+    A PO of the given size in one of the LAYOUTS
+
+    Template rows are repeated to the requested size and the SKU column is
+    made unique. Every fourth sample SKU has a Traxxas color suffix so the
+    variant template path is exercised too.
+    """
+    template = pd.DataFrame(FASTSERVE_TEMPLATE if layout == 'fastserve' else SAMPLE_DATA)
+    df = template.iloc[[index % len(template) for index in range(rows)]].reset_index(drop=True)
+
+    if layout == 'fastserve':
+        df['ITEM_NUMBER'] = [f"{sku}-{index}" for index, sku in enumerate(df['ITEM_NUMBER'])]
+        df['TOTAL'] = (df['QTY'] * df['UNIT_PRICE']).round(2)
+    else:
+        colors = list(po_engine.TRAXXAS_COLORS)
+        df['Item'] = [
+            f"{1001 + index}-{colors[index % len(colors)]}" if index % 4 == 0 else str(1001 + index)
+            for index in range(rows)
+        ]
+        df['Vendor_SKU'] = 'V-' + df['Item']
+    return df
+
+
+def write_po(df, file_path):
+    """Save a synthetic PO as CSV/INV or as an .xlsx workbook"""
+    if file_path.endswith('.xlsx'):
+        df.to_excel(file_path, index=False)
+    else:
+        df.to_csv(file_path, index=False)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable)"""
+    # On Linux ru_maxrss also counts the parent the worker was started from,
+    # so read the worker's own high-water mark instead
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        # Windows has no resource module
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def best_time(fn, repeat):
+    """Best wall time of fn over repeat runs, and its last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def fresh_header_cache(work_dir):
+    """Point the engine at an empty header cache so detection runs cold"""
+    from po_cache import JsonCache
+
+    cache_path = os.path.join(work_dir, 'columns.json')
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    po_engine._header_cache = JsonCache(cache_path)
+
+
+def run_case(case):
+    """
+    Time one input file through every stage
+
+    Runs in its own worker process (see run_suite), so the peak RSS
+    reported is for this case only.
+    """
+    file_path = case['file']
+    work_dir = case['work_dir']
+    repeat = case['repeat']
+    po_number = po_engine.extract_po_number(file_path)
+    stages = {}
+
+    po_engine.preload()
+    base_rss = peak_rss_mb()
+
+    def read():
+        fresh_header_cache(work_dir)
+        return po_engine.load_dataframe(file_path)
+
+    stages['read'], df = best_time(read, repeat)
+
+    def detect():
+        fresh_header_cache(work_dir)
+        vendor = po_engine.detect_vendor(df.columns, file_path)
+        po_engine.sku_qty_columns(df.columns)
+        return vendor
+
+    stages['detect'], vendor = best_time(detect, repeat)
+
+    for name in po_engine.vendor_names():
+        template = po_engine.has_template_format(name) and po_engine.has_color_variants(df)
+        elapsed, content = best_time(
+            lambda: po_engine.format_po(df, name, po_number, template), repeat
+        )
+        stages[f"format:{name}"] = elapsed
+
+        output_path = os.path.join(work_dir, po_engine.default_output_name(name, po_number, template))
+        elapsed, _ = best_time(lambda: po_engine.write_output(content, output_path), repeat)
+        stages[f"write:{name}"] = elapsed
+        os.remove(output_path)
+
+    return {
+        'layout': case['layout'],
+        'format': case['format'],
+        'rows': case['rows'],
+        'file_bytes': os.path.getsize(file_path),
+        'detected_vendor': vendor,
+        'base_rss_mb': base_rss,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+    }
+
+
+def git_commit():
+    """Current git commit of the checkout, if there is one"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_case(result):
+    stages = result['stages']
+    formats = sum(value for key, value in stages.items() if key.startswith('format:'))
+    writes = sum(value for key, value in stages.items() if key.startswith('write:'))
+    peak = result['peak_rss_mb']
+    peak_text = f"{peak:,.0f}" if peak is not None else '-'
+    print(f"{result['layout']:>10} {result['format']:>5} {result['rows']:>9} "
+          f"{stages['read']:>8.3f} {stages['detect']:>8.4f} {formats:>8.3f} "
+          f"{writes:>8.3f} {peak_text:>9}")
+
+
+def run_suite(layouts, formats, sizes, repeat=1, data_dir=None):
+    """Synthesise every layout/format/size and time it; returns the results"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix='po_benchmark_') as work_dir:
+        data_dir = data_dir or work_dir
+        os.makedirs(data_dir, exist_ok=True)
+
+        print(f"{'layout':>10} {'fmt':>5} {'rows':>9} {'read s':>8} {'detect s':>8} "
+              f"{'format s':>8} {'write s':>8} {'peak MB':>9}")
+
+        # One worker process per case, so peak RSS is not carried over. Spawned
+        # rather than forked: the pool starts replacement workers from a helper
+        # thread, and forking while the main thread writes a workbook can hang
+        pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1)
+        try:
+            for layout in layouts:
+                for rows in sizes:
+                    df = synthetic_po(layout, rows)
+                    for file_format in formats:
+                        file_path = os.path.join(data_dir, f"PO{rows}_{layout}.{file_format}")
+                        if not os.path.exists(file_path):
+                            write_po(df, file_path)
+                        case = {
+                            'layout': layout, 'format': file_format, 'rows': rows,
+                            'file': file_path, 'work_dir': work_dir, 'repeat': repeat,
+                        }
+                        result = pool.apply(run_case, (case,))
+                        print_case(result)
+                        results.append(result)
+        finally:
+            pool.close()
+            pool.join()
+
+    return results
+
+
+def compare_results(results, baseline, ratio=REGRESSION_RATIO):
+    """
+    Print stages slower than in the baseline run by more than ratio
+
+    Returns the number of regressions found.
+    """
+    previous = {
+        (item['layout'], item['format'], item['rows']): item['stages']
+        for item in baseline['results']
+    }
+    regressions = 0
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for result in results:
+        old_stages = previous.get((result['layout'], result['format'], result['rows']))
+        if old_stages is None:
+            continue
+        for stage, elapsed in result['stages'].items():
+            old = old_stages.get(stage)
+            # Ignore stages too fast to time reliably
+            if not old or max(old, elapsed) < MIN_COMPARE_SECONDS:
+                continue
+            if elapsed / old > ratio:
+                regressions += 1
+                print(f"  {result['layout']} {result['format']} {result['rows']} rows "
+                      f"{stage}: {old:.4f}s -> {elapsed:.4f}s ({elapsed / old:.2f}x)")
+    if not regressions:
+        print("  No regressions")
+    return regressions
+
+
+def bench_writers(sizes):
+    print(f"{'rows':>10} {'iterrows lines/s':>18} {'vectorised lines/s':>20} {'speedup':>8}")
+    for rows in sizes:
+        formatted_df = sample_frame(rows)
+        assert iterrows_lines(formatted_df) == po_engine.sku_qty_lines(formatted_df)
+
+        # Lines written = SKU + QTY per row
+        lines = rows * 2
+        before, _ = best_time(lambda: iterrows_lines(formatted_df), 1 if rows > 100000 else 3)
+        after, _ = best_time(lambda: po_engine.sku_qty_lines(formatted_df), 3)
+        print(f"{rows:>10} {lines / before:>18,.0f} {lines / after:>20,.0f} {before / after:>7.1f}x")
+
+
+def bench_fast_csv(sizes):
+    import io
+
+    vendor = po_engine.FASTSERVE
+    writer = po_engine.vendor_format(vendor)
+
+    def iterrows_file(file_path):
+        df = pd.read_csv(file_path)[['ITEM_NUMBER', 'QTY']].set_axis(['Sku', 'Qty'], axis=1)
+        lines = (writer.text_lines(writer.header, '1', len(df)) + iterrows_lines(df)
+                 + writer.text_lines(writer.trailer, '1', len(df)))
+        return writer.newline.join(lines).encode()
+
+    def stream_file(file_path, fast):
+        out = io.BytesIO()
+        po_engine.stream_format_csv(file_path, vendor, '1', out, fast=fast)
+        return out.getvalue()
+
+    print(f"{'rows':>10} {'iterrows rows/s':>16} {'pandas rows/s':>14} {'mmap rows/s':>12} "
+          f"{'vs pandas':>10}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in sizes:
+            file_path = os.path.join(work_dir, f"fastserve_{rows}.csv")
+            write_po(synthetic_po('fastserve', rows), file_path)
+            assert stream_file(file_path, True) == stream_file(file_path, False)
+
+            baseline, _ = best_time(lambda: iterrows_file(file_path), 1 if rows > 100000 else 3)
+            pandas, _ = best_time(lambda: stream_file(file_path, False), 3)
+            fast, _ = best_time(lambda: stream_file(file_path, True), 3)
+            print(f"{rows:>10} {rows / baseline:>16,.0f} {rows / pandas:>14,.0f} "
+                  f"{rows / fast:>12,.0f} {pandas / fast:>9.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark PO formatter throughput')
+    parser.add_argument('--rows', type=int, nargs='+',
+                        help='PO sizes (rows) to benchmark (default 10 1000 100000)')
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=LAYOUTS,
+                        help='Input layouts to synthesise')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS,
+                        help='Input file types to synthesise')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per stage; the best time is kept')
+    parser.add_argument('--data-dir',
+                        help='Keep the synthetic input files here (reused by later runs)')
+    parser.add_argument('--json', dest='json_path', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Report stages slower than in this earlier JSON result')
+    parser.add_argument('--writers', action='store_true',
+                        help='Only compare the SKU/QTY line writer with the iterrows baseline')
+    parser.add_argument('--fast-csv', action='store_true',
+                        help='Only compare CSV to FastServe conversion with and without the fast path')
+    args = parser.parse_args(argv)
+
+    if args.writers:
+        bench_writers(args.rows or [1000, 10000, 100000])
+        return 0
+
+    if args.fast_csv:
+        bench_fast_csv(args.rows or [10000, 100000, 1000000])
+        return 0
+
+    results = run_suite(args.layouts, args.formats, args.rows or [10, 1000, 100000],
+                        max(args.repeat, 1), args.data_dir)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
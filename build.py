@@ -4,6 +4,8 @@ import platform
 import subprocess
 import shutil
 import sys
+import tempfile
+import time
 from pathlib import Path
 
 print("=" * 50)
@@ -42,6 +44,104 @@ if hasattr(sys, '_MEIPASS'):
         os.makedirs(os.environ['TMPDIR'])
 """)
 
+def bundle_version(folder):
+    """Short content hash of a onedir bundle, used to name its runtime folder"""
+    import hashlib
+
+    digest = hashlib.sha256()
+    for path in sorted(Path(folder).rglob("*")):
+        if path.is_file():
+            digest.update(path.relative_to(folder).as_posix().encode())
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def append_bundle(launcher, folder):
+    """Append the onedir bundle to the launcher executable as a zip archive"""
+    import zipfile
+
+    import po_launcher
+
+    version = bundle_version(folder)
+    with zipfile.ZipFile(launcher, "a", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(po_launcher.VERSION_MEMBER, version)
+        for path in sorted(Path(folder).rglob("*")):
+            if path.is_file():
+                archive.write(path, path.relative_to(folder).as_posix())
+    return version
+
+
+def measure_startup(exe_path, runs=3):
+    """
+    Print cold and warm startup times of a persistent-runtime executable
+
+    Each run opens the window with --profile-startup, which closes it as
+    soon as it is shown. The cold run starts from an empty runtime folder.
+    """
+    import po_launcher
+
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        env = dict(os.environ, **{po_launcher.RUNTIME_ENV: runtime_dir})
+        times = []
+        for _ in range(runs + 1):
+            start = time.perf_counter()
+            subprocess.run([str(exe_path), "--profile-startup"], env=env, check=True)
+            times.append(time.perf_counter() - start)
+    print(f"Cold start (unpacking the runtime): {times[0]:.2f} s")
+    print(f"Warm start (runtime reused):        {min(times[1:]):.2f} s")
+
+
+def build_persistent(icon_path):
+    """
+    Build PO_Formatter.exe as the po_launcher.py launcher with the
+    application appended as a onedir bundle (see po_launcher.py), and
+    PO_Formatter_cli.exe next to it for the command-line modes
+    """
+    import po_launcher
+
+    app_name = os.path.splitext(po_launcher.APP_EXECUTABLE)[0]
+    # With a console, so batch, serve and watch can print; the windowed
+    # launcher starts it without a console window
+    print("Building application bundle (onedir)...")
+    subprocess.check_call([
+        "pyinstaller", "--clean", "--noconfirm", "--onedir", "--console",
+        "--name", app_name,
+        "--icon", icon_path,
+        "--add-data", f"{icon_path}{os.pathsep}Images",
+        "--runtime-hook", "runtime_hook.py",
+        "po_formatter.py",
+    ])
+
+    # onedir, so the launcher itself does not extract to _MEI on each start
+    print("Building launcher (onedir)...")
+    subprocess.check_call([
+        "pyinstaller", "--clean", "--noconfirm", "--onedir", "--windowed",
+        "--name", "PO_Formatter",
+        "--icon", icon_path,
+        "po_launcher.py",
+    ])
+
+    print("Building command-line launcher (onedir)...")
+    subprocess.check_call([
+        "pyinstaller", "--clean", "--noconfirm", "--onedir", "--console",
+        "--name", po_launcher.CLI_NAME,
+        "--icon", icon_path,
+        "po_launcher.py",
+    ])
+    # Both are the same standard-library program, so their support files
+    # match and the two launchers can share one folder
+    shutil.copytree(Path("dist") / po_launcher.CLI_NAME, Path("dist") / "PO_Formatter",
+                    dirs_exist_ok=True)
+
+    launcher = Path("dist") / "PO_Formatter" / po_launcher.LAUNCHER_EXECUTABLE
+    version = append_bundle(launcher, Path("dist") / app_name)
+    print(f"Runtime version {version} appended to {launcher}")
+    measure_startup(launcher)
+    return launcher
+
+
 def main():
     print("Starting PO Formatter build process...")
     
@@ -75,13 +175,22 @@ def main():
             print("Warning: Could not remove previous build directory due to permissions.")
             print("Some files might be in use. Continuing with build anyway...")
     
-    # Run PyInstaller
-    print("Building executable with PyInstaller...")
-    subprocess.check_call([
-        "pyinstaller",
-        "--clean",
-        "po_formatter.spec"
-    ])
+    if "--persistent" in sys.argv:
+        # Unpacks once to PO_Formatter_runtime instead of _MEI on every launch
+        launcher = build_persistent(icon_path)
+        cli = launcher.with_name(launcher.name.replace("PO_Formatter", "PO_Formatter_cli"))
+        print("\nBuild completed successfully!")
+        print(f"Copy the whole {launcher.parent} folder; start {launcher.name}, or run "
+              f"{cli.name} for the batch, serve and watch commands")
+        return
+    else:
+        # Run PyInstaller
+        print("Building executable with PyInstaller...")
+        subprocess.check_call([
+            "pyinstaller",
+            "--clean",
+            "po_formatter.spec"
+        ])
     
     # Create images directory in dist if it doesn't exist
     dist_images_dir = os.path.join("dist", "Images")
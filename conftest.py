@@ -0,0 +1,17 @@
+import pytest
+
+import po_cache
+import po_engine
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path_factory, monkeypatch):
+    """Point the header, result and input caches at a temporary folder"""
+    cache_dir = tmp_path_factory.mktemp('cache')
+    monkeypatch.setattr(po_engine, '_header_cache',
+                        po_cache.JsonCache(str(cache_dir / 'columns.json')))
+    monkeypatch.setattr(po_engine, '_result_cache',
+                        po_cache.ResultCache(str(cache_dir / 'results'), 16 * 1024 * 1024))
+    monkeypatch.setattr(po_engine, '_input_cache',
+                        po_cache.InputCache(str(cache_dir / 'inputs'), 16 * 1024 * 1024))
+    return cache_dir
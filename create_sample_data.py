@@ -2,10 +2,8 @@
 import pandas as pd
 import os
 
-print("Creating sample PO data file for testing...")
-
 # Sample data for a purchase order
-data = {
+SAMPLE_DATA = {
     'Item': ['1001', '1002', '1003', '1004', '1005'],
     'Description': [
         'Widget A - Small',
@@ -21,17 +19,25 @@ data = {
     'Vendor_SKU': ['V-1001', 'V-1002', 'V-1003', 'V-1004', 'V-1005']
 }
 
-# Create DataFrame
-df = pd.DataFrame(data)
 
-# Create a sample directory if it doesn't exist
-sample_dir = 'sample'
-if not os.path.exists(sample_dir):
-    os.makedirs(sample_dir)
+def main():
+    print("Creating sample PO data file for testing...")
+
+    # Create DataFrame
+    df = pd.DataFrame(SAMPLE_DATA)
+
+    # Create a sample directory if it doesn't exist
+    sample_dir = 'sample'
+    if not os.path.exists(sample_dir):
+        os.makedirs(sample_dir)
+
+    # Save as Excel file
+    output_path = os.path.join(sample_dir, 'PO12345.xlsx')
+    df.to_excel(output_path, index=False)
+
+    print(f"Sample PO file created: {output_path}")
+    print("Use this file to test the PO Formatter application.")
 
-# Save as Excel file
-output_path = os.path.join(sample_dir, 'PO12345.xlsx')
-df.to_excel(output_path, index=False)
 
-print(f"Sample PO file created: {output_path}")
-print("Use this file to test the PO Formatter application.") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
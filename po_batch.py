@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Batch PO formatting
+
+Formats every PO file in a directory (or matching a glob pattern) in a
+single process, without opening the GUI, and writes a per-file summary.
+
+Usage: python po_formatter.py batch <dir|glob> [--vendor auto] --out <dir>
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import po_engine
+import po_trace
+
+
+SUMMARY_FILE = 'batch_summary.csv'
+SUMMARY_COLUMNS = ['file', 'vendor', 'po_number', 'status', 'rows', 'rejected', 'unmapped',
+                   'output', 'cached', 'seconds', 'error']
+
+# Rows left out because of an invalid quantity, one line per row
+REJECTED_FILE = 'batch_rejected_rows.csv'
+REJECTED_COLUMNS = ['file', 'po_number', 'row', 'sku', 'qty', 'reason']
+
+# SKUs not found in the cross-reference file, one line per SKU and file
+UNMAPPED_FILE = 'batch_unmapped_skus.csv'
+UNMAPPED_COLUMNS = ['file', 'po_number', 'sku']
+
+
+def collect_files(source):
+    """Expand a directory or glob pattern into a sorted list of PO files"""
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+
+    return sorted(
+        path for path in paths
+        if os.path.isfile(path) and path.lower().endswith(po_engine.INPUT_EXTENSIONS)
+    )
+
+
+def new_result(file_path, po_number, suffix=''):
+    """Summary dict for one output file, filled in as it is formatted"""
+    return {
+        'file': file_path,
+        'vendor': '',
+        'po_number': po_number,
+        'suffix': suffix,
+        'status': 'ok',
+        'rows': 0,
+        'rejected': 0,
+        'unmapped': 0,
+        'output': '',
+        'cached': False,
+        'seconds': 0.0,
+        'error': '',
+        'rejected_rows': [],
+        'unmapped_skus': [],
+    }
+
+
+def output_suffix(used, name):
+    """
+    Suffix for the next output file called name in a batch: '' the first
+    time, then -2, -3, ... Output names come from the vendor and PO number,
+    so PO12345.xlsx and 12345.csv formatted for the same vendor, or one PO
+    split out of two exports, would otherwise overwrite each other. used
+    maps the names seen so far to a count.
+    """
+    # Windows file names ignore case
+    key = name.lower()
+    used[key] = used.get(key, 0) + 1
+    return '' if used[key] == 1 else f'-{used[key]}'
+
+
+def free_path(path):
+    """path, or the first of path-2, path-3, ... (before the extension) that does not exist"""
+    stem, extension = os.path.splitext(path)
+    candidate = path
+    count = 1
+    while os.path.exists(candidate):
+        count += 1
+        candidate = f"{stem}-{count}{extension}"
+    return candidate
+
+
+def partial_suffix(index):
+    """Output name suffix of the index-th job until claim_output renames it"""
+    return f'.partial-{index}'
+
+
+def claim_output(result, used=None):
+    """
+    Move a finished output from its partial name to its final one
+
+    The vendor and template format, and so the output name, are only known
+    once a file is formatted, so workers write under a partial suffix and
+    the final names are given here, in input order. With used, a name an
+    earlier output of the batch took gets a -2, -3, ... suffix (see
+    output_suffix); without, a name an existing file has does (free_path).
+    """
+    partial = result['output']
+    if result['status'] != 'ok' or not partial:
+        result['suffix'] = ''
+        return result
+
+    stem, extension = os.path.splitext(partial)
+    stem = stem[:len(stem) - len(result['suffix'])]
+    if used is not None:
+        suffix = output_suffix(used, os.path.basename(stem + extension))
+        path = f"{stem}{suffix}{extension}"
+    else:
+        path = free_path(stem + extension)
+        suffix = os.path.splitext(path)[0][len(stem):]
+
+    try:
+        os.replace(partial, path)
+    except OSError as e:
+        result.update(status='error', error=f"Cannot rename {partial}: {str(e)}", suffix='')
+        return result
+    result.update(output=path, suffix=suffix)
+    return result
+
+
+def output_path(out_dir, vendor, po_number, template=False, suffix=''):
+    """Path of an output file in out_dir, with suffix before the extension"""
+    name = po_engine.default_output_name(vendor, po_number, template)
+    if suffix:
+        stem, extension = os.path.splitext(name)
+        name = f"{stem}{suffix}{extension}"
+    return os.path.join(out_dir, name)
+
+
+def copy_cached(cache_key, result, out_dir):
+    """Write a cached output for the file into out_dir; False on a miss"""
+    cache = po_engine.result_cache()
+    meta = cache.lookup(cache_key)
+    if meta is None:
+        return False
+
+    path = output_path(out_dir, meta['vendor'], result['po_number'], meta['template'],
+                       result['suffix'])
+    if not cache.copy_to(cache_key, path):
+        return False
+
+    result.update(vendor=meta['vendor'], rows=meta['rows'], output=path, cached=True)
+    return True
+
+
+def format_file(file_path, vendor, out_dir, traxxas_template=False, po_number=None,
+                use_cache=True, consolidate=False, xref_path=None, suffix=''):
+    """
+    Format one PO file and write the output into out_dir
+
+    The PO number is taken from the file name unless po_number is given;
+    suffix goes at the end of the output name (see claim_output).
+    consolidate merges duplicate SKUs into one line (see po_engine.format_po)
+    and xref_path maps SKUs through a cross-reference file (see po_xref).
+    Rows with an invalid quantity are left out and listed in the summary's
+    rejected_rows, SKUs missing from the cross-reference in unmapped_skus.
+    An unchanged file formatted before with the same options is copied from
+    the result cache (see po_engine.result_cache) unless use_cache is off.
+    Returns a summary dict; errors are recorded rather than raised so that
+    one bad file does not stop the batch.
+    """
+    start = time.perf_counter()
+    result = new_result(file_path, po_number or po_engine.extract_po_number(file_path), suffix)
+    rejected = result['rejected_rows']
+    unmapped = result['unmapped_skus']
+
+    try:
+        xref = po_engine.cross_reference(xref_path) if xref_path else None
+
+        cache_key = None
+        if use_cache:
+            cache_key = po_engine.result_key(po_engine.file_digest(file_path), vendor,
+                                             result['po_number'], traxxas_template, consolidate,
+                                             xref)
+            if copy_cached(cache_key, result, out_dir):
+                result['seconds'] = round(time.perf_counter() - start, 4)
+                return result
+
+        # CSV/INV files only need their header to pick the vendor
+        if po_engine.is_csv_file(file_path):
+            columns = po_engine.read_columns(file_path)
+            df = None
+        else:
+            df = po_engine.load_dataframe(file_path)
+            columns = df.columns
+
+        if vendor == 'auto':
+            file_vendor = po_engine.detect_vendor(columns, file_path)
+            if file_vendor is None:
+                raise ValueError("Could not detect vendor format, use --vendor")
+        else:
+            file_vendor = vendor
+        result['vendor'] = file_vendor
+
+        # The template format needs the whole file to look for color variants
+        use_template = traxxas_template and po_engine.has_template_format(file_vendor)
+        if df is None and use_template:
+            df = po_engine.load_dataframe(file_path)
+        if df is not None and xref is not None:
+            df = po_engine.map_skus(df, file_vendor, xref, unmapped)
+
+        if df is None:
+            # Stream large CSV/INV files straight to the output file
+            path = output_path(out_dir, file_vendor, result['po_number'], suffix=suffix)
+            try:
+                with open(path, 'wb') as out:
+                    result['rows'] = po_engine.stream_format_csv(
+                        file_path, file_vendor, result['po_number'], out,
+                        consolidate=consolidate, rejected=rejected, xref=xref, unmapped=unmapped
+                    )
+            except Exception:
+                # Do not leave a partly written file behind
+                if os.path.exists(path):
+                    os.remove(path)
+                raise
+            result['output'] = path
+        else:
+            # The template format only applies when the SKUs carry color variants
+            use_template = use_template and po_engine.has_color_variants(df)
+
+            content = po_engine.format_po(df, file_vendor, result['po_number'], use_template,
+                                          consolidate, rejected)
+            result['rows'] = len(df) - len(rejected)
+            path = output_path(out_dir, file_vendor, result['po_number'], use_template, suffix)
+            result['output'] = po_engine.write_output(content, path)
+
+        result['rejected'] = len(rejected)
+        result['unmapped'] = len(unmapped)
+        # Only clean results are cached, so a cache hit has nothing to report
+        if cache_key and not rejected and not unmapped:
+            meta = {'vendor': file_vendor, 'rows': result['rows'], 'template': use_template}
+            po_engine.result_cache().put_file(cache_key, meta, result['output'])
+
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def format_po_group(group, file_path, vendor, out_dir, traxxas_template=False,
+                    consolidate=False, xref_path=None):
+    """
+    Format the rows of one PO from a consolidated export (see split_file);
+    group is (po_number, rows, partial output name suffix)
+    """
+    start = time.perf_counter()
+    po_number, df, suffix = group
+    result = new_result(file_path, po_number, suffix)
+    result['vendor'] = vendor
+    rejected = result['rejected_rows']
+    unmapped = result['unmapped_skus']
+
+    try:
+        if xref_path:
+            df = po_engine.map_skus(df, vendor, po_engine.cross_reference(xref_path), unmapped)
+            result['unmapped'] = len(unmapped)
+        use_template = (traxxas_template and po_engine.has_template_format(vendor)
+                        and po_engine.has_color_variants(df))
+        content = po_engine.format_po(df, vendor, po_number, use_template, consolidate, rejected)
+        result['rows'] = len(df) - len(rejected)
+        result['rejected'] = len(rejected)
+        path = output_path(out_dir, vendor, po_number, use_template, suffix)
+        result['output'] = po_engine.write_output(content, path)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def split_file(file_path, vendor, out_dir, traxxas_template=False, executor=None, workers=1,
+               consolidate=False, xref_path=None, used=None):
+    """
+    Format each PO of a consolidated export into its own output file
+
+    The file is read once and its rows are grouped by PO_NUMBER in one pass
+    (po_engine.split_by_po); the per-PO files are then formatted and written
+    in parallel on executor, a process pool of workers processes shared by
+    the batch (see run_split), or in this process without one. used carries
+    the output names already written by this batch across files (see
+    claim_output). Returns one summary dict per PO, or a single error entry
+    if the file cannot be read or split.
+    """
+    start = time.perf_counter()
+    try:
+        df = po_engine.load_dataframe(file_path)
+        if vendor == 'auto':
+            vendor = po_engine.detect_vendor(df.columns, file_path)
+            if vendor is None:
+                raise ValueError("Could not detect vendor format, use --vendor")
+        groups = po_engine.split_by_po(df, po_engine.extract_po_number(file_path))
+    except Exception as e:
+        result = new_result(file_path, po_engine.extract_po_number(file_path))
+        result.update(status='error', error=str(e),
+                      seconds=round(time.perf_counter() - start, 4))
+        return [result]
+
+    used = {} if used is None else used
+    groups = [(po_number, rows, partial_suffix(index))
+              for index, (po_number, rows) in enumerate(groups)]
+
+    worker = partial(format_po_group, file_path=file_path, vendor=vendor, out_dir=out_dir,
+                     traxxas_template=traxxas_template, consolidate=consolidate,
+                     xref_path=xref_path)
+
+    if executor is None or len(groups) <= 1:
+        results = [worker(group) for group in groups]
+    else:
+        chunksize = max(1, len(groups) // (workers * 4))
+        results = executor.map(po_trace.in_pool(worker), groups, chunksize=chunksize)
+        results = [po_trace.collect(result) for result in results]
+    return [claim_output(result, used) for result in results]
+
+
+def run_split(files, vendor, out_dir, traxxas_template=False, workers=None, consolidate=False,
+              xref_path=None):
+    """
+    Split and format each file with split_file and return all the per-PO
+    summaries; one process pool serves every file
+    """
+    results = []
+    used = {}
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for file_path in files:
+            results.extend(split_file(file_path, vendor, out_dir, traxxas_template,
+                                      consolidate=consolidate, xref_path=xref_path, used=used))
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_path in files:
+            results.extend(split_file(file_path, vendor, out_dir, traxxas_template, executor,
+                                      workers, consolidate, xref_path, used))
+    return results
+
+
+def format_job(job, **options):
+    """format_file for a (file path, partial output name suffix) pair from run_batch"""
+    file_path, suffix = job
+    return format_file(file_path, suffix=suffix, **options)
+
+
+def write_summary(results, summary_path):
+    """Write the per-file results as a CSV summary"""
+    with open(summary_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def write_rejected(results, rejected_path):
+    """Write the rows rejected for invalid quantities, file by file"""
+    with open(rejected_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REJECTED_COLUMNS)
+        writer.writeheader()
+        for result in results:
+            for row in result['rejected_rows']:
+                writer.writerow({'file': result['file'], 'po_number': result['po_number'], **row})
+
+
+def write_unmapped(results, unmapped_path):
+    """Write the SKUs missing from the cross-reference file, file by file"""
+    with open(unmapped_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(UNMAPPED_COLUMNS)
+        for result in results:
+            for sku in result['unmapped_skus']:
+                writer.writerow([result['file'], result['po_number'], sku])
+
+
+def run_batch(files, vendor, out_dir, traxxas_template=False, workers=None, use_cache=True,
+              consolidate=False, xref_path=None):
+    """
+    Format a list of files and return their summaries in input order
+
+    Files are spread over a process pool (one worker per core by default)
+    since reading Excel files is CPU-bound. With a single worker, or a
+    single file, everything runs in the current process. Outputs that would
+    share a name get -2, -3, ... suffixes in input order (see claim_output).
+    """
+    jobs = [(path, partial_suffix(index)) for index, path in enumerate(files)]
+    worker = partial(format_job, vendor=vendor, out_dir=out_dir,
+                     traxxas_template=traxxas_template, use_cache=use_cache,
+                     consolidate=consolidate, xref_path=xref_path)
+
+    used = {}
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        return [claim_output(worker(job), used) for job in jobs]
+
+    # Hand out files in small chunks to limit IPC overhead while keeping
+    # the workers evenly loaded; map() yields results in input order
+    chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(po_trace.in_pool(worker), jobs, chunksize=chunksize)
+        return [claim_output(po_trace.collect(result), used) for result in results]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='po_formatter batch',
+        description='Format a directory of PO files without opening the GUI'
+    )
+    parser.add_argument('source', help='Directory or glob pattern of PO files')
+    parser.add_argument('--vendor', default='auto',
+                        help="Vendor format, or 'auto' to detect it per file "
+                             "(fastserve, stephens, hrp, amain, traxxas or a "
+                             "vendor from the vendors folder)")
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--traxxas-template', action='store_true',
+                        help='Use the Traxxas template format when color variants are found')
+    parser.add_argument('--consolidate', action='store_true',
+                        help='Merge repeated SKUs into one line with the summed quantity')
+    parser.add_argument('--xref', default=None,
+                        help='SKU cross-reference file (CSV or SQLite) mapping item numbers '
+                             'to vendor part numbers (default: [Cross Reference] file in '
+                             'po_formatter.ini)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--split-po', action='store_true',
+                        help='Write one output file per PO_NUMBER found in each input file')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Format every file again instead of reusing earlier results')
+    parser.add_argument('--summary', default=None,
+                        help=f'Summary CSV path (default: <out>/{SUMMARY_FILE})')
+    po_trace.add_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        vendor = 'auto' if args.vendor == 'auto' else po_engine.resolve_vendor(args.vendor)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 2
+
+    if args.workers is not None and args.workers < 1:
+        print("Error: --workers must be at least 1")
+        return 2
+
+    xref_path = args.xref or po_engine.xref_file()
+    if xref_path:
+        try:
+            # Load it once here so a bad file is reported before the batch starts
+            po_engine.cross_reference(xref_path)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot read cross-reference file: {str(e)}")
+            return 2
+
+    files = collect_files(args.source)
+    if not files:
+        print(f"No PO files found in {args.source}")
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+
+    po_trace.start(args)
+
+    start = time.perf_counter()
+    if args.split_po:
+        results = run_split(files, vendor, args.out, args.traxxas_template, args.workers,
+                            args.consolidate, xref_path)
+    else:
+        results = run_batch(files, vendor, args.out, args.traxxas_template, args.workers,
+                            not args.no_cache, args.consolidate, xref_path)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        if result['status'] == 'ok':
+            rejected = f", {result['rejected']} rejected" if result['rejected'] else ''
+            unmapped = f", {result['unmapped']} unmapped SKUs" if result['unmapped'] else ''
+            cached = ', cached' if result['cached'] else ''
+            print(f"OK    {result['file']} -> {result['output']} "
+                  f"({result['rows']} rows{rejected}{unmapped}{cached})")
+        else:
+            print(f"ERROR {result['file']}: {result['error']}")
+
+    summary_path = args.summary or os.path.join(args.out, SUMMARY_FILE)
+    write_summary(results, summary_path)
+
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    if args.split_po:
+        print(f"Processed {len(files)} files into {len(results)} POs in {elapsed:.2f}s "
+              f"({failed} failed)")
+    else:
+        print(f"Processed {len(files)} files in {elapsed:.2f}s ({failed} failed)")
+    print(f"Summary written to {summary_path}")
+
+    renamed = sum(1 for result in results if result['suffix'] and result['status'] == 'ok')
+    if renamed:
+        print(f"{renamed} outputs share a file name with an earlier one and were given "
+              f"a -2, -3, ... suffix")
+
+    if any(result['rejected'] for result in results):
+        rejected_path = os.path.join(args.out, REJECTED_FILE)
+        write_rejected(results, rejected_path)
+        total = sum(result['rejected'] for result in results)
+        print(f"{total} rows with invalid quantities were left out, see {rejected_path}")
+
+    if any(result['unmapped'] for result in results):
+        unmapped_path = os.path.join(args.out, UNMAPPED_FILE)
+        write_unmapped(results, unmapped_path)
+        total = sum(result['unmapped'] for result in results)
+        print(f"{total} SKUs were not in the cross-reference file, see {unmapped_path}")
+
+    po_trace.finish(args)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
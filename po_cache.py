@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Persistent caches kept next to po_formatter.ini
+
+Cache files are best-effort: if they cannot be read or written (e.g. a
+read-only USB drive) the formatter simply works without them.
+"""
+
+import json
+import os
+import shutil
+
+from po_engine import APP_DIR
+
+
+# Cache files live next to the settings file
+CACHE_DIR = APP_DIR
+
+HEADER_CACHE_FILE = os.path.join(CACHE_DIR, 'po_formatter_columns.json')
+
+
+class JsonCache:
+    """
+    Small persistent key -> value map stored as a JSON file
+
+    Loaded on first use and rewritten atomically when an entry is added.
+    Keeps at most max_entries, dropping the least recently used.
+    """
+
+    def __init__(self, path, max_entries=500):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = None
+
+    def load(self):
+        self.entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key):
+        if self.entries is None:
+            self.load()
+        value = self.entries.pop(key, None)
+        if value is not None:
+            # Move to the end so it is evicted last
+            self.entries[key] = value
+        return value
+
+    def put(self, key, value):
+        if self.entries is None:
+            self.load()
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        self.save()
+
+    def save(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.path)
+        except (OSError, TypeError, ValueError):
+            # Unwritable location or a value JSON cannot hold
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+RESULT_CACHE_DIR = os.path.join(CACHE_DIR, 'po_formatter_results')
+
+# Default size cap of the result cache in MB ([Cache] results_mb in po_formatter.ini)
+RESULT_CACHE_MB = 256
+
+
+class ResultCache:
+    """
+    Formatted outputs stored by key in a folder, one file per entry
+
+    Each entry file holds a line of JSON metadata followed by the output.
+    Entries are touched when read, and the least recently used ones are
+    removed once the folder grows past max_bytes. Several processes may
+    share the folder; entries are written atomically.
+    """
+
+    SUFFIX = '.out'
+
+    def __init__(self, path, max_bytes=RESULT_CACHE_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def entry_path(self, key):
+        return os.path.join(self.path, f"{key}{self.SUFFIX}")
+
+    def touch(self, path):
+        """Mark an entry as recently used; on a read-only folder it keeps its old time"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def lookup(self, key):
+        """Metadata of an entry, or None on a miss; marks it as recently used"""
+        if self.max_bytes <= 0:
+            return None
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        self.touch(path)
+        return meta
+
+    def read(self, key):
+        """(metadata, content) of an entry, or None on a miss"""
+        if self.max_bytes <= 0:
+            return None
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        self.touch(path)
+        return meta, content
+
+    def copy_to(self, key, dest_path):
+        """Write an entry's content to dest_path; returns False on a miss"""
+        try:
+            with open(self.entry_path(key), 'rb') as f:
+                f.readline()
+                with open(dest_path, 'wb') as out:
+                    shutil.copyfileobj(f, out)
+        except OSError:
+            return False
+        return True
+
+    def put(self, key, meta, content):
+        self.store(key, meta, lambda out: out.write(content), len(content))
+
+    def put_file(self, key, meta, source_path):
+        """Store the content of an output file already written to disk"""
+        def copy(out):
+            with open(source_path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+
+        try:
+            size = os.path.getsize(source_path)
+        except OSError:
+            return
+        self.store(key, meta, copy, size)
+
+    def store(self, key, meta, write, size):
+        # An entry this large would evict most of the cache
+        if self.max_bytes <= 0 or size > self.max_bytes // 4:
+            return
+
+        temp_path = f"{self.entry_path(key)}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(temp_path, 'wb') as out:
+                out.write(json.dumps(meta).encode() + b'\n')
+                write(out)
+            os.replace(temp_path, self.entry_path(key))
+        except (OSError, TypeError, ValueError):
+            # Unwritable location or metadata JSON cannot hold
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.path) as scan:
+                for entry in scan:
+                    if entry.name.endswith(self.SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Already removed by another process
+                pass
+            total -= size
+
+
+INPUT_CACHE_DIR = os.path.join(CACHE_DIR, 'po_formatter_inputs')
+
+# Default size cap of the parsed input cache in MB ([Cache] inputs_mb in po_formatter.ini)
+INPUT_CACHE_MB = 512
+
+
+class InputCache(ResultCache):
+    """
+    Columnar snapshots of parsed input files (see po_snapshot), stored and
+    evicted like formatted outputs
+
+    The metadata line of an entry is the snapshot layout; the column
+    buffers follow it and are memory-mapped when the entry is read. The
+    numeric columns of a frame read back are views of that mapping (copied
+    only where written to), which stays open while the frame is in use; on
+    Windows the entry cannot be replaced or evicted until then, which
+    store() and evict() skip like any other file error.
+    """
+
+    SUFFIX = '.cols'
+
+    def __init__(self, path, max_bytes=INPUT_CACHE_MB * 1024 * 1024):
+        super().__init__(path, max_bytes)
+
+    def get_frame(self, key):
+        """The cached DataFrame, or None on a miss"""
+        import mmap
+
+        import po_snapshot
+
+        if self.max_bytes <= 0:
+            return None
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                layout = json.loads(f.readline())
+                offset = f.tell()
+                # Not closed here: the frame's numeric columns are views of it.
+                # ACCESS_COPY keeps them writable without changing the entry
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            df = po_snapshot.decode(layout, mapped, offset)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing, truncated or written by another version
+            return None
+        self.touch(path)
+        return df
+
+    def put_frame(self, key, df):
+        """Store a DataFrame; frames a snapshot cannot hold are skipped"""
+        import po_snapshot
+
+        if self.max_bytes <= 0:
+            return
+        try:
+            layout, buffers = po_snapshot.encode(df)
+        except po_snapshot.Unsupported:
+            return
+
+        def write(out):
+            for buffer in buffers:
+                # As bytes: memoryview cannot export datetime arrays
+                out.write(buffer.view('uint8'))
+
+        self.store(key, layout, write, sum(buffer.nbytes for buffer in buffers))
@@ -0,0 +1,876 @@
+#!/usr/bin/env python3
+"""
+Headless PO formatting engine
+
+Loads PO files, detects the vendor layout and builds the formatted output
+for each supported vendor without any Qt dependency, so it can be used from
+the command line as well as from the GUI.
+
+pandas is imported inside the functions that need it so that importing this
+module (e.g. for the vendor list when the window opens) stays cheap.
+"""
+
+import os
+import re
+import sys
+
+import po_trace
+
+
+# Built-in vendor names as shown in the GUI vendor dropdown; their output
+# formats are declared in po_vendors
+FASTSERVE = 'HorizonHobby/FastServe'
+STEPHENS = 'Stephens'
+HRP = 'HRP'
+AMAIN = 'AMAIN'
+TRAXXAS = 'Traxxas'
+
+VENDORS = [FASTSERVE, STEPHENS, HRP, AMAIN, TRAXXAS]
+
+# Input file types the formatter can read
+INPUT_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.inv')
+
+# Column layout of the FastServe CSV export (see 17633_FastServe.csv)
+FASTSERVE_COLUMNS = ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']
+
+# Column holding each row's PO number in consolidated FastServe exports
+PO_COLUMN = 'PO_NUMBER'
+
+# Excel files that can be read column by column (see po_excel)
+FAST_EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Rows per chunk when streaming large CSV/INV files
+CSV_CHUNK_ROWS = 100000
+
+# Matches -RED, -GRN, -BLUE at the end of a Traxxas SKU
+COLOR_PATTERN = r'-([A-Z]+)$'
+COLOR_RE = re.compile(COLOR_PATTERN)
+
+# Traxxas color codes and the variant names they map to; codes that are
+# not listed are used as is. Extra codes can be added in the
+# [Traxxas Colors] section of po_formatter.ini (e.g. SLV = Silver).
+TRAXXAS_COLORS = {
+    'RED': 'Red',
+    'GRN': 'Green',
+    'BLU': 'Blue',
+    'BLUE': 'Blue',
+    'YEL': 'Yellow',
+    'BLK': 'Black',
+    'WHT': 'White',
+    'PNK': 'Pink',
+    'PUR': 'Purple',
+    'ORG': 'Orange',
+}
+
+# Bump when the column or vendor detection rules change, so cached
+# header results from older versions are not reused
+DETECTION_VERSION = 1
+
+# Bump when the output of any formatter changes, so cached results from
+# older versions are not reused
+FORMATTER_VERSION = 3
+
+# Bump when what load_dataframe returns for a file changes, so input
+# snapshots read by older versions are not reused
+READER_VERSION = 2
+
+# Header signature cache, created on first use
+_header_cache = None
+
+# Formatted output cache, created on first use
+_result_cache = None
+
+# Parsed input snapshot cache, created on first use
+_input_cache = None
+
+# Compiled vendor formats (see po_vendors), created on first use
+_vendor_registry = None
+
+# SKU cross-reference indexes (see po_xref) by file path
+_cross_references = {}
+
+# Set by po_launcher: the folder of the launcher rather than of the
+# unpacked runtime, which is replaced on every update
+APP_DIR_ENV = 'PO_FORMATTER_HOME'
+
+
+def app_dir():
+    """
+    Folder holding the settings, caches and vendors/ folder: next to the
+    executable in frozen builds (a onefile build runs from a temporary
+    _MEI folder), next to this module otherwise
+    """
+    if os.environ.get(APP_DIR_ENV):
+        return os.environ[APP_DIR_ENV]
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+APP_DIR = app_dir()
+
+# Settings file shared with the GUI
+CONFIG_FILE = os.path.join(APP_DIR, 'po_formatter.ini')
+
+
+def vendor_registry():
+    """Built-in and configured vendor formats (see po_vendors)"""
+    global _vendor_registry
+    if _vendor_registry is None:
+        from po_vendors import VendorRegistry, load_specs
+        _vendor_registry = VendorRegistry(load_specs())
+    return _vendor_registry
+
+
+def vendor_names():
+    """All vendor names, built-in vendors first"""
+    return vendor_registry().names()
+
+
+def vendor_format(vendor):
+    """Compiled output format for a vendor; raises ValueError if unknown"""
+    return vendor_registry().get(vendor)
+
+
+def has_template_format(vendor):
+    """Whether the vendor has a variant template format (e.g. Traxxas)"""
+    return vendor_format(vendor).template is not None
+
+
+def resolve_vendor(name):
+    """Map a vendor name or command-line alias to the GUI vendor name"""
+    return vendor_registry().resolve(name)
+
+
+def load_color_map(config_file=CONFIG_FILE):
+    """Traxxas color code map, with overrides from the [Traxxas Colors] section"""
+    import configparser
+
+    colors = dict(TRAXXAS_COLORS)
+    if os.path.exists(config_file):
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        if 'Traxxas Colors' in config:
+            for code, name in config['Traxxas Colors'].items():
+                # configparser lower-cases keys; SKU color codes are upper case
+                colors[code.upper()] = name
+    return colors
+
+
+def preload():
+    """Import pandas and the Excel reader ahead of the first file load"""
+    import pandas  # noqa: F401
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        # pandas reports the missing dependency when an Excel file is read
+        pass
+
+
+def as_dataframe(data):
+    """
+    Accept a DataFrame or an iterable of rows and return a DataFrame
+
+    Rows may be dicts keyed by column name or (sku, qty) pairs.
+    """
+    import pandas as pd
+
+    if isinstance(data, pd.DataFrame):
+        return data
+
+    rows = list(data)
+    if rows and not isinstance(rows[0], dict):
+        return pd.DataFrame(rows, columns=['Sku', 'Qty'])
+    return pd.DataFrame(rows)
+
+
+def extract_po_number(file_path):
+    """Extract the PO number from a file name (e.g. PO12345.xlsx -> 12345)"""
+    po_number = os.path.splitext(os.path.basename(file_path))[0].strip()
+
+    # If the filename starts with "PO", extract the number part
+    if po_number.upper().startswith('PO'):
+        po_number = po_number[2:].strip()
+
+    return po_number
+
+
+def is_csv_file(file_path):
+    """CSV and INV files are read as CSV; everything else as Excel"""
+    # INV files are typically for Traxxas
+    return file_path.lower().endswith(('.csv', '.inv'))
+
+
+def read_columns(file_path):
+    """Read only the header row of a CSV/INV file"""
+    import pandas as pd
+
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def columns_to_load(columns):
+    """
+    Pick the columns any formatter or vendor check may need
+
+    Returns None when no SKU/QTY columns can be found, so the file is
+    loaded in full and the formatter reports the missing columns.
+    """
+    wanted = []
+    for fastserve_layout in (True, False):
+        try:
+            wanted.extend(find_sku_qty_columns(columns, fastserve_layout))
+        except ValueError:
+            return None
+
+    # Keep the columns used by vendor detection
+    wanted.extend(col for col in FASTSERVE_COLUMNS + ['SKU', 'QTY'] if col in columns)
+
+    return [col for col in columns if col in wanted]
+
+
+def csv_dtypes(columns):
+    """SKUs are kept as text; everything else is left to pandas"""
+    dtypes = {}
+    for fastserve_layout in (True, False):
+        try:
+            sku_col, _ = find_sku_qty_columns(columns, fastserve_layout)
+        except ValueError:
+            continue
+        dtypes[sku_col] = str
+    if 'SKU' in columns:
+        dtypes['SKU'] = str
+    return dtypes
+
+
+def load_dataframe(file_path, progress=None):
+    """
+    Load a PO file into a DataFrame based on its extension
+
+    CSV/INV files and .xlsx workbooks only load the SKU, quantity and vendor
+    detection columns, so wide exports do not hold columns the formatters
+    never use.
+
+    progress, if given, is called with the number of rows read so far while
+    CSV/INV and .xlsx files load; an exception it raises stops the load.
+    """
+    with po_trace.stage('read', file=file_path) as stage:
+        df = read_dataframe(file_path, progress)
+        stage.set(rows=len(df), columns=df.shape[1])
+    return df
+
+
+def read_dataframe(file_path, progress=None):
+    """load_dataframe without the trace stage"""
+    import pandas as pd
+
+    if is_csv_file(file_path):
+        usecols = header_info(read_columns(file_path))['load']
+        if usecols is None:
+            kwargs = {}
+        else:
+            kwargs = {'usecols': usecols, 'dtype': csv_dtypes(usecols)}
+
+        if progress is None:
+            return pd.read_csv(file_path, **kwargs)
+
+        # Read in chunks so progress can be reported between them
+        chunks = []
+        rows = 0
+        for chunk in pd.read_csv(file_path, chunksize=CSV_CHUNK_ROWS, **kwargs):
+            chunks.append(chunk)
+            rows += len(chunk)
+            progress(rows)
+        if not chunks:
+            return pd.read_csv(file_path, **kwargs)
+        return pd.concat(chunks, ignore_index=True)
+    elif file_path.lower().endswith(FAST_EXCEL_EXTENSIONS):
+        return load_excel_columns(file_path, progress)
+    else:
+        return pd.read_excel(file_path)
+
+
+def input_key(file_path):
+    """
+    Input cache key for a file: its path, size and modification time, and
+    everything else that decides what load_dataframe returns
+    """
+    import hashlib
+    import json
+
+    import pandas as pd
+    from po_snapshot import FORMAT_VERSION
+
+    stat = os.stat(file_path)
+    parts = [
+        FORMAT_VERSION,
+        READER_VERSION,
+        DETECTION_VERSION,
+        vendor_registry().detection_key,
+        pd.__version__,
+        os.path.abspath(file_path),
+        stat.st_size,
+        stat.st_mtime_ns,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def load_cached_dataframe(file_path, progress=None):
+    """
+    load_dataframe, reusing the columnar snapshot of an unchanged workbook
+    from an earlier load instead of parsing it again
+
+    CSV/INV files are always read directly; pandas parses them about as
+    fast as a snapshot of their text columns loads.
+    """
+    if is_csv_file(file_path):
+        return load_dataframe(file_path, progress)
+
+    cache = input_cache()
+    key = input_key(file_path)
+    with po_trace.stage('read snapshot', file=file_path) as stage:
+        df = cache.get_frame(key)
+        stage.set(rows=None if df is None else len(df), hit=df is not None)
+    if df is None:
+        df = load_dataframe(file_path, progress)
+        cache.put_frame(key, df)
+    return df
+
+
+def load_excel_columns(file_path, progress=None):
+    """
+    Load only the needed columns of the first sheet of an .xlsx workbook
+
+    Reads the header row first, resolves the SKU/QTY columns, then streams
+    just those columns (see po_excel). Falls back to pd.read_excel if the
+    columns cannot be resolved or the workbook needs the full reader.
+    The columns are typed by the parser pd.read_excel uses, so text such
+    as NA reads as missing and a column of numbers stored as text (00123)
+    becomes numeric with either reader.
+    """
+    import pandas as pd
+    from pandas.io.parsers import TextParser
+    from po_excel import UnsupportedWorkbook, read_xlsx_columns
+
+    try:
+        usecols, data = read_xlsx_columns(
+            file_path, lambda columns: header_info(columns)['load'], progress
+        )
+    except UnsupportedWorkbook:
+        return pd.read_excel(file_path)
+
+    rows = [list(usecols)] + [list(row) for row in zip(*data)]
+    return TextParser(rows, header=0).read()
+
+
+def iter_csv_chunks(file_path, usecols, chunksize=CSV_CHUNK_ROWS):
+    """Read selected columns of a CSV/INV file in chunks of chunksize rows"""
+    import pandas as pd
+
+    return pd.read_csv(file_path, usecols=usecols, dtype=csv_dtypes(usecols),
+                       chunksize=chunksize)
+
+
+def match_vendor_columns(columns):
+    """Vendor format implied by the column names alone, or None"""
+    return vendor_registry().match_columns(columns)
+
+
+def detect_vendor(columns, file_path=''):
+    """
+    Auto-detect the vendor format of a PO from its column names
+
+    Returns the vendor name, or None if the layout is not recognised.
+    """
+    with po_trace.stage('vendor detection', file=file_path) as stage:
+        vendor = header_info(columns)['vendor']
+
+        # Some file types imply a vendor (e.g. INV files are typically for Traxxas)
+        vendor = vendor_registry().match_extension(file_path) or vendor
+        stage.set(vendor=vendor)
+    return vendor
+
+
+def find_sku_qty_columns(columns, fastserve_layout=True):
+    """
+    Find the SKU and quantity columns of a PO
+
+    Uses the FastServe CSV columns when present (and fastserve_layout is set),
+    then exact Sku/Qty columns, then the first columns whose names look like
+    a SKU ('sku', 'item', 'part') or a quantity ('qty', 'quantity').
+    """
+    columns = list(columns)
+
+    if fastserve_layout and all(col in columns for col in FASTSERVE_COLUMNS):
+        return 'ITEM_NUMBER', 'QTY'
+
+    required_columns = ['Sku', 'Qty']
+    missing_columns = [col for col in required_columns if col not in columns]
+
+    if not missing_columns:
+        return 'Sku', 'Qty'
+
+    # Try to find similar column names
+    sku_columns = [col for col in columns
+                   if 'sku' in str(col).lower() or 'item' in str(col).lower() or 'part' in str(col).lower()]
+    qty_columns = [col for col in columns
+                   if 'qty' in str(col).lower() or 'quantity' in str(col).lower()]
+
+    if not sku_columns or not qty_columns:
+        raise ValueError(f"Input file missing required columns: {', '.join(missing_columns)}")
+
+    # Use the first matching columns
+    sku_col = 'Sku' if 'Sku' in columns else sku_columns[0]
+    qty_col = 'Qty' if 'Qty' in columns else qty_columns[0]
+    return sku_col, qty_col
+
+
+def header_cache():
+    """The persistent header signature cache (see po_cache)"""
+    global _header_cache
+    if _header_cache is None:
+        from po_cache import HEADER_CACHE_FILE, JsonCache
+        _header_cache = JsonCache(HEADER_CACHE_FILE)
+    return _header_cache
+
+
+def result_cache(config_file=CONFIG_FILE):
+    """
+    The persistent formatted output cache (see po_cache)
+
+    Its size is set in MB by results_mb in the [Cache] section of
+    po_formatter.ini; 0 turns it off.
+    """
+    global _result_cache
+    if _result_cache is None:
+        from po_cache import RESULT_CACHE_DIR, RESULT_CACHE_MB, ResultCache
+
+        max_mb = cache_size_mb('results_mb', RESULT_CACHE_MB, config_file)
+        _result_cache = ResultCache(RESULT_CACHE_DIR, max_mb * 1024 * 1024)
+    return _result_cache
+
+
+def input_cache(config_file=CONFIG_FILE):
+    """
+    The persistent parsed input cache (see po_cache.InputCache)
+
+    Its size is set in MB by inputs_mb in the [Cache] section of
+    po_formatter.ini; 0 turns it off.
+    """
+    global _input_cache
+    if _input_cache is None:
+        from po_cache import INPUT_CACHE_DIR, INPUT_CACHE_MB, InputCache
+
+        max_mb = cache_size_mb('inputs_mb', INPUT_CACHE_MB, config_file)
+        _input_cache = InputCache(INPUT_CACHE_DIR, max_mb * 1024 * 1024)
+    return _input_cache
+
+
+def cache_size_mb(option, default, config_file=CONFIG_FILE):
+    """A cache size in MB from the [Cache] section of po_formatter.ini"""
+    import configparser
+
+    if not os.path.exists(config_file):
+        return default
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    try:
+        return config.getint('Cache', option, fallback=default)
+    except ValueError:
+        return default
+
+
+def xref_file(config_file=CONFIG_FILE):
+    """
+    The SKU cross-reference file set by file in the [Cross Reference]
+    section of po_formatter.ini, or None. Relative paths are taken from the
+    folder of po_formatter.ini.
+    """
+    import configparser
+
+    if not os.path.exists(config_file):
+        return None
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    path = config.get('Cross Reference', 'file', fallback='').strip()
+    if not path:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), path)
+
+
+def cross_reference(path):
+    """The SKU cross-reference index of a file, reloaded if the file changed"""
+    xref = _cross_references.get(path)
+    if xref is None:
+        from po_xref import CrossReference
+        xref = _cross_references[path] = CrossReference(path, vendor_registry())
+    return xref.refresh()
+
+
+def map_skus(df, vendor, xref, unmapped=None):
+    """
+    Replace the SKUs of a PO with the vendor's part numbers from the
+    cross-reference index xref
+
+    SKUs not in the index are kept as they are; if unmapped is a list,
+    each of them is added to it once.
+    """
+    sku_col, _ = sku_qty_columns(df.columns, vendor_format(vendor).fastserve_layout)
+    skus, missing = xref.map(df[sku_col], vendor)
+    if unmapped is not None and missing:
+        # Streamed files are mapped chunk by chunk; list each SKU once
+        seen = set(unmapped)
+        unmapped.extend(sku for sku in missing if sku not in seen)
+    return df.assign(**{sku_col: skus})
+
+
+def file_digest(file_path):
+    """SHA-256 of a file's content"""
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def result_key(digest, vendor, po_number, traxxas_template=False, consolidate=False,
+               xref=None):
+    """
+    Result cache key for formatting a file with the given file_digest
+
+    Covers the file content, the requested vendor (or 'auto'), the PO
+    number, template and consolidation choices, and everything else that
+    affects the output: the formatter version, the vendor specs, the
+    cross-reference file version if xref is given and, for the template
+    format, the color map.
+    """
+    import hashlib
+    import json
+
+    parts = [
+        FORMATTER_VERSION,
+        digest,
+        vendor,
+        str(po_number),
+        bool(traxxas_template),
+        bool(consolidate),
+        [xref.path, list(xref.stamp)] if xref is not None else None,
+        vendor_registry().fingerprint,
+        sorted(load_color_map().items()) if traxxas_template else None,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def header_signature(columns):
+    """Hash of a header row, used as the header cache key"""
+    import hashlib
+
+    # Include the type so a 2024 column is not confused with a '2024' column
+    names = [f"{type(col).__name__}:{col}" for col in columns]
+    # Configured vendors can add detection rules
+    rules = vendor_registry().detection_key
+    text = '\x1f'.join([str(DETECTION_VERSION), rules] + names)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def header_info(columns):
+    """
+    Resolved columns and vendor for a header row
+
+    Vendors send the same layout every time, so the result is cached on disk
+    by header signature and repeat files skip detection. Returns a dict with
+    the detected vendor, the columns to load and the SKU/QTY columns with and
+    without the FastServe layout (None where they cannot be found).
+    """
+    columns = list(columns)
+    with po_trace.stage('column detection', columns=len(columns)) as stage:
+        key = header_signature(columns)
+        info = header_cache().get(key)
+        stage.set(cached=info is not None)
+        if info is not None:
+            return info
+
+        info = {
+            'vendor': match_vendor_columns(columns),
+            'load': columns_to_load(columns),
+        }
+        for name, fastserve_layout in (('sku_qty', True), ('sku_qty_plain', False)):
+            try:
+                info[name] = list(find_sku_qty_columns(columns, fastserve_layout))
+            except ValueError:
+                info[name] = None
+
+        header_cache().put(key, info)
+    return info
+
+
+def sku_qty_columns(columns, fastserve_layout=True):
+    """Cached find_sku_qty_columns; raises ValueError if they are missing"""
+    found = header_info(columns)['sku_qty' if fastserve_layout else 'sku_qty_plain']
+    if found is None:
+        # Raise the detailed missing-columns error
+        return find_sku_qty_columns(columns, fastserve_layout)
+    return tuple(found)
+
+
+def select_sku_qty(df, fastserve_layout=True):
+    """Return the SKU and quantity columns renamed to Sku/Qty"""
+    sku_col, qty_col = sku_qty_columns(df.columns, fastserve_layout)
+    # Column selection already returns a new frame, no extra copy needed
+    formatted_df = df[[sku_col, qty_col]]
+    formatted_df.columns = ['Sku', 'Qty']
+    return formatted_df
+
+
+def check_quantities(formatted_df, rejected=None):
+    """
+    Coerce the Qty column of a Sku/Qty frame to whole numbers
+
+    Rows whose quantity is missing, not a number, fractional or not
+    positive are left out. If rejected is a list, each such row is added
+    to it as a dict with the spreadsheet row number (the header being row
+    1), SKU, quantity and reason; without a list a ValueError describing
+    them is raised instead.
+    """
+    import numpy as np
+    import pandas as pd
+
+    raw = formatted_df['Qty']
+    if raw.dtype.kind in 'iuf':
+        numbers = raw
+    else:
+        try:
+            # Text that is all numbers ("2.0", " 3 ") converts in one fast pass
+            numbers = raw.astype('float64')
+        except (TypeError, ValueError):
+            # Slower element-wise parse; blank and unparsable cells become NaN
+            numbers = pd.to_numeric(raw, errors='coerce')
+    bad = (numbers.isna() | (numbers <= 0) | (numbers % 1 != 0)).to_numpy()
+
+    if not bad.any():
+        if numbers.dtype.kind == 'f':
+            numbers = numbers.astype('int64')
+        return formatted_df.assign(Qty=numbers)
+
+    # Reasons are only worked out for the (few) rejected rows
+    raw_bad = raw[bad]
+    numbers_bad = numbers[bad]
+    missing = raw_bad.isna() | (raw_bad.astype(str).str.strip() == '')
+    reasons = np.select(
+        [missing.to_numpy(), numbers_bad.isna().to_numpy(), (numbers_bad % 1 != 0).to_numpy()],
+        ['missing quantity', 'quantity is not a number', 'quantity is not a whole number'],
+        'quantity is not positive'
+    )
+    if pd.api.types.is_integer_dtype(formatted_df.index):
+        row_numbers = formatted_df.index[bad] + 2
+    else:
+        row_numbers = np.flatnonzero(bad) + 2
+    problems = [
+        {'row': int(row), 'sku': str(sku), 'qty': '' if pd.isna(qty) else str(qty), 'reason': reason}
+        for row, sku, qty, reason in zip(row_numbers, formatted_df['Sku'][bad].tolist(),
+                                         raw_bad.tolist(), reasons.tolist())
+    ]
+
+    if rejected is None:
+        first = problems[0]
+        more = f" (and {len(problems) - 1} more)" if len(problems) > 1 else ''
+        raise ValueError(f"Invalid quantity '{first['qty']}' for SKU {first['sku']} "
+                         f"on row {first['row']}: {first['reason']}{more}")
+    rejected.extend(problems)
+
+    valid = formatted_df[~bad]
+    return valid.assign(Qty=numbers[~bad].astype('int64'))
+
+
+def sku_strings(series):
+    """SKUs as Python strings, with missing values written as 'nan' like str()"""
+    import pandas as pd
+
+    return pd.Series([str(sku) for sku in series.tolist()], index=series.index, dtype=object)
+
+
+def strip_tra_prefix(skus):
+    """Remove a leading "tra" (any case) from each SKU"""
+    has_prefix = skus.str[:3].str.lower() == 'tra'
+    return skus.where(~has_prefix, skus.str[3:])
+
+
+def sum_duplicates(df, keys, qty_columns):
+    """
+    Merge rows of df with equal keys into one, summing qty_columns
+
+    keys is a list of Series aligned with df (e.g. the normalised SKUs).
+    Other columns keep their first value and rows keep first-seen order.
+    Raises ValueError if a quantity is not numeric.
+    """
+    import numpy as np
+    import pandas as pd
+
+    qtys = {column: pd.to_numeric(df[column]) for column in qty_columns}
+    # A hash-based groupby without sorting keeps the order of first appearance
+    grouped = df.assign(**qtys).groupby([np.asarray(key) for key in keys],
+                                        sort=False, dropna=False)
+    merged = grouped.first()
+    for column in qty_columns:
+        total = grouped[column].sum(min_count=1)
+        if total.dtype.kind == 'f' and (total % 1 == 0).all():
+            # Whole quantities read as floats (e.g. 2.0 from Excel)
+            total = total.astype('int64')
+        merged[column] = total
+    return merged.reset_index(drop=True)
+
+
+def has_color_variants(df):
+    """Check whether any Traxxas SKU carries a color suffix such as -RED"""
+    sku_col, _ = sku_qty_columns(df.columns, fastserve_layout=False)
+    # Stops at the first match, so large POs with variants return quickly
+    return any(COLOR_RE.search(str(sku)) for sku in df[sku_col].tolist())
+
+
+def default_output_name(vendor, po_number, traxxas_template=False):
+    """Default output file name for a vendor, as offered in the save dialog"""
+    return vendor_format(vendor).output_name(po_number, traxxas_template)
+
+
+def po_text(value, default=''):
+    """A PO number cell as text (17633.0 -> '17633'); missing values give default"""
+    import pandas as pd
+
+    if pd.isna(value):
+        return default
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() or default
+
+
+def split_by_po(df, default_po=''):
+    """
+    Split a consolidated export into (po_number, rows) pairs, one per PO,
+    in order of first appearance
+
+    Rows are grouped in a single pass over the PO_NUMBER column rather than
+    by filtering the frame once per PO. Rows without a PO number are put
+    under default_po.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if PO_COLUMN not in df.columns:
+        raise ValueError(f"Input file has no {PO_COLUMN} column to split on")
+
+    # Missing values get code -1, which picks the trailing default_po
+    codes, uniques = pd.factorize(df[PO_COLUMN])
+    names = np.array([po_text(value, default_po) for value in uniques] + [default_po], dtype=object)
+    return list(df.groupby(names[codes], sort=False))
+
+
+# Vendor-specific formatting
+#
+# Text vendors (FastServe, Stephens) write the PO number, alternating SKU
+# and quantity lines, an end marker and the SKU count. CSV vendors (HRP,
+# AMAIN, Traxxas) write one row per SKU. Each vendor is a spec in
+# po_vendors that is compiled into a writer; both kinds can be written in
+# chunks so large CSV files can be streamed.
+
+def sku_qty_lines(formatted_df):
+    """
+    Alternating SKU and quantity lines for a Sku/Qty frame
+
+    Converts each column in one pass and interleaves the two lists instead
+    of building a Series per row with iterrows.
+    """
+    skus = [str(sku) for sku in formatted_df['Sku'].tolist()]
+    qtys = [str(qty) for qty in formatted_df['Qty'].astype('int64').tolist()]
+
+    lines = [None] * (len(skus) * 2)
+    lines[0::2] = skus
+    lines[1::2] = qtys
+    return lines
+
+
+def format_po(data, vendor, po_number, traxxas_template=False, consolidate=False,
+              rejected=None):
+    """
+    Format a PO for the given vendor and return the file content as bytes
+
+    data is a DataFrame or an iterable of rows (see as_dataframe).
+    traxxas_template selects the vendor's variant template format, if any.
+    consolidate merges duplicate SKUs into one line with the summed quantity.
+    Rows with an invalid quantity are skipped and listed in rejected if it
+    is a list, otherwise they fail the PO (see check_quantities).
+    """
+    df = as_dataframe(data)
+    writer = vendor_format(vendor)
+    try:
+        with po_trace.stage('transform', vendor=vendor, po_number=po_number) as stage:
+            content = writer.format(df, po_number, traxxas_template, consolidate, rejected)
+            stage.set(rows=len(df), bytes=len(content))
+        return content
+    except Exception as e:
+        raise Exception(f"Error formatting for {vendor}: {str(e)}")
+
+
+def stream_format_csv(file_path, vendor, po_number, out, chunksize=CSV_CHUNK_ROWS,
+                      consolidate=False, rejected=None, xref=None, unmapped=None, fast=True):
+    """
+    Format a CSV/INV file chunk by chunk into the binary file object out
+
+    Only the SKU and quantity columns are read and each chunk is written
+    as soon as it is formatted, so memory use does not grow with the file
+    size. The Traxxas template format needs the whole file to decide on
+    variants and is not streamed. With consolidate the SKU and quantity
+    columns are collected before duplicates are merged. rejected works as
+    in format_po; xref and unmapped as in map_skus. Returns the number of
+    valid rows formatted, counted before consolidate merges any.
+
+    Text vendor outputs that copy SKUs and quantities unchanged are written
+    straight from the file bytes when possible (see po_fastcsv); fast=False
+    always uses pandas.
+    """
+    writer = vendor_format(vendor)
+
+    try:
+        columns = read_columns(file_path)
+        sku_col, qty_col = sku_qty_columns(columns, writer.fastserve_layout)
+
+        # Reading, formatting and writing are interleaved, so one stage covers them
+        with po_trace.stage('transform', vendor=vendor, po_number=po_number, file=file_path,
+                            streamed=True) as stage:
+            if (fast and writer.type == 'text' and not writer.sku_transforms and not consolidate
+                    and xref is None and out.seekable()):
+                import po_fastcsv
+
+                start = out.tell()
+                try:
+                    rows = po_fastcsv.write_text(file_path, columns, sku_col, qty_col, writer,
+                                                 po_number, out)
+                    stage.set(rows=rows, path='mmap')
+                    return rows
+                except po_fastcsv.Unsupported:
+                    # Start over with pandas, which validates and reports every row
+                    out.seek(start)
+                    out.truncate()
+
+            def chunks():
+                for chunk in iter_csv_chunks(file_path, [sku_col, qty_col], chunksize):
+                    formatted_df = chunk[[sku_col, qty_col]]
+                    formatted_df.columns = ['Sku', 'Qty']
+                    if xref is not None:
+                        formatted_df = map_skus(formatted_df, vendor, xref, unmapped)
+                    yield formatted_df
+
+            rows = writer.stream(chunks(), po_number, out, consolidate, rejected)
+            stage.set(rows=rows, path='pandas')
+            return rows
+
+    except Exception as e:
+        raise Exception(f"Error formatting for {vendor}: {str(e)}")
+
+
+def write_output(content, file_path):
+    """Write formatted content to disk exactly as produced"""
+    with po_trace.stage('write', file=file_path, bytes=len(content)):
+        with open(file_path, 'wb') as f:
+            f.write(content)
+    return file_path
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Column-pruned .xlsx reader
+
+Reads the header row of the first worksheet, asks the caller which columns
+it needs, then streams the sheet XML with expat and only converts cells in
+those columns. This avoids building a cell object (or a DataFrame column)
+for every cell of wide vendor workbooks, which is what pd.read_excel does.
+
+Anything unusual (date-formatted values in the needed columns, a missing
+header row, unreadable workbook parts) raises UnsupportedWorkbook so the
+caller can fall back to pd.read_excel.
+"""
+
+import posixpath
+import zipfile
+import xml.parsers.expat
+
+
+# Empty cells are read as NaN, like pd.read_excel
+MISSING = float('nan')
+
+
+class UnsupportedWorkbook(Exception):
+    """The workbook needs the full pd.read_excel path"""
+
+
+def _local(name):
+    """Strip a namespace prefix from an element name (x:c -> c)"""
+    return name.rpartition(':')[2]
+
+
+def _column_index(ref):
+    """Zero-based column index of a cell reference such as 'AB12'"""
+    index = 0
+    for char in ref:
+        if char.isdigit():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+
+def _parse(archive, name, start=None, end=None, chars=None):
+    """Run an expat parser with the given handlers over a workbook part"""
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+    if start:
+        parser.StartElementHandler = start
+    if end:
+        parser.EndElementHandler = end
+    if chars:
+        parser.CharacterDataHandler = chars
+    with archive.open(name) as f:
+        parser.ParseFile(f)
+
+
+def _first_sheet_id(archive):
+    """Relationship id of the first sheet listed in xl/workbook.xml, or None"""
+    sheet_ids = []
+
+    def start(name, attrs):
+        if _local(name) == 'sheet':
+            sheet_ids.extend(value for key, value in attrs.items() if _local(key) == 'id')
+
+    _parse(archive, 'xl/workbook.xml', start=start)
+    return sheet_ids[0] if sheet_ids else None
+
+
+def _relationship_targets(archive):
+    """Relationship id -> target of xl/_rels/workbook.xml.rels"""
+    targets = {}
+
+    def start(name, attrs):
+        if _local(name) == 'Relationship':
+            targets[attrs.get('Id')] = attrs.get('Target', '')
+
+    _parse(archive, 'xl/_rels/workbook.xml.rels', start=start)
+    return targets
+
+
+def _first_sheet_path(archive):
+    """Path of the first worksheet listed in the workbook"""
+    names = set(archive.namelist())
+    if 'xl/workbook.xml' in names and 'xl/_rels/workbook.xml.rels' in names:
+        target = _relationship_targets(archive).get(_first_sheet_id(archive))
+        if target is not None:
+            if target.startswith('/'):
+                path = target.lstrip('/')
+            else:
+                path = posixpath.normpath(posixpath.join('xl', target))
+            if path in names:
+                return path
+
+    if 'xl/worksheets/sheet1.xml' in names:
+        return 'xl/worksheets/sheet1.xml'
+    raise UnsupportedWorkbook("No worksheet found")
+
+
+class _StringTable:
+    """expat handlers collecting the shared strings, without phonetic runs"""
+
+    def __init__(self):
+        self.strings = []
+        self.text = None
+        self.capture = False
+        self.phonetic = False
+
+    def start(self, name, attrs):
+        name = _local(name)
+        if name == 'si':
+            self.text = []
+        elif name == 'rPh':
+            self.phonetic = True
+        elif name == 't' and not self.phonetic:
+            self.capture = True
+
+    def end(self, name):
+        name = _local(name)
+        if name == 'si':
+            self.strings.append(''.join(self.text))
+        elif name == 'rPh':
+            self.phonetic = False
+        elif name == 't':
+            self.capture = False
+
+    def chars(self, data):
+        if self.capture:
+            self.text.append(data)
+
+
+def _shared_strings(archive):
+    """Load the shared string table (empty if the workbook has none)"""
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    table = _StringTable()
+    _parse(archive, 'xl/sharedStrings.xml', table.start, table.end, table.chars)
+    return table.strings
+
+
+def _date_styles(archive):
+    """Indexes of cell styles that display numbers as dates or times"""
+    if 'xl/styles.xml' not in archive.namelist():
+        return set()
+
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+    custom_formats = {}
+    style_formats = []
+    state = {'in_xfs': False}
+
+    def start(name, attrs):
+        name = _local(name)
+        if name == 'numFmt':
+            custom_formats[int(attrs.get('numFmtId', 0))] = attrs.get('formatCode', '')
+        elif name == 'cellXfs':
+            state['in_xfs'] = True
+        elif name == 'xf' and state['in_xfs']:
+            style_formats.append(int(attrs.get('numFmtId', 0)))
+
+    def end(name):
+        if _local(name) == 'cellXfs':
+            state['in_xfs'] = False
+
+    _parse(archive, 'xl/styles.xml', start, end)
+
+    date_styles = set()
+    for index, format_id in enumerate(style_formats):
+        format_code = custom_formats.get(format_id, BUILTIN_FORMATS.get(format_id, 'General'))
+        if is_date_format(format_code):
+            date_styles.add(index)
+    return date_styles
+
+
+def _convert(raw, cell_type, style, strings, date_styles):
+    """Convert a raw cell value the way pd.read_excel does"""
+    if cell_type == 's':
+        value = strings[int(raw)]
+    elif cell_type in ('inlineStr', 'str'):
+        value = raw
+    elif cell_type == 'b':
+        return raw == '1'
+    elif cell_type == 'e':
+        # Error cells such as #N/A are read as missing values
+        return MISSING
+    elif cell_type in (None, 'n'):
+        if raw == '':
+            return MISSING
+        if style in date_styles:
+            raise UnsupportedWorkbook("Date values in needed columns")
+        number = float(raw)
+        # Whole-number floats become ints, so SKUs like 1001 do not print as 1001.0
+        return int(number) if number.is_integer() else number
+    else:
+        raise UnsupportedWorkbook(f"Unsupported cell type: {cell_type}")
+
+    return value if value != '' else MISSING
+
+
+def header_names(values):
+    """Name header cells the way pd.read_excel does (Unnamed: n, Qty.1)"""
+    names = []
+    seen = {}
+    for index, value in enumerate(values):
+        name = f"Unnamed: {index}" if value is None or value is MISSING else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+# Rows between progress callbacks
+PROGRESS_ROWS = 10000
+
+
+def _workbook_parts(archive):
+    """(first worksheet path, shared strings, date style indexes) of a workbook"""
+    try:
+        return _first_sheet_path(archive), _shared_strings(archive), _date_styles(archive)
+    except (KeyError, ValueError, xml.parsers.expat.ExpatError) as e:
+        raise UnsupportedWorkbook(str(e))
+
+
+class _SheetReader:
+    """
+    expat handlers collecting the selected columns of a worksheet
+
+    Row 1 is the header; once it is complete, select_columns picks the
+    columns to keep and only their cells are converted from then on.
+    """
+
+    def __init__(self, strings, date_styles, select_columns, progress=None):
+        self.strings = strings
+        self.date_styles = date_styles
+        self.select_columns = select_columns
+        self.progress = progress
+
+        # Current row and column position, and the cell being read
+        self.row = 0
+        self.column = -1
+        self.cell_type = None
+        self.style = None
+        self.wanted = False
+        self.capture = False
+        self.text = []
+        # Last row with a value in any column, selected or not
+        self.last_value_row = 0
+
+        self.header = {}
+        self.row_values = {}
+        self.selected = {}    # column index -> position in usecols
+        self.usecols = []
+        self.data = []
+
+    def start(self, name, attrs):
+        name = _local(name)
+        if name == 'c':
+            self.start_cell(attrs)
+        elif name in ('v', 't'):
+            # Any value in any column keeps the row from being trimmed
+            self.last_value_row = self.row
+            self.capture = self.wanted
+        elif name == 'row':
+            self.start_row(attrs)
+
+    def end(self, name):
+        name = _local(name)
+        if name in ('v', 't'):
+            self.capture = False
+        elif name == 'c' and self.wanted:
+            self.end_cell()
+        elif name == 'row' and self.row > 1:
+            self.end_row()
+
+    def chars(self, text):
+        if self.capture:
+            self.text.append(text)
+
+    def start_row(self, attrs):
+        ref = attrs.get('r')
+        row = int(ref) if ref else self.row + 1
+        if self.row <= 1 < row:
+            # Sheets normally start with the header row
+            if self.row == 0:
+                raise UnsupportedWorkbook("Missing header row")
+            self.finish_header()
+        elif row > self.row + 1 and self.row > 1:
+            # Rows missing from the XML are blank rows in the DataFrame
+            for _ in range(row - self.row - 1):
+                for column in self.data:
+                    column.append(MISSING)
+        self.row = row
+        self.column = -1
+        self.row_values.clear()
+
+    def start_cell(self, attrs):
+        ref = attrs.get('r')
+        self.column = _column_index(ref) if ref else self.column + 1
+        self.cell_type = attrs.get('t')
+        style = attrs.get('s')
+        self.style = int(style) if style else None
+        self.wanted = self.row == 1 or self.column in self.selected
+        self.text = []
+
+    def end_cell(self):
+        value = _convert(''.join(self.text), self.cell_type, self.style, self.strings,
+                         self.date_styles)
+        if self.row == 1:
+            self.header[self.column] = value
+        else:
+            self.row_values[self.column] = value
+
+    def end_row(self):
+        for index, position in self.selected.items():
+            self.data[position].append(self.row_values.get(index, MISSING))
+        if self.progress and self.row % PROGRESS_ROWS == 0:
+            self.progress(self.row - 1)
+
+    def finish_header(self):
+        """Name the header cells and choose the columns to keep"""
+        if not self.header:
+            raise UnsupportedWorkbook("Missing header row")
+        values = [self.header.get(index) for index in range(max(self.header) + 1)]
+        names = header_names(values)
+        wanted = self.select_columns(names)
+        if not wanted:
+            raise UnsupportedWorkbook("Needed columns not found")
+        for col in wanted:
+            self.selected[names.index(col)] = len(self.usecols)
+            self.usecols.append(col)
+            self.data.append([])
+
+    def result(self):
+        """(columns, data) once the whole sheet has been parsed"""
+        if self.row == 1:
+            # Header only, no data rows
+            self.finish_header()
+        elif self.row == 0:
+            raise UnsupportedWorkbook("Empty worksheet")
+
+        # pd.read_excel drops trailing rows with no values in any column
+        length = max(self.last_value_row - 1, 0)
+        return self.usecols, [column[:length] for column in self.data]
+
+
+def read_xlsx_columns(file_path, select_columns, progress=None):
+    """
+    Read selected columns of the first worksheet of an .xlsx file
+
+    select_columns is called with the header names and returns the list of
+    columns to load, or None to load nothing here (UnsupportedWorkbook is
+    raised so the caller reads the whole sheet instead).
+
+    progress, if given, is called with the number of rows read so far every
+    PROGRESS_ROWS rows; an exception it raises stops the read.
+
+    Returns (columns, data) where data holds one list of values per column.
+    """
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise UnsupportedWorkbook(str(e))
+
+    with archive:
+        sheet_path, strings, date_styles = _workbook_parts(archive)
+        reader = _SheetReader(strings, date_styles, select_columns, progress)
+        try:
+            _parse(archive, sheet_path, reader.start, reader.end, reader.chars)
+        except (KeyError, ValueError, IndexError, xml.parsers.expat.ExpatError) as e:
+            raise UnsupportedWorkbook(str(e))
+        return reader.result()
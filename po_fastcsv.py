@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Fast path from plain CSV files to the text vendor formats
+
+FastServe and Stephens files are just the PO number, alternating SKU and
+quantity lines, an end marker and the SKU count, so the SKU and quantity
+text can be copied from the input as is. This module memory-maps the input,
+finds the field boundaries with numpy (commas and line breaks outside
+quotes) and writes the output from slices of the mapped file, without
+building a DataFrame.
+
+Anything the pandas path would treat differently raises Unsupported, and
+the caller formats the file with pandas instead: rows with a different
+number of fields, quoted or missing SKU/quantity fields, SKUs pandas would
+read as missing (NA, null, ...), quantities that are not plain whole
+numbers, lone carriage returns and text that is not valid UTF-8.
+"""
+
+import codecs
+import mmap
+
+import numpy as np
+
+
+# Bytes of input handled at a time; blocks end on a line break
+BLOCK_BYTES = 16 * 1024 * 1024
+
+# Field values pandas reads as missing by default (see pandas.read_csv)
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+NA_LENGTH = max(len(value) for value in NA_VALUES)
+NA_BYTES = np.array(sorted(value.encode() for value in NA_VALUES), dtype=f'S{NA_LENGTH}')
+NA_FIRST_BYTES = np.array(sorted({ord(value[0]) for value in NA_VALUES if value}), dtype=np.uint8)
+
+# Longest quantity copied as is; longer ones may not fit in an int64
+MAX_QTY_DIGITS = 18
+
+COMMA, QUOTE, NEWLINE, RETURN = b',"\n\r'
+
+
+class Unsupported(Exception):
+    """The file needs the pandas path"""
+
+
+def concat_ranges(starts, lengths):
+    """Indices of the byte ranges [start, start + length) one after another"""
+    ends = np.cumsum(lengths)
+    total = int(ends[-1]) if len(ends) else 0
+    offsets = np.repeat(starts - (ends - lengths), lengths)
+    return offsets + np.arange(total)
+
+
+def separators(data):
+    """
+    Positions of the quotes, and of the line breaks and commas outside quotes
+
+    Only the bytes that matter to the CSV structure are looked at after the
+    first pass: a comma or line break is inside quotes when an odd number
+    of quotes comes before it (a uint8 running sum keeps the parity when it
+    wraps around).
+    """
+    positions = np.flatnonzero((data == COMMA) | (data == QUOTE) | (data == NEWLINE))
+    kinds = data[positions]
+    is_quote = kinds == QUOTE
+    outside = ~(np.cumsum(is_quote, dtype=np.uint8) & 1).view(bool) & ~is_quote
+    return (positions[is_quote], positions[outside & (kinds == NEWLINE)],
+            positions[outside & (kinds == COMMA)])
+
+
+def check_quotes(data, quotes):
+    """
+    Quotes must open at the start of a field and close at its end (or be
+    doubled inside it); pandas reads any other quote as a literal character
+    """
+    if len(quotes) % 2:
+        raise Unsupported("Unbalanced quotes")
+    openers = quotes[0::2]
+    closers = quotes[1::2]
+    before = data[np.maximum(openers - 1, 0)]
+    if not (np.isin(before, [COMMA, NEWLINE, QUOTE]) | (openers == 0)).all():
+        raise Unsupported("Quotes inside unquoted fields")
+    after = data[np.minimum(closers + 1, len(data) - 1)]
+    if not (np.isin(after, [COMMA, NEWLINE, RETURN, QUOTE]) | (closers == len(data) - 1)).all():
+        raise Unsupported("Text after a closing quote")
+
+
+class BlockParser:
+    """Finds the SKU and quantity field of each line in a block of CSV bytes"""
+
+    def __init__(self, column_count, sku_index, qty_index):
+        self.column_count = column_count
+        self.sku_index = sku_index
+        self.qty_index = qty_index
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def parse(self, data, breaks, commas, first_line):
+        """
+        (sku_starts, sku_lengths, qty_starts, qty_lengths) for the lines of
+        data from offset first_line on, or None if there are none
+
+        data must end on a line break; breaks and commas are the positions
+        of the line breaks and commas outside quotes.
+        """
+        body = data[first_line:]
+        if (body >= 0x80).any():
+            # pandas would fail on invalid UTF-8 rather than copy it
+            try:
+                self.decoder.decode(body.tobytes())
+            except UnicodeDecodeError:
+                raise Unsupported("Input is not valid UTF-8")
+
+        breaks = breaks[breaks >= first_line]
+        line_starts = np.concatenate(([first_line], breaks[:-1] + 1))
+        line_ends = breaks.copy()
+
+        # CRLF line ends (write_blocks rejects any other carriage return)
+        crlf = line_ends > line_starts
+        crlf[crlf] = data[line_ends[crlf] - 1] == RETURN
+        line_ends[crlf] -= 1
+
+        # pandas skips blank lines
+        keep = line_ends > line_starts
+        line_starts = line_starts[keep]
+        line_ends = line_ends[keep]
+        if not len(line_starts):
+            return None
+
+        # Field separators per line; blank lines have none
+        commas = commas[commas >= first_line]
+        per_line = np.diff(np.searchsorted(commas, line_ends), prepend=0)
+        if (per_line != self.column_count - 1).any():
+            raise Unsupported("Lines with a different number of fields than the header")
+        # Every comma now belongs to a line, in order
+        commas = commas.reshape(len(line_starts), self.column_count - 1)
+
+        sku_starts, sku_lengths = self.field(line_starts, line_ends, commas, self.sku_index)
+        qty_starts, qty_lengths = self.field(line_starts, line_ends, commas, self.qty_index)
+
+        # A field holds quotes only if it starts with one (see check_quotes)
+        if (data[sku_starts] == QUOTE).any() or (data[qty_starts] == QUOTE).any():
+            raise Unsupported("Quoted SKU or quantity fields")
+
+        self.check_skus(data, sku_starts, sku_lengths)
+        self.check_qtys(data, qty_starts, qty_lengths)
+        return sku_starts, sku_lengths, qty_starts, qty_lengths
+
+    def field(self, line_starts, line_ends, commas, index):
+        """Start offsets and lengths of one field on every line"""
+        starts = line_starts if index == 0 else commas[:, index - 1] + 1
+        ends = line_ends if index == self.column_count - 1 else commas[:, index]
+        return starts, ends - starts
+
+    def check_skus(self, data, starts, lengths):
+        """Reject SKUs pandas would read as missing"""
+        candidates = (lengths <= NA_LENGTH) & np.isin(data[starts], NA_FIRST_BYTES)
+        candidates |= lengths == 0
+        if not candidates.any():
+            return
+        # Compare the candidates as fixed-width byte strings in one go
+        starts = starts[candidates]
+        lengths = lengths[candidates]
+        offsets = np.arange(NA_LENGTH)
+        index = np.minimum(starts[:, None] + offsets, len(data) - 1)
+        padded = np.where(offsets < lengths[:, None], data[index], 0).astype(np.uint8)
+        skus = padded.view(f'S{NA_LENGTH}').ravel()
+        if np.isin(skus, NA_BYTES).any():
+            raise Unsupported("Missing SKUs")
+
+    def check_qtys(self, data, starts, lengths):
+        """Quantities must be whole numbers written the way int() prints them"""
+        if ((lengths < 1) | (lengths > MAX_QTY_DIGITS)).any():
+            raise Unsupported("Missing or very long quantities")
+        if (data[starts] == ord('0')).any():
+            # Zero or leading zeros: the pandas path validates or normalises these
+            raise Unsupported("Zero quantities or leading zeros")
+        values = data[concat_ranges(starts, lengths)]
+        if ((values < ord('0')) | (values > ord('9'))).any():
+            raise Unsupported("Quantities that are not plain whole numbers")
+
+
+def body_bytes(data, newline, fields):
+    """Output bytes of a block: newline, SKU, newline, quantity for each line"""
+    sku_starts, sku_lengths, qty_starts, qty_lengths = fields
+    gap = len(newline)
+    row_lengths = 2 * gap + sku_lengths + qty_lengths
+    row_offsets = np.cumsum(row_lengths) - row_lengths
+
+    out = np.empty(int(row_lengths.sum()), dtype=np.uint8)
+    for i, byte in enumerate(newline):
+        out[row_offsets + i] = byte
+        out[row_offsets + gap + sku_lengths + i] = byte
+    out[concat_ranges(row_offsets + gap, sku_lengths)] = data[concat_ranges(sku_starts, sku_lengths)]
+    out[concat_ranges(row_offsets + 2 * gap + sku_lengths, qty_lengths)] = \
+        data[concat_ranges(qty_starts, qty_lengths)]
+    return out
+
+
+def write_blocks(buffer, parser, writer, po_number, out):
+    newline = writer.newline.encode()
+    header = writer.text_lines(writer.header, po_number, None)
+    out.write(writer.newline.join(header).encode())
+    started = bool(header)
+
+    row_count = 0
+    offset = 0
+    first_line = None
+    while offset < len(buffer):
+        data = buffer[offset:offset + BLOCK_BYTES]
+        if offset + len(data) == len(buffer) and data[-1] != NEWLINE:
+            # Last line without a line break
+            data = np.append(data, np.uint8(NEWLINE))
+        quotes, breaks, commas = separators(data)
+        if not len(breaks):
+            raise Unsupported("Line longer than a block")
+
+        # Handle whole lines only; the rest starts the next block
+        length = int(breaks[-1]) + 1
+        data = data[:length]
+        quotes = quotes[quotes < length]
+        commas = commas[commas < length]
+        check_quotes(data, quotes)
+        returns = np.flatnonzero(data == RETURN)
+        if len(returns):
+            returns = returns[np.searchsorted(quotes, returns) % 2 == 0]
+            if (data[returns + 1] != NEWLINE).any():
+                # pandas ends a line at a carriage return on its own
+                raise Unsupported("Lone carriage returns in input")
+        offset += length
+
+        if first_line is None:
+            # Skip the header line
+            first_line = int(breaks[0]) + 1
+        fields = parser.parse(data, breaks, commas, first_line) if first_line < length else None
+        first_line = 0
+        if fields is None:
+            continue
+
+        body = body_bytes(data, newline, fields)
+        out.write(body[0 if started else len(newline):].tobytes())
+        started = True
+        row_count += len(fields[0])
+
+    trailer = writer.newline.join(writer.text_lines(writer.trailer, po_number, row_count))
+    out.write(((writer.newline if started else '') + trailer).encode())
+    return row_count
+
+
+def write_text(file_path, columns, sku_col, qty_col, writer, po_number, out):
+    """
+    Write a text vendor output (writer is its po_vendors.VendorFormat) for a
+    CSV file with the given header columns straight from the file bytes
+
+    Returns the number of rows written. Raises Unsupported, possibly after
+    writing part of the output, when the file needs the pandas path.
+    """
+    if writer.header_count:
+        # The header would have to wait for the whole body
+        raise Unsupported("Header needs the SKU count")
+    columns = list(columns)
+    parser = BlockParser(len(columns), columns.index(sku_col), columns.index(qty_col))
+
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise Unsupported("Empty input")
+
+    try:
+        return write_blocks(np.frombuffer(mapped, dtype=np.uint8), parser, writer, po_number, out)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # An exception traceback still holds views of the mapping; it is
+            # closed when they are collected
+            pass
@@ -1,24 +1,139 @@
 #!/usr/bin/env python3
 import sys
 import os
-import pandas as pd
-import configparser
-import re
-from PySide6.QtWidgets import (QApplication, QMainWindow, QLabel, QComboBox, 
-                             QPushButton, QFileDialog, QVBoxLayout, QHBoxLayout, 
-                             QWidget, QLineEdit, QMessageBox, QFrame)
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QFont, QIcon, QPixmap
+import time
+
+# Reference point for --profile-startup
+STARTUP_TIME = time.perf_counter()
+
+# Headless subcommands, run without creating a QApplication
+CLI_COMMANDS = ('batch', 'serve', 'watch')
+
+
+def run_cli_command(argv):
+    """Run a headless subcommand such as 'batch' and return its exit code"""
+    # Plain imports, so PyInstaller finds and bundles the command modules
+    if argv[0] == 'batch':
+        import po_batch as command
+    elif argv[0] == 'serve':
+        import po_server as command
+    else:
+        import po_watch as command
+    return command.main(argv[1:])
+
+
+def hand_off_file(argv):
+    """
+    Send the file in argv to an already running window (see po_instance)
+
+    Returns True if a window took it, so this launch can exit.
+    """
+    if len(argv) < 2 or not os.path.isfile(argv[1]) or '--profile-startup' in argv:
+        return False
+    if any(arg.startswith('--trace') for arg in argv):
+        # A traced launch records its own window
+        return False
+    import po_instance
+    return po_instance.send_to_running(argv[1:2])
+
+
+def run_early(argv):
+    """
+    Handle the launches that never open a window, before Qt and pandas are
+    imported: pool workers of the frozen executable (started again with
+    --multiprocessing-fork), the headless subcommands and files handed to a
+    running window. Exits the process if one of them applies.
+    """
+    import multiprocessing
+
+    # Runs the worker before any argv handling
+    multiprocessing.freeze_support()
+
+    if len(argv) > 1 and argv[1] in CLI_COMMANDS:
+        sys.exit(run_cli_command(argv[1:]))
+    if hand_off_file(argv):
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    run_early(sys.argv)
+
+# The imports below are deliberately after run_early, so that the launches
+# it handles do not pay for loading Qt and pandas
+import configparser  # noqa: E402
+import threading  # noqa: E402
+import po_engine  # noqa: E402
+import po_trace  # noqa: E402
+from PySide6.QtWidgets import (QApplication, QMainWindow, QLabel, QComboBox,  # noqa: E402
+                               QPushButton, QFileDialog, QVBoxLayout, QHBoxLayout,
+                               QWidget, QLineEdit, QMessageBox, QFrame, QProgressBar,
+                               QCheckBox, QSplitter, QTableView, QHeaderView)
+from PySide6.QtCore import Qt, QTimer, QObject, QRunnable, QThreadPool, Signal  # noqa: E402
+from PySide6.QtGui import QFont, QFontDatabase, QIcon, QPixmap  # noqa: E402
+
+QT_IMPORTED = time.perf_counter()
+
+# Rejected rows listed after saving; the rest are only counted
+MAX_REJECTED_SHOWN = 10
+
+
+class TaskCancelled(Exception):
+    """Raised inside a background task when the user cancels it"""
+
+
+class TaskSignals(QObject):
+    """Signals for BackgroundTask (a QRunnable cannot emit signals itself)"""
+    progress = Signal(str)         # status message
+    finished = Signal(object)      # result of the task
+    failed = Signal(str)           # error message
+    cancelled = Signal()
+
+
+class BackgroundTask(QRunnable):
+    """
+    Run fn(task) on the Qt thread pool so the window stays responsive
+    
+    fn reports progress through task.report(), which also raises
+    TaskCancelled once cancel() has been called. Work that completes
+    anyway (e.g. a file already written) is reported as finished.
+    """
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = TaskSignals()
+        self.cancel_requested = False
+        
+    def cancel(self):
+        self.cancel_requested = True
+        
+    def report(self, message):
+        if self.cancel_requested:
+            raise TaskCancelled()
+        self.signals.progress.emit(message)
+        
+    def run(self):
+        try:
+            result = self.fn(self)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
 
 
 class POFormatter(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'po_formatter.ini')
+        self.config_file = po_engine.CONFIG_FILE
         self.load_settings()
         self.initUI()
         self.current_file = None
         self.df = None
+        self.file_digest = None
+        self.task = None
+        self.pending_files = []
+        self.instance_server = None
         
         # Set window icon
         self.setWindowIcon(self.get_app_icon())
@@ -40,9 +155,11 @@ class POFormatter(QMainWindow):
         return QIcon()
         
     def load_settings(self):
-        """Load saved directory paths from config file"""
+        """Load saved directory paths and options from config file"""
         self.last_input_dir = ""
         self.last_output_dir = ""
+        self.consolidate = False
+        self.map_skus = True
         
         if os.path.exists(self.config_file):
             config = configparser.ConfigParser()
@@ -53,14 +170,25 @@ class POFormatter(QMainWindow):
                     self.last_input_dir = config['Directories']['input_dir']
                 if 'output_dir' in config['Directories']:
                     self.last_output_dir = config['Directories']['output_dir']
+            
+            if 'Options' in config:
+                self.consolidate = config['Options'].getboolean('consolidate', fallback=False)
+                self.map_skus = config['Options'].getboolean('map_skus', fallback=True)
     
     def save_settings(self):
-        """Save directory paths to config file"""
+        """Save directory paths and options to config file"""
+        # Keep other sections, such as [Traxxas Colors], when saving
         config = configparser.ConfigParser()
+        if os.path.exists(self.config_file):
+            config.read(self.config_file)
         config['Directories'] = {
             'input_dir': self.last_input_dir,
             'output_dir': self.last_output_dir
         }
+        config['Options'] = {
+            'consolidate': str(self.consolidate_check.isChecked()),
+            'map_skus': str(self.xref_check.isChecked())
+        }
         
         with open(self.config_file, 'w') as f:
             config.write(f)
@@ -148,34 +276,142 @@ class POFormatter(QMainWindow):
         vendor_layout = QHBoxLayout()
         vendor_label = QLabel('Vendor:')
         self.vendor_combo = QComboBox()
-        self.vendor_combo.addItems(['Select a vendor', 'HorizonHobby/FastServe', 'Stephens', 'HRP', 'AMAIN', 'Traxxas'])
+        self.vendor_combo.addItems(['Select a vendor'] + po_engine.vendor_names())
         self.vendor_combo.setEnabled(False)  # Initially disabled until file is selected
         
         vendor_layout.addWidget(vendor_label)
         vendor_layout.addWidget(self.vendor_combo)
         main_layout.addLayout(vendor_layout)
         
+        # Merge repeated SKUs into one line with the summed quantity
+        self.consolidate_check = QCheckBox('Combine duplicate SKUs')
+        self.consolidate_check.setChecked(self.consolidate)
+        main_layout.addWidget(self.consolidate_check)
+        
+        # Map item numbers to vendor part numbers, when po_formatter.ini
+        # sets a [Cross Reference] file
+        xref_path = po_engine.xref_file(self.config_file)
+        self.xref_check = QCheckBox('Map SKUs through the cross-reference file')
+        self.xref_check.setChecked(self.map_skus)
+        self.xref_check.setEnabled(xref_path is not None)
+        self.xref_check.setToolTip(xref_path or 'No [Cross Reference] file set in po_formatter.ini')
+        main_layout.addWidget(self.xref_check)
+        
         # Action buttons
         button_layout = QHBoxLayout()
         self.process_button = QPushButton('Process')
         self.process_button.setEnabled(False)
         self.process_button.clicked.connect(self.process_file)
         
+        # Shows the formatted output next to the input without saving it
+        self.preview_button = QPushButton('Preview')
+        self.preview_button.setEnabled(False)
+        self.preview_button.clicked.connect(self.preview_file)
+        
+        # Cancels a running load/format, otherwise closes the window
         self.cancel_button = QPushButton('Cancel')
-        self.cancel_button.clicked.connect(self.close)
+        self.cancel_button.clicked.connect(self.cancel_or_close)
         
         button_layout.addWidget(self.process_button)
+        button_layout.addWidget(self.preview_button)
         button_layout.addWidget(self.cancel_button)
         main_layout.addLayout(button_layout)
         
+        # Input and formatted output side by side, shown once a file is loaded
+        self.input_view = self.preview_table()
+        self.output_view = self.preview_table()
+        self.output_view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.preview_splitter = QSplitter(Qt.Horizontal)
+        self.preview_splitter.addWidget(self.input_view)
+        self.preview_splitter.addWidget(self.output_view)
+        self.preview_splitter.hide()
+        main_layout.addWidget(self.preview_splitter, 1)
+        
+        # A preview is stale once the options it was made with change
+        self.po_input.textChanged.connect(self.clear_output_preview)
+        self.vendor_combo.currentIndexChanged.connect(self.clear_output_preview)
+        self.consolidate_check.toggled.connect(self.clear_output_preview)
+        self.xref_check.toggled.connect(self.clear_output_preview)
+        
         # Add spacer at the bottom
         main_layout.addStretch()
         
+        # Progress of a running load/format, hidden when idle
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)  # Busy indicator
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.hide()
+        main_layout.addWidget(self.progress_bar)
+        
         # Status message
         self.status_label = QLabel('')
         self.status_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(self.status_label)
         
+    def preview_table(self):
+        """
+        A table view for the preview pane; rows have a fixed height so the
+        view never measures rows it does not show
+        """
+        view = QTableView()
+        view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 6)
+        view.horizontalHeader().setStretchLastSection(True)
+        view.setWordWrap(False)
+        return view
+        
+    def show_input_preview(self):
+        # po_preview needs numpy, which is kept off the startup path
+        from po_preview import DataFrameModel
+        
+        self.input_view.setModel(DataFrameModel(self.df, self.input_view))
+        self.clear_output_preview()
+        if not self.preview_splitter.isVisible():
+            self.preview_splitter.show()
+            self.resize(max(self.width(), 1000), max(self.height(), 700))
+        
+    def clear_output_preview(self):
+        self.output_view.setModel(None)
+        
+    def start_task(self, fn, on_finished, on_failed, message):
+        """Run fn in the background, showing progress until it completes"""
+        self.task = BackgroundTask(fn)
+        self.task.signals.progress.connect(self.show_progress)
+        self.task.signals.finished.connect(lambda result: self.end_task(on_finished, result))
+        self.task.signals.failed.connect(lambda error: self.end_task(on_failed, error))
+        self.task.signals.cancelled.connect(lambda: self.end_task(self.task_cancelled))
+        
+        self.set_busy(True)
+        self.status_label.setText(message)
+        QThreadPool.globalInstance().start(self.task)
+        
+    def end_task(self, handler, *args):
+        self.task = None
+        self.set_busy(False)
+        handler(*args)
+        if self.pending_files and self.task is None:
+            self.process_command_line_file(self.pending_files.pop(0))
+        
+    def set_busy(self, busy):
+        """Show the progress bar and block new work while a task runs"""
+        self.progress_bar.setVisible(busy)
+        self.browse_button.setEnabled(not busy)
+        self.process_button.setEnabled(not busy and self.df is not None)
+        self.preview_button.setEnabled(not busy and self.df is not None)
+        
+    def show_progress(self, message):
+        self.status_label.setText(message)
+        
+    def cancel_or_close(self):
+        if self.task is not None:
+            self.status_label.setText('Cancelling...')
+            self.task.cancel()
+        else:
+            self.close()
+            
+    def task_cancelled(self):
+        self.status_label.setText('Operation cancelled')
+        
     def browse_file(self):
         # Use last input directory if available
         start_dir = self.last_input_dir if self.last_input_dir else ""
@@ -190,97 +426,158 @@ class POFormatter(QMainWindow):
             self.save_settings()
             
             self.current_file = file_path
-            filename = os.path.basename(file_path)
-            self.file_path_label.setText(filename)
+            self.file_path_label.setText(os.path.basename(file_path))
             
             # Extract PO number from filename (remove extension)
-            # For filenames that are just numbers like 17633.xlsx
-            po_number = os.path.splitext(filename)[0].strip()
+            self.po_input.setText(po_engine.extract_po_number(file_path))
             
-            # If the filename starts with "PO", extract the number part
-            if po_number.upper().startswith('PO'):
-                po_number = po_number[2:].strip()
-                
-            self.po_input.setText(po_number)
-            
-            # Enable PO input and vendor selection
-            self.po_input.setEnabled(True)
-            self.vendor_combo.setEnabled(True)
-            self.process_button.setEnabled(True)
-            
-            try:
-                # Load the file based on extension
-                if file_path.lower().endswith('.csv'):
-                    self.df = pd.read_csv(file_path)
-                elif file_path.lower().endswith('.inv'):
-                    # INV files are typically for Traxxas
-                    self.df = pd.read_csv(file_path)
-                    self.vendor_combo.setCurrentText('Traxxas')
-                else:
-                    self.df = pd.read_excel(file_path)
-                
-                self.status_label.setText(f"File loaded successfully: {len(self.df)} rows")
-                
-                # Try to auto-detect vendor format
-                # For FastServe CSV format
-                if all(col in self.df.columns for col in ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']):
-                    self.vendor_combo.setCurrentText('HorizonHobby/FastServe')
-                
-                # For Traxxas format
-                if set(['SKU', 'QTY']).issubset(self.df.columns):
-                    self.vendor_combo.setCurrentText('Traxxas')
-                elif file_path.lower().endswith('.inv'):
-                    self.vendor_combo.setCurrentText('Traxxas')
-                    
-            except Exception as e:
-                self.status_label.setText(f"Error loading file: {str(e)}")
-                self.df = None
-                self.process_button.setEnabled(False)
+            self.load_file(file_path)
     
-    def process_file(self):
+    def load_file(self, file_path):
+        """Load a PO file into self.df in the background and auto-detect its vendor"""
+        self.df = None
+        
+        def load(task):
+            df = po_engine.load_cached_dataframe(
+                file_path, lambda rows: task.report(f"Loading file... {rows:,} rows")
+            )
+            task.report(f"Detecting vendor format for {len(df):,} rows...")
+            # Identifies the loaded content for the result cache
+            digest = po_engine.file_digest(file_path)
+            return df, po_engine.detect_vendor(df.columns, file_path), digest
+        
+        self.start_task(load, self.file_loaded, self.file_load_failed,
+                        f"Loading {os.path.basename(file_path)}...")
+    
+    def file_loaded(self, result):
+        self.df, vendor, self.file_digest = result
+        self.status_label.setText(f"File loaded successfully: {len(self.df)} rows")
+        
+        # Enable PO input and vendor selection
+        self.po_input.setEnabled(True)
+        self.vendor_combo.setEnabled(True)
+        self.process_button.setEnabled(True)
+        self.preview_button.setEnabled(True)
+        
+        # Use the auto-detected vendor format
+        if vendor:
+            self.vendor_combo.setCurrentText(vendor)
+        
+        self.show_input_preview()
+    
+    def file_load_failed(self, error):
+        self.status_label.setText(f"Error loading file: {error}")
+        self.df = None
+        self.process_button.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.input_view.setModel(None)
+        self.clear_output_preview()
+    
+    def selected_vendor_and_po(self):
+        """(vendor, po_number) to format with, or None after warning the user"""
         if self.df is None:
             QMessageBox.warning(self, "Error", "No valid Excel file loaded")
-            return
+            return None
             
         po_number = self.po_input.text().strip()
         if not po_number:
             QMessageBox.warning(self, "Error", "PO Number is required")
-            return
+            return None
             
         vendor_index = self.vendor_combo.currentIndex()
         if vendor_index == 0:
             QMessageBox.warning(self, "Error", "Please select a vendor")
-            return
+            return None
             
         vendor = self.vendor_combo.currentText()
+        if vendor not in po_engine.vendor_names():
+            QMessageBox.warning(self, "Error", "Invalid vendor selection")
+            return None
         
-        # Ask user where to save the output file
-        default_filename = f"{po_number}_{vendor.replace(' ', '')}"
+        return vendor, po_number
+    
+    def process_file(self):
+        selection = self.selected_vendor_and_po()
+        if selection is None:
+            return
+        vendor, po_number = selection
         
-        try:
-            # Process based on vendor selection
-            if vendor == "HorizonHobby/FastServe":
-                output_path = self.format_horizon_fastserve(po_number)
-            elif vendor == "Stephens":
-                output_path = self.format_stephens(po_number)
-            elif vendor == "HRP":
-                output_path = self.format_hrp(po_number)
-            elif vendor == "AMAIN":
-                output_path = self.format_amain(po_number)
-            elif vendor == "Traxxas":
-                output_path = self.format_traxxas(po_number)
-            else:
-                QMessageBox.warning(self, "Error", "Invalid vendor selection")
-                return
-                
+        def save(df, xref, unmapped, use_template_format):
+            try:
+                self.save_formatted(vendor, po_number, df, xref, unmapped, use_template_format)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+        
+        self.prepare_output(vendor, save, self.file_save_failed)
+    
+    def preview_file(self):
+        selection = self.selected_vendor_and_po()
+        if selection is None:
+            return
+        vendor, po_number = selection
+        self.prepare_output(
+            vendor,
+            lambda *prepared: self.format_preview(vendor, po_number, *prepared),
+            self.preview_failed
+        )
+    
+    def format_preview(self, vendor, po_number, df, xref, unmapped, use_template_format):
+        """Format the prepared PO in the background and show it in the output pane"""
+        format_output = self.output_formatter(df, vendor, po_number, use_template_format, xref,
+                                              unmapped)
+        
+        def format_preview(task):
+            content, rejected = format_output(task)
+            return content, rejected, unmapped
+        
+        self.start_task(format_preview, self.preview_ready, self.preview_failed,
+                        f"Formatting preview for {vendor}...")
+    
+    def preview_ready(self, result):
+        content, rejected, unmapped = result
+        from po_preview import OutputModel
+        
+        self.output_view.setModel(OutputModel(content, self.output_view))
+        message = f"Preview: {self.output_view.model().rowCount():,} lines"
+        if rejected:
+            message += f", {len(rejected):,} rows with an invalid quantity left out"
+        if unmapped:
+            message += f", {len(unmapped):,} SKUs not in the cross-reference file"
+        self.status_label.setText(message)
+    
+    def preview_failed(self, error):
+        self.status_label.setText(f"Error formatting preview: {error}")
+    
+    def file_saved(self, result):
+        output_path, rejected, unmapped = result
+        if rejected or unmapped:
+            # Valid rows were saved; list the rows that were left out and
+            # the SKUs the cross-reference file does not know
+            message = f"File saved as:\n{output_path}"
+            if rejected:
+                shown = [f"Row {row['row']} ({row['sku']}): {row['reason']}"
+                         for row in rejected[:MAX_REJECTED_SHOWN]]
+                if len(rejected) > MAX_REJECTED_SHOWN:
+                    shown.append(f"... and {len(rejected) - MAX_REJECTED_SHOWN} more")
+                message += (f"\n\n{len(rejected)} rows with an invalid quantity were left out:\n"
+                            + "\n".join(shown))
+            if unmapped:
+                shown = unmapped[:MAX_REJECTED_SHOWN]
+                if len(unmapped) > MAX_REJECTED_SHOWN:
+                    shown.append(f"... and {len(unmapped) - MAX_REJECTED_SHOWN} more")
+                message += (f"\n\n{len(unmapped)} SKUs are not in the cross-reference file "
+                            "and were kept as they are:\n" + "\n".join(shown))
+            QMessageBox.warning(self, "Saved with Warnings", message)
+        else:
             QMessageBox.information(
-                self, "Success", 
+                self, "Success",
                 f"File successfully processed and saved as:\n{output_path}"
             )
-            self.reset_ui()
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+        self.reset_ui()
+    
+    def file_save_failed(self, error):
+        self.status_label.setText('')
+        QMessageBox.critical(self, "Error", f"An error occurred: {error}")
     
     def reset_ui(self):
         self.current_file = None
@@ -291,442 +588,124 @@ class POFormatter(QMainWindow):
         self.vendor_combo.setCurrentIndex(0)
         self.vendor_combo.setEnabled(False)
         self.process_button.setEnabled(False)
+        self.preview_button.setEnabled(False)
+        self.input_view.setModel(None)
+        self.clear_output_preview()
         self.status_label.setText('')
     
-    # Vendor-specific formatting methods
-    def format_horizon_fastserve(self, po_number):
-        """
-        Format for HorizonHobby/FastServe
-        Expected format:
-        - Line 1: PO number
-        - Following lines: Alternating SKU and quantity lines
-        - Second-to-last line: "end" (lowercase)
-        - Last line: Count of SKUs
-        
-        Can process:
-        1. Excel files with Sku and Qty columns
-        2. CSV files with PO_NUMBER, ITEM_NUMBER, DESCRIPTION, QTY, UNIT_PRICE, TOTAL columns
-        """
-        try:
-            processed_df = self.df.copy()
-            
-            # Check if this is a CSV format with the expected columns
-            if all(col in processed_df.columns for col in ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']):
-                # Use the CSV format columns
-                formatted_df = processed_df[['ITEM_NUMBER', 'QTY']]
-                formatted_df.columns = ['Sku', 'Qty']
-            else:
-                # Check for required columns from Excel format
-                required_columns = ['Sku', 'Qty']
-                missing_columns = [col for col in required_columns if col not in processed_df.columns]
-                
-                if missing_columns:
-                    # Try to find similar column names
-                    sku_columns = [col for col in processed_df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
-                    qty_columns = [col for col in processed_df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
-                    
-                    if sku_columns and qty_columns:
-                        # Use the first matching columns
-                        formatted_df = processed_df[[sku_columns[0], qty_columns[0]]].copy()
-                        formatted_df.columns = ['Sku', 'Qty']
-                    else:
-                        raise ValueError(f"Input file missing required columns: {', '.join(missing_columns)}")
-                else:
-                    # Get only the needed columns
-                    formatted_df = processed_df[['Sku', 'Qty']]
-            
-            # Create the formatted content as lines
-            # Start with PO number as first line
-            lines = [po_number]
-            
-            # Add each SKU and quantity on separate lines
-            for index, row in formatted_df.iterrows():
-                lines.append(str(row['Sku']))
-                lines.append(str(int(row['Qty'])))
-            
-            # Add the 'end' marker and SKU count - using lowercase 'end' as required
-            sku_count = len(formatted_df)
-            lines.append("end")
-            lines.append(str(sku_count))
-            
-            # Ask user where to save the file
-            # Use last output directory if available, otherwise use input directory
-            start_dir = self.last_output_dir if self.last_output_dir else self.last_input_dir
-            default_name = f"FastServe-{po_number}.txt"
-            start_path = os.path.join(start_dir, default_name) if start_dir else default_name
-            
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, 'Save Formatted File', start_path, 'Text Files (*.txt)'
-            )
-            
-            if not file_path:
-                raise ValueError("Save operation cancelled by user")
-            
-            # Store the output directory for future use
-            self.last_output_dir = os.path.dirname(file_path)
-            self.save_settings()
-            
-            # Write content to file - ensure proper line endings
-            with open(file_path, 'w', newline='\n') as f:
-                f.write('\n'.join(lines))
-            
-            return file_path
-            
-        except Exception as e:
-            raise Exception(f"Error formatting for HorizonHobby/FastServe: {str(e)}")
+    def ask_traxxas_template(self):
+        """Ask whether to use the Traxxas template format with a variant field"""
+        variant_dialog = QMessageBox()
+        variant_dialog.setWindowTitle("Color Variants Detected")
+        variant_dialog.setText("Color variants detected in SKUs. Use template format with variant field?")
+        variant_dialog.setIcon(QMessageBox.Question)
+        
+        yes_button = variant_dialog.addButton("Yes", QMessageBox.YesRole)
+        variant_dialog.addButton("No", QMessageBox.NoRole)
+        
+        variant_dialog.exec()
+        return variant_dialog.clickedButton() == yes_button
     
-    def format_stephens(self, po_number):
+    def prepare_output(self, vendor, on_ready, on_failed):
         """
-        Format for Stephens International
-        Format:
-        - Line 1: PO number
-        - Lines 2, 4, 6, etc.: Product SKUs
-        - Lines 3, 5, 7, etc.: Quantities for corresponding SKUs
-        - Second-to-last line: "END" marker
-        - Last line: Count of products ordered
+        Map the loaded PO's SKUs and look for color variants in the
+        background, then call on_ready(df, xref, unmapped, use_template_format)
+        once the user has answered the variant question
         """
-        try:
-            processed_df = self.df.copy()
-            
-            # Check if this is a CSV format with the expected columns
-            if all(col in processed_df.columns for col in ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']):
-                # Use the CSV format columns
-                formatted_df = processed_df[['ITEM_NUMBER', 'QTY']]
-                formatted_df.columns = ['Sku', 'Qty']
-            else:
-                # Check for required columns
-                required_columns = ['Sku', 'Qty']
-                missing_columns = [col for col in required_columns if col not in processed_df.columns]
-                
-                if missing_columns:
-                    # Try to find similar column names
-                    sku_columns = [col for col in processed_df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
-                    qty_columns = [col for col in processed_df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
-                    
-                    if sku_columns and qty_columns:
-                        # Use the first matching columns
-                        formatted_df = processed_df[[sku_columns[0], qty_columns[0]]].copy()
-                        formatted_df.columns = ['Sku', 'Qty']
-                    else:
-                        raise ValueError(f"Input file missing required columns: {', '.join(missing_columns)}")
-                else:
-                    # Get only the needed columns
-                    formatted_df = processed_df[['Sku', 'Qty']]
-            
-            # Create the formatted content
-            lines = []
-            
-            # First line: PO number
-            lines.append(po_number)
-            
-            # Add each product as a pair of lines (SKU line followed by quantity line)
-            for index, row in formatted_df.iterrows():
-                # SKU line
-                lines.append(str(row['Sku']))
-                # Quantity line
-                lines.append(str(int(row['Qty'])))
-            
-            # Add the END marker
-            lines.append("END")
-            
-            # Last line: count of products
-            product_count = len(formatted_df)
-            lines.append(str(product_count))
-            
-            # Ask user where to save the file
-            # Use last output directory if available, otherwise use input directory
-            start_dir = self.last_output_dir if self.last_output_dir else self.last_input_dir
-            default_name = f"{po_number}_Stephens.txt"
-            start_path = os.path.join(start_dir, default_name) if start_dir else default_name
-            
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, 'Save Formatted File', start_path, 'Text Files (*.txt)'
-            )
-            
-            if not file_path:
-                raise ValueError("Save operation cancelled by user")
-            
-            # Store the output directory for future use
-            self.last_output_dir = os.path.dirname(file_path)
-            self.save_settings()
-            
-            # Write content to file
-            with open(file_path, 'w') as f:
-                f.write('\n'.join(lines))
-            
-            return file_path
-            
-        except Exception as e:
-            raise Exception(f"Error formatting for Stephens: {str(e)}")
+        df = self.df
+        config_file = self.config_file
+        map_skus = self.xref_check.isChecked()
+        
+        def prepare(task):
+            # Map item numbers to the vendor's part numbers first, so the
+            # variant question sees the SKUs that will be written
+            mapped = df
+            xref = None
+            unmapped = []
+            xref_path = po_engine.xref_file(config_file) if map_skus else None
+            if xref_path:
+                task.report("Mapping SKUs through the cross-reference file...")
+                xref = po_engine.cross_reference(xref_path)
+                mapped = po_engine.map_skus(df, vendor, xref, unmapped)
+            variants = po_engine.has_template_format(vendor) and po_engine.has_color_variants(mapped)
+            return mapped, xref, unmapped, variants
+        
+        def prepared(result):
+            mapped, xref, unmapped, variants = result
+            # Ask user if they want to use the Traxxas variant template
+            use_template_format = variants and self.ask_traxxas_template()
+            on_ready(mapped, xref, unmapped, use_template_format)
+        
+        self.start_task(prepare, prepared, on_failed, f"Preparing output for {vendor}...")
     
-    def format_hrp(self, po_number):
+    def output_formatter(self, df, vendor, po_number, use_template_format, xref, unmapped):
         """
-        Format for HRP
-        Expected format: CSV with columns:
-        - PART # (SKU)
-        - QTY
-        - WAREHOUSE(Optional)
-        
-        Output: CSV file only
+        A background task function returning (content, rejected) for the
+        loaded PO, reusing the output of an earlier run with the same options
         """
-        try:
-            processed_df = self.df.copy()
-            
-            # Check if this is a CSV format with the expected columns
-            if all(col in processed_df.columns for col in ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']):
-                # Use the CSV format columns
-                formatted_df = processed_df[['ITEM_NUMBER', 'QTY']]
-                formatted_df.columns = ['Sku', 'Qty']
-            else:
-                # Check for required columns
-                required_columns = ['Sku', 'Qty']
-                missing_columns = [col for col in required_columns if col not in processed_df.columns]
-                
-                if missing_columns:
-                    # Try to find similar column names
-                    sku_columns = [col for col in processed_df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
-                    qty_columns = [col for col in processed_df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
-                    
-                    if sku_columns and qty_columns:
-                        # Use the first matching columns
-                        formatted_df = processed_df[[sku_columns[0], qty_columns[0]]].copy()
-                        formatted_df.columns = ['Sku', 'Qty']
-                    else:
-                        raise ValueError(f"Input file missing required columns: {', '.join(missing_columns)}")
-                else:
-                    # Get only the needed columns
-                    formatted_df = processed_df[['Sku', 'Qty']]
-            
-            # Create the output dataframe with the HRP required format
-            hrp_df = pd.DataFrame()
-            hrp_df['PART #'] = formatted_df['Sku']
-            hrp_df['QTY'] = formatted_df['Qty'].astype(int)
-            # Add empty WAREHOUSE column - will use user's default warehouse
-            hrp_df['WAREHOUSE(Optional)'] = ""
-            
-            # Ask user where to save the file
-            # Use last output directory if available, otherwise use input directory
-            start_dir = self.last_output_dir if self.last_output_dir else self.last_input_dir
-            default_name = f"{po_number}_HRP.csv"
-            file_filter = 'CSV Files (*.csv)'
-                
-            start_path = os.path.join(start_dir, default_name) if start_dir else default_name
-            
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, 'Save Formatted File', start_path, file_filter
-            )
-            
-            if not file_path:
-                raise ValueError("Save operation cancelled by user")
-            
-            # Store the output directory for future use
-            self.last_output_dir = os.path.dirname(file_path)
-            self.save_settings()
-            
-            # Save as CSV
-            hrp_df.to_csv(file_path, index=False)
-                
-            return file_path
-            
-        except Exception as e:
-            raise Exception(f"Error formatting for HRP: {str(e)}")
+        digest = self.file_digest
+        consolidate = self.consolidate_check.isChecked()
+        
+        def format_output(task):
+            # Reuse the output of an earlier run on the same file and options
+            cache = po_engine.result_cache()
+            cache_key = po_engine.result_key(digest, vendor, po_number, use_template_format,
+                                             consolidate, xref)
+            cached = cache.read(cache_key)
+            rejected = []
+            if cached is not None:
+                return cached[1], rejected
+            
+            task.report(f"Formatting {len(df):,} rows for {vendor}...")
+            content = po_engine.format_po(df, vendor, po_number, use_template_format,
+                                          consolidate, rejected)
+            # Outputs with rejected rows or unmapped SKUs are formatted
+            # again so these are reported
+            if not rejected and not unmapped:
+                meta = {'vendor': vendor, 'rows': len(df), 'template': use_template_format}
+                cache.put(cache_key, meta, content)
+            return content, rejected
+        
+        return format_output
     
-    def format_amain(self, po_number):
+    def save_formatted(self, vendor, po_number, df, xref, unmapped, use_template_format):
         """
-        Format for AMAIN
-        CSV format with SKU, Quantity
+        Ask where to save, then format the prepared PO (see prepare_output)
+        with the engine and write it in the background
         """
-        try:
-            processed_df = self.df.copy()
-            
-            # Check for required columns
-            required_columns = ['Sku', 'Qty']
-            missing_columns = [col for col in required_columns if col not in processed_df.columns]
-            
-            if missing_columns:
-                # Try to find similar column names
-                sku_columns = [col for col in processed_df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
-                qty_columns = [col for col in processed_df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
-                
-                if sku_columns and qty_columns:
-                    # Use the first matching columns
-                    formatted_df = processed_df[[sku_columns[0], qty_columns[0]]].copy()
-                    formatted_df.columns = ['Sku', 'Qty']
-                else:
-                    raise ValueError(f"Input file missing required columns: {', '.join(missing_columns)}")
-            else:
-                # Get only the needed columns
-                formatted_df = processed_df[['Sku', 'Qty']]
-            
-            # Make sure Qty is an integer
-            formatted_df['Qty'] = formatted_df['Qty'].astype(int)
-            
-            # CSV format for AMAIN
-            # Ask user where to save the file
-            # Use last output directory if available, otherwise use input directory
-            start_dir = self.last_output_dir if self.last_output_dir else self.last_input_dir
-            default_name = f"{po_number}.csv"
-            start_path = os.path.join(start_dir, default_name) if start_dir else default_name
-            
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, 'Save Formatted File', start_path, 'CSV Files (*.csv)'
-            )
-            
-            if not file_path:
-                raise ValueError("Save operation cancelled by user")
-            
-            # Store the output directory for future use
-            self.last_output_dir = os.path.dirname(file_path)
-            self.save_settings()
-            
-            # Save to CSV without index
-            formatted_df.to_csv(file_path, index=False)
-            
-            return file_path
-            
-        except Exception as e:
-            raise Exception(f"Error formatting for AMAIN: {str(e)}")
-    
-    def format_traxxas(self, po_number):
-        """
-        Format for Traxxas
-        Expected format: CSV with sku, qty columns (and optional variant field for color options)
-        Output: CSV file only
-        """
-        try:
-            processed_df = self.df.copy()
-            
-            # Check for color variants in Item/SKU columns (like RED, GRN, BLUE in the SKU)
-            has_variants = False
-            
-            # Try to find relevant columns for processing
-            sku_columns = [col for col in processed_df.columns if 'sku' in col.lower() or 'item' in col.lower() or 'part' in col.lower()]
-            qty_columns = [col for col in processed_df.columns if 'qty' in col.lower() or 'quantity' in col.lower()]
-            
-            if not sku_columns or not qty_columns:
-                raise ValueError("Could not find required SKU and QTY columns. File must have columns for item SKU and quantity.")
-            
-            # Select the best columns to use
-            sku_col = 'Sku' if 'Sku' in processed_df.columns else sku_columns[0]
-            qty_col = 'Qty' if 'Qty' in processed_df.columns else qty_columns[0]
-            
-            # Check if Item or SKU column has color variants in the format XXXXX-COLOR
-            color_pattern = r'-([A-Z]+)$'  # Matches -RED, -GRN, -BLUE at the end of string
-            sample_skus = processed_df[sku_col].astype(str).tolist()
-            
-            for sku in sample_skus:
-                if re.search(color_pattern, sku):
-                    has_variants = True
-                    break
-            
-            # Ask user if they want to use the variant template
-            use_template_format = False
-            if has_variants:
-                variant_dialog = QMessageBox()
-                variant_dialog.setWindowTitle("Color Variants Detected")
-                variant_dialog.setText("Color variants detected in SKUs. Use template format with variant field?")
-                variant_dialog.setIcon(QMessageBox.Question)
-                
-                yes_button = variant_dialog.addButton("Yes", QMessageBox.YesRole)
-                no_button = variant_dialog.addButton("No", QMessageBox.NoRole)
-                
-                variant_dialog.exec()
-                use_template_format = variant_dialog.clickedButton() == yes_button
-            
-            # Create the output dataframe based on selected format
-            if use_template_format:
-                # New template format with sku, qty, variant, comment
-                traxxas_df = pd.DataFrame(columns=['sku', 'qty', 'variant', 'comment'])
-                
-                # Process each row and handle variants
-                rows = []
-                for _, row in processed_df.iterrows():
-                    sku = str(row[sku_col])
-                    qty = row[qty_col]
-                    variant = ""
-                    
-                    # Extract variant from SKU if it exists
-                    if has_variants:
-                        match = re.search(color_pattern, sku)
-                        if match:
-                            color_code = match.group(1)
-                            # Convert color codes to full color names
-                            if color_code == "RED":
-                                variant = "Red"
-                            elif color_code == "GRN":
-                                variant = "Green"
-                            elif color_code == "BLU" or color_code == "BLUE":
-                                variant = "Blue"
-                            elif color_code == "YEL":
-                                variant = "Yellow"
-                            elif color_code == "BLK":
-                                variant = "Black"
-                            elif color_code == "WHT":
-                                variant = "White"
-                            elif color_code == "PNK":
-                                variant = "Pink"
-                            elif color_code == "PUR":
-                                variant = "Purple"
-                            elif color_code == "ORG":
-                                variant = "Orange"
-                            else:
-                                variant = color_code  # Use code as is if not recognized
-                            
-                            # Remove the color code from the SKU
-                            sku = sku.rsplit('-', 1)[0]
-                    
-                    # Remove "tra" prefix from SKUs if present
-                    if sku.lower().startswith('tra'):
-                        sku = sku[3:]
-                        
-                    rows.append({
-                        'sku': sku,
-                        'qty': qty,
-                        'variant': variant,
-                        'comment': ""
-                    })
-                
-                traxxas_df = pd.DataFrame(rows)
-            else:
-                # Standard format (just SKU and QTY)
-                traxxas_df = pd.DataFrame()
-                traxxas_df['SKU'] = processed_df[sku_col].astype(str)
-                traxxas_df['QTY'] = processed_df[qty_col]
-                
-                # Remove "tra" prefix from SKUs if present
-                traxxas_df['SKU'] = traxxas_df['SKU'].apply(
-                    lambda sku: sku[3:] if sku.lower().startswith('tra') else sku
-                )
-            
-            # Ask user where to save the file
-            # Use last output directory if available, otherwise use input directory
-            start_dir = self.last_output_dir if self.last_output_dir else self.last_input_dir
-            
-            if use_template_format:
-                default_name = f"{po_number}_Traxxas_Template.csv"
-            else:
-                default_name = f"{po_number}_Traxxas.csv"
-                    
+        # Ask user where to save the file
+        # Use last output directory if available, otherwise use input directory
+        start_dir = self.last_output_dir if self.last_output_dir else self.last_input_dir
+        default_name = po_engine.default_output_name(vendor, po_number, use_template_format)
+        start_path = os.path.join(start_dir, default_name) if start_dir else default_name
+        
+        if default_name.endswith('.txt'):
+            file_filter = 'Text Files (*.txt)'
+        else:
             file_filter = 'CSV Files (*.csv)'
-            start_path = os.path.join(start_dir, default_name) if start_dir else default_name
-            
+        
+        with po_trace.stage('save dialog', vendor=vendor, po_number=po_number):
             file_path, _ = QFileDialog.getSaveFileName(
                 self, 'Save Formatted File', start_path, file_filter
             )
-            
-            if not file_path:
-                raise ValueError("Save operation cancelled by user")
-            
-            # Store the output directory for future use
-            self.last_output_dir = os.path.dirname(file_path)
-            self.save_settings()
-            
-            # Save in requested format
-            traxxas_df.to_csv(file_path, index=False)
-            return file_path
-            
-        except Exception as e:
-            raise Exception(f"Error formatting for Traxxas: {str(e)}")
+        
+        if not file_path:
+            raise ValueError("Save operation cancelled by user")
+        
+        # Store the output directory for future use
+        self.last_output_dir = os.path.dirname(file_path)
+        self.save_settings()
+        
+        format_output = self.output_formatter(df, vendor, po_number, use_template_format, xref,
+                                              unmapped)
+        
+        def format_and_write(task):
+            content, rejected = format_output(task)
+            task.report(f"Saving {len(df):,} rows...")
+            return po_engine.write_output(content, file_path), rejected, unmapped
+        
+        self.start_task(format_and_write, self.file_saved, self.file_save_failed,
+                        f"Formatting for {vendor}...")
 
     def process_command_line_file(self, file_path):
         """
@@ -737,60 +716,63 @@ class POFormatter(QMainWindow):
             return
         
         self.current_file = file_path
-        filename = os.path.basename(file_path)
-        self.file_path_label.setText(filename)
+        self.file_path_label.setText(os.path.basename(file_path))
         
         # Extract PO number from filename (remove extension)
-        po_number = os.path.splitext(filename)[0].strip()
-        
-        # If the filename starts with "PO", extract the number part
-        if po_number.upper().startswith('PO'):
-            po_number = po_number[2:].strip()
+        self.po_input.setText(po_engine.extract_po_number(file_path))
         
-        self.po_input.setText(po_number)
+        # Store the directory for future use
+        self.last_input_dir = os.path.dirname(file_path)
+        self.save_settings()
         
-        try:
-            # Load the file based on extension
-            if file_path.lower().endswith('.csv'):
-                self.df = pd.read_csv(file_path)
-            elif file_path.lower().endswith('.inv'):
-                # INV files are typically for Traxxas
-                self.df = pd.read_csv(file_path)
-                self.vendor_combo.setCurrentText('Traxxas')
-            else:
-                self.df = pd.read_excel(file_path)
-            
-            self.status_label.setText(f"File loaded successfully: {len(self.df)} rows")
-            
-            # Enable PO input and vendor selection
-            self.po_input.setEnabled(True)
-            self.vendor_combo.setEnabled(True)
-            self.process_button.setEnabled(True)
-            
-            # Store the directory for future use
-            self.last_input_dir = os.path.dirname(file_path)
-            self.save_settings()
-            
-            # Try to auto-detect vendor format
-            # For FastServe CSV format
-            if all(col in self.df.columns for col in ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']):
-                self.vendor_combo.setCurrentText('HorizonHobby/FastServe')
-            
-            # For Traxxas format
-            if set(['SKU', 'QTY']).issubset(self.df.columns):
-                self.vendor_combo.setCurrentText('Traxxas')
-            elif file_path.lower().endswith('.inv'):
-                self.vendor_combo.setCurrentText('Traxxas')
-                
-        except Exception as e:
-            self.status_label.setText(f"Error loading file: {str(e)}")
-            self.df = None
-            self.process_button.setEnabled(False)
+        self.load_file(file_path)
+
+    def open_forwarded_file(self, file_path):
+        """Open a file handed over by a later launch and bring the window forward"""
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+        
+        if self.task is not None:
+            # Open it once the running load or save finishes
+            self.pending_files.append(file_path)
+            return
+        self.process_command_line_file(file_path)
+
+
+def warm_engine(timings):
+    """Import pandas and openpyxl in the background once the window is up"""
+    po_engine.preload()
+    timings['engine_ready'] = time.perf_counter() - STARTUP_TIME
+
+
+def report_startup(app, timings, warmup):
+    """Print startup timings for --profile-startup and quit"""
+    timings['window_shown'] = time.perf_counter() - STARTUP_TIME
+    warmup.join()
+    
+    print(f"Qt imported:     {timings['qt_imported'] * 1000:.0f} ms")
+    print(f"Window shown:    {timings['window_shown'] * 1000:.0f} ms")
+    print(f"pandas ready:    {timings['engine_ready'] * 1000:.0f} ms")
+    app.quit()
 
 
 def main():
+    # Subcommands and files for a running window were dispatched at the top
+    # of the module, before Qt and pandas were imported
+    
+    # --profile-startup reports how long the window takes to appear
+    profile_startup = '--profile-startup' in sys.argv
+    argv = [arg for arg in sys.argv if arg != '--profile-startup']
+    timings = {'qt_imported': QT_IMPORTED - STARTUP_TIME}
+    
+    # --trace records each load and save, written out when the window closes
+    trace_options, argv = po_trace.parse_known_args(argv)
+    po_trace.start(trace_options)
+
     # Set application info
-    app = QApplication(sys.argv)
+    app = QApplication(argv)
     app.setApplicationName("PO Formatter")
     app.setApplicationVersion("1.0.0")
     app.setOrganizationName("WVHobby")
@@ -811,13 +793,35 @@ def main():
     # Create and show the main window
     window = POFormatter()
     
-    # Handle command line arguments - if a file path is provided, open it
-    if len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
-        window.process_command_line_file(sys.argv[1])
+    # Files opened while the window is up arrive from later launches
+    if not profile_startup:
+        import po_instance
+        window.instance_server = po_instance.listen(window.open_forwarded_file, window)
+        if (window.instance_server is None and not trace_options.trace
+                and len(argv) > 1 and os.path.isfile(argv[1])):
+            # Another window started at the same time and took the socket.
+            # A traced launch keeps its own window so the trace is written.
+            if po_instance.send_to_running(argv[1:2]):
+                sys.exit(0)
     
     window.show()
-    sys.exit(app.exec())
+    
+    # Load pandas in the background so the window paints without waiting for it
+    warmup = threading.Thread(target=warm_engine, args=(timings,), daemon=True)
+    warmup.start()
+    
+    # Handle command line arguments - if a file path is provided, open it
+    # once the event loop is running so the window is painted first
+    if len(argv) > 1 and os.path.isfile(argv[1]):
+        QTimer.singleShot(0, lambda: window.process_command_line_file(argv[1]))
+    
+    if profile_startup:
+        QTimer.singleShot(0, lambda: report_startup(app, timings, warmup))
+    
+    status = app.exec()
+    po_trace.finish(trace_options)
+    sys.exit(status)
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
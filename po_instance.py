@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Single-instance support for the PO Formatter window
+
+The first window listens on a local socket (a named pipe on Windows, a
+Unix domain socket elsewhere). Later launches with a file connect to it,
+send the file's absolute path and exit, so opening another PO does not
+start a second copy of Qt and pandas. The running window loads the file
+and comes to the front.
+
+Only QtCore and QtNetwork are needed to hand a file over; po_formatter.py
+does this before importing the widgets and the formatting engine.
+"""
+
+import getpass
+import os
+
+
+# Milliseconds a later launch waits for the running window
+CONNECT_TIMEOUT_MS = 500
+WRITE_TIMEOUT_MS = 2000
+
+
+def server_name():
+    """Local socket name, per user so users on one machine get their own window"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'user'
+    return f"WVHobby-POFormatter-{user}"
+
+
+def send_to_running(paths):
+    """
+    Hand the files to an already running window
+
+    Returns False, without sending anything, when no window is listening.
+    """
+    from PySide6.QtNetwork import QLocalSocket
+
+    socket = QLocalSocket()
+    socket.connectToServer(server_name())
+    if not socket.waitForConnected(CONNECT_TIMEOUT_MS):
+        return False
+
+    message = '\n'.join(os.path.abspath(path) for path in paths) + '\n'
+    socket.write(message.encode('utf-8'))
+    sent = socket.waitForBytesWritten(WRITE_TIMEOUT_MS)
+    socket.disconnectFromServer()
+    if socket.state() != QLocalSocket.LocalSocketState.UnconnectedState:
+        socket.waitForDisconnected(WRITE_TIMEOUT_MS)
+    return sent
+
+
+def is_running(name):
+    """True if a window answers on the local socket"""
+    from PySide6.QtNetwork import QLocalSocket
+
+    probe = QLocalSocket()
+    probe.connectToServer(name)
+    if probe.waitForConnected(CONNECT_TIMEOUT_MS):
+        probe.abort()
+        return True
+    return False
+
+
+def listen(on_file, parent=None):
+    """
+    Start listening for files from later launches; on_file is called with
+    each path
+
+    Returns the QLocalServer, or None when another window got there first
+    (send the files to it instead) or the socket cannot be opened, in which
+    case the window runs on its own.
+    """
+    from PySide6.QtNetwork import QLocalServer, QLocalSocket
+
+    name = server_name()
+    # On Unix, listen() with socket options replaces a live window's socket
+    if is_running(name):
+        return None
+
+    server = QLocalServer(parent)
+    server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+    if not server.listen(name):
+        # Most likely a socket left behind by a window that crashed; remove
+        # it only if still nobody answers on it, then try once more
+        if is_running(name):
+            return None
+        QLocalServer.removeServer(name)
+        if not server.listen(name):
+            print(f"Cannot listen on {name}: {server.errorString()}. "
+                  f"Files opened later will start their own window.")
+            return None
+
+    def accept():
+        while server.hasPendingConnections():
+            connection = server.nextPendingConnection()
+            received = []
+
+            def read(connection=connection, received=received):
+                received.append(bytes(connection.readAll().data()))
+
+            def finish(connection=connection, received=received):
+                read()
+                for path in b''.join(received).decode('utf-8', 'replace').splitlines():
+                    if path:
+                        on_file(path)
+                connection.deleteLater()
+
+            connection.readyRead.connect(read)
+            connection.disconnected.connect(finish)
+            if connection.state() == QLocalSocket.LocalSocketState.UnconnectedState:
+                # The launch sent its files and hung up before we got here
+                finish()
+
+    server.newConnection.connect(accept)
+    return server
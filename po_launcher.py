@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Launcher for the persistent-runtime build of PO Formatter
+
+A onefile PyInstaller executable unpacks the whole application (Qt, pandas,
+...) to a fresh _MEI temp folder on every launch. The persistent build
+(python build.py --persistent) instead ships this small launcher as
+PO_Formatter.exe, with the application's onedir bundle appended to it as a
+zip archive. The launcher is itself a onedir build (PO_Formatter.exe plus
+its _internal folder), so starting it extracts nothing. It unpacks the
+bundle once into a folder named after its version and starts the
+application from there; later launches find the folder and start straight
+away. Folders of other versions are removed unless a running launcher
+marked them as in use.
+
+The runtime folder is PO_Formatter_runtime next to the executable (so it
+travels with a USB stick), or the user's local cache folder when that is
+not writable. Set PO_FORMATTER_RUNTIME to use another folder. The bundle is
+read from the executable itself, or from PO_Formatter.runtime.zip next to
+it.
+
+Only the standard library is used, so the launcher's own folder is small.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+import zipfile
+
+
+APP_NAME = 'PO_Formatter'
+
+# Executable of the onedir bundle, relative to its folder
+APP_EXECUTABLE = 'PO_Formatter_app.exe' if sys.platform == 'win32' else 'PO_Formatter_app'
+
+# The windowed launcher, which carries the bundle, and the same launcher
+# built with a console for the batch, serve and watch commands (a windowed
+# executable has nowhere to print to)
+LAUNCHER_EXECUTABLE = f'{APP_NAME}.exe' if sys.platform == 'win32' else APP_NAME
+CLI_NAME = f'{APP_NAME}_cli'
+
+# Member of the bundle archive holding its version (a content hash)
+VERSION_MEMBER = 'VERSION'
+
+RUNTIME_DIR_NAME = f'{APP_NAME}_runtime'
+RUNTIME_ENV = 'PO_FORMATTER_RUNTIME'
+
+# Folder the application keeps its settings and caches in (po_engine.APP_DIR_ENV)
+APP_DIR_ENV = 'PO_FORMATTER_HOME'
+
+# Written last, so a folder without it is an interrupted unpack
+COMPLETE_MARKER = '.complete'
+
+# Unpacks older than this (seconds) are left over from a crash
+STALE_UNPACK_SECONDS = 3600
+
+# Each running launcher marks the version folder it started from with
+# this prefix plus its process id, so other versions' launches leave it be
+IN_USE_PREFIX = '.running-'
+
+
+def launcher_path():
+    if getattr(sys, 'frozen', False):
+        return sys.executable
+    return os.path.abspath(__file__)
+
+
+def bundle_path():
+    """
+    The zip archive holding the application bundle: this launcher, the
+    windowed launcher next to it (for the command-line one) or the sidecar
+    zip
+    """
+    path = launcher_path()
+    folder = os.path.dirname(path)
+    sidecar = os.path.join(folder, f'{APP_NAME}.runtime.zip')
+    for candidate in (path, os.path.join(folder, LAUNCHER_EXECUTABLE)):
+        if os.path.isfile(candidate) and zipfile.is_zipfile(candidate):
+            return candidate
+    if os.path.exists(sidecar):
+        return sidecar
+    raise FileNotFoundError(f"No application bundle in {path} or {sidecar}")
+
+
+def runtime_roots():
+    """Folders to keep unpacked versions in, in order of preference"""
+    if os.environ.get(RUNTIME_ENV):
+        return [os.environ[RUNTIME_ENV]]
+    roots = [os.path.join(os.path.dirname(launcher_path()), RUNTIME_DIR_NAME)]
+    if sys.platform == 'win32':
+        local = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        local = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    roots.append(os.path.join(local, APP_NAME, 'runtime'))
+    return roots
+
+
+def unpack(archive, root, version):
+    """Unpack the bundle into root/version unless it is already there"""
+    target = os.path.join(root, version)
+    if os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+        return target
+
+    os.makedirs(root, exist_ok=True)
+    partial = os.path.join(root, f'{version}.partial-{os.getpid()}')
+    try:
+        archive.extractall(partial)
+        if sys.platform != 'win32':
+            # zipfile does not restore permissions
+            os.chmod(os.path.join(partial, APP_EXECUTABLE), 0o755)
+        open(os.path.join(partial, COMPLETE_MARKER), 'w').close()
+        try:
+            os.replace(partial, target)
+        except OSError:
+            # Another launch unpacked the same version first
+            if not os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+                raise
+    finally:
+        shutil.rmtree(partial, ignore_errors=True)
+    return target
+
+
+def pid_alive(pid):
+    """True if a process with this id is running"""
+    if sys.platform == 'win32':
+        import ctypes
+
+        # os.kill would terminate the process on Windows
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def in_use_marker(folder):
+    return os.path.join(folder, f'{IN_USE_PREFIX}{os.getpid()}')
+
+
+def in_use(folder):
+    """True if a running launcher started the application from folder"""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return False
+    for name in names:
+        if name.startswith(IN_USE_PREFIX):
+            try:
+                pid = int(name[len(IN_USE_PREFIX):])
+            except ValueError:
+                continue
+            if pid_alive(pid):
+                return True
+    return False
+
+
+def remove_old_versions(root, version):
+    """Delete other versions and interrupted unpacks; folders in use are kept"""
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name == version or not os.path.isdir(path):
+            continue
+        if '.partial-' in name and now - os.path.getmtime(path) < STALE_UNPACK_SECONDS:
+            # Possibly still being unpacked by another launch
+            continue
+        if in_use(path):
+            # A window of that version is still open; POSIX would let us
+            # delete the files from under it
+            continue
+        # Move it aside first: Windows refuses while an old window still runs
+        # from it, and then the folder is left whole for the next launch
+        removing = os.path.join(root, f'{name}.removing-{os.getpid()}')
+        try:
+            os.rename(path, removing)
+        except OSError:
+            continue
+        shutil.rmtree(removing, ignore_errors=True)
+
+
+def runtime_folder():
+    """
+    Folder of the unpacked application, unpacking it on first use; it is
+    marked as in use until release() is called
+    """
+    with zipfile.ZipFile(bundle_path()) as archive:
+        version = archive.read(VERSION_MEMBER).decode('ascii').strip()
+        errors = []
+        for root in runtime_roots():
+            try:
+                target = unpack(archive, root, version)
+                # Marked before cleaning up, so launches of another version
+                # that clean up at the same time keep this folder
+                open(in_use_marker(target), 'w').close()
+            except OSError as e:
+                # Read-only or full drive; try the next folder
+                errors.append(f"{root}: {e}")
+                continue
+            remove_old_versions(root, version)
+            return target
+    raise OSError("Cannot unpack PO Formatter:\n" + "\n".join(errors))
+
+
+def release(folder):
+    """Remove this launch's in-use mark from a runtime folder"""
+    try:
+        os.remove(in_use_marker(folder))
+    except OSError:
+        pass
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    folder = runtime_folder()
+    # Settings, caches and vendors/ stay next to the launcher rather than in
+    # the runtime folder, which is replaced by each update
+    env = dict(os.environ, **{APP_DIR_ENV: os.path.dirname(launcher_path())})
+    options = {}
+    if sys.platform == 'win32' and sys.stdout is None:
+        # The windowed launcher: the application is a console program (so
+        # its commands can print), which would otherwise open a console
+        # window next to the GUI
+        options['creationflags'] = subprocess.CREATE_NO_WINDOW
+    try:
+        # Wait for the application so exit codes and batch output pass
+        # through, and so the folder stays marked while it runs
+        return subprocess.call([os.path.join(folder, APP_EXECUTABLE)] + argv, env=env,
+                               **options)
+    finally:
+        release(folder)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
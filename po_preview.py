@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Table models for the window's preview pane
+
+Both models answer for the rows a view asks about and nothing else, so a
+PO with hundreds of thousands of lines costs no more to show than a short
+one: the input model reads cells straight from the DataFrame's column
+arrays, and the output model keeps the formatted file as bytes plus the
+offset of each line, decoding a line only when it is drawn.
+"""
+
+import numpy as np
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class DataFrameModel(QAbstractTableModel):
+    """Read-only view of a loaded PO; rows are numbered as in the file"""
+
+    def __init__(self, df, parent=None):
+        super().__init__(parent)
+        self.df = df
+        self.names = [str(column) for column in df.columns]
+        # Column arrays, fetched the first time a cell of the column is shown
+        self.arrays = [None] * len(self.names)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.df)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def column(self, index):
+        if self.arrays[index] is None:
+            self.arrays[index] = self.df.iloc[:, index].to_numpy()
+        return self.arrays[index]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        value = self.column(index.column())[index.row()]
+        if value is None or (isinstance(value, float) and value != value):
+            return ''
+        if isinstance(value, (float, np.floating)) and float(value).is_integer():
+            # Excel stores whole numbers as floats
+            return str(int(value))
+        return str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.names[section]
+        # Row 1 is the header row, as in the rejected-row reports
+        return str(section + 2)
+
+
+class OutputModel(QAbstractTableModel):
+    """The lines of a formatted output file, exactly as they will be saved"""
+
+    def __init__(self, content, parent=None):
+        super().__init__(parent)
+        self.content = content
+        breaks = np.flatnonzero(np.frombuffer(content, dtype=np.uint8) == ord('\n'))
+        self.starts = np.concatenate(([0], breaks + 1))
+        self.ends = np.concatenate((breaks, [len(content)]))
+        if len(content) and self.starts[-1] == len(content):
+            # No empty last line after a trailing line break
+            self.starts = self.starts[:-1]
+            self.ends = self.ends[:-1]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.starts)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        line = self.content[self.starts[index.row()]:self.ends[index.row()]]
+        return line.rstrip(b'\r').decode('utf-8', 'replace')
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return 'Formatted output'
+        return str(section + 1)
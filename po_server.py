@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Local PO formatting service
+
+Keeps pandas and the vendor formatters loaded in a pool of worker processes
+and formats POs posted over HTTP, so an ERP export job does not pay for
+starting the application (and importing pandas) for every file.
+
+Usage: python po_formatter.py serve [--port 8765] [--workers N]
+
+    POST /format?vendor=fastserve&po_number=12345&filename=PO12345.csv
+        Body: the PO file, either as the raw request body or as the "file"
+        field of a multipart/form-data upload (vendor, po_number, template
+        and consolidate may then also be form fields). vendor defaults to
+        auto detection and po_number to the number in the file name;
+        consolidate=1 merges repeated SKUs into one line.
+        Returns the formatted file as an attachment. Rows with an invalid
+        quantity are left out; X-PO-Rejected gives their number and
+        X-PO-Rejected-Rows their row numbers in the upload. With a
+        cross-reference file (--xref), X-PO-Unmapped counts the SKUs it
+        does not list. X-PO-Vendor names the vendor; a name that is not
+        plain ASCII comes as X-PO-Vendor* in RFC 5987 form (UTF-8''...).
+
+    GET /health
+        Returns {"status": "ok", "vendors": [...]} as JSON.
+
+Example:
+    curl --data-binary @PO12345.csv -o FastServe-12345.txt \\
+        "http://127.0.0.1:8765/format?vendor=fastserve&filename=PO12345.csv"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs, quote, urlsplit
+
+import po_batch
+import po_engine
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Largest PO upload accepted, in MB
+DEFAULT_MAX_UPLOAD_MB = 200
+
+# Requests waiting for a worker beyond this are turned away with 503
+DEFAULT_MAX_PENDING = 64
+
+# Bytes read from the socket or output file at a time
+STREAM_CHUNK = 64 * 1024
+
+# Rejected row numbers listed in the X-PO-Rejected-Rows header
+MAX_REJECTED_ROWS_HEADER = 100
+
+# Largest multipart form field other than the file, and largest part header
+MAX_FIELD_BYTES = 64 * 1024
+
+# Seconds to wait for a client to send its request headers, or the next
+# part of an upload
+HEADER_TIMEOUT = 30
+BODY_TIMEOUT = 30
+
+# Seconds to drop what a client still sends after an error response (the
+# rest of a rejected upload), so that closing the connection does not reset
+# it before the client has read the response
+LINGER_SECONDS = 2
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    422: 'Unprocessable Entity',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+CONTENT_TYPES = {
+    '.txt': 'text/plain; charset=utf-8',
+    '.csv': 'text/csv; charset=utf-8',
+}
+
+
+class RequestError(Exception):
+    """A request the service rejects with the given HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseStarted(Exception):
+    """A failure after the response head was sent; the connection can only be closed"""
+
+
+def warm_worker():
+    """Worker initializer: import pandas and compile the vendor formats"""
+    # Ctrl+C is handled by the server, which shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    po_engine.preload()
+    po_engine.vendor_registry()
+
+
+def upload_name(filename):
+    """Safe file name for an upload, keeping its extension and PO number"""
+    name = os.path.basename((filename or '').replace('\\', '/')).strip()
+    if not name or name in ('.', '..'):
+        name = 'upload.csv'
+    if not name.lower().endswith(po_engine.INPUT_EXTENSIONS):
+        raise RequestError(400, f"Unsupported file type: {name}")
+    return name
+
+
+def first_value(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def is_true(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def text_header(headers, name, value):
+    """
+    Add a header holding free text: as is when it is ASCII, otherwise
+    RFC 5987-encoded as name* (e.g. a vendor spec with an accented name)
+    """
+    try:
+        value.encode('ascii')
+    except UnicodeEncodeError:
+        headers[f"{name}*"] = f"UTF-8''{quote(value)}"
+    else:
+        headers[name] = value
+
+
+def read_line(source):
+    """One line of a multipart body, at most MAX_FIELD_BYTES long"""
+    line = source.readline(MAX_FIELD_BYTES)
+    if not line or (len(line) == MAX_FIELD_BYTES and not line.endswith(b'\n')):
+        raise RequestError(400, "Malformed multipart upload")
+    return line
+
+
+def copy_part(source, marker, write):
+    """
+    Pass the body of one multipart part to write chunk by chunk, up to
+    marker (a line break and the boundary); True when it was the last part
+    """
+    pending = b''
+    while True:
+        chunk = source.read(STREAM_CHUNK)
+        if not chunk:
+            raise RequestError(400, "Malformed multipart upload")
+        pending += chunk
+        index = pending.find(marker)
+        if index >= 0:
+            write(pending[:index])
+            # Go back to just after the boundary
+            source.seek(index + len(marker) - len(pending), os.SEEK_CUR)
+            return read_line(source).startswith(b'--')
+        # Keep enough to find a boundary split across two chunks
+        cut = len(pending) - len(marker) + 1
+        if cut > 0:
+            write(pending[:cut])
+            pending = pending[cut:]
+
+
+def read_part_headers(source):
+    """The headers of a multipart part, as an email message"""
+    from email.parser import BytesParser
+    from email.policy import HTTP
+
+    lines = []
+    while True:
+        line = read_line(source)
+        if line in (b'\r\n', b'\n'):
+            break
+        lines.append(line)
+        if sum(map(len, lines)) > MAX_FIELD_BYTES:
+            raise RequestError(400, "Malformed multipart upload")
+    return BytesParser(policy=HTTP).parsebytes(b''.join(lines) + b'\r\n')
+
+
+def read_field(source, marker, name):
+    """The text of a form field up to marker, and whether it was the last part"""
+    value = bytearray()
+
+    def collect(chunk):
+        value.extend(chunk)
+        if len(value) > MAX_FIELD_BYTES:
+            raise RequestError(400, f"Form field too large: {name}")
+
+    last = copy_part(source, marker, collect)
+    return value.decode('utf-8', 'replace').strip(), last
+
+
+def parse_multipart(content_type, source, file_path):
+    """
+    Read a multipart/form-data body from the file object source, writing
+    the uploaded "file" field to file_path as it goes rather than holding
+    it in memory; returns (other form fields, upload file name)
+    """
+    from email.message import Message
+
+    header = Message()
+    header['Content-Type'] = content_type
+    boundary = header.get_param('boundary')
+    if not boundary:
+        raise RequestError(400, "Malformed multipart upload")
+    delimiter = b'--' + boundary.encode('latin-1')
+
+    # Skip the preamble
+    while read_line(source).rstrip(b'\r\n') != delimiter:
+        pass
+
+    marker = b'\r\n' + delimiter
+    fields = {}
+    filename = None
+    found = False
+    last = False
+    while not last:
+        part = read_part_headers(source)
+        name = part.get_param('name', header='content-disposition')
+        if name == 'file':
+            found = True
+            filename = part.get_filename()
+            with open(file_path, 'wb') as f:
+                last = copy_part(source, marker, f.write)
+        else:
+            value, last = read_field(source, marker, name)
+            if name:
+                fields[name] = [value]
+
+    if not found:
+        raise RequestError(400, "Missing 'file' field")
+    return fields, filename
+
+
+class FormatServer:
+    """asyncio HTTP front end over a pool of warm formatting workers"""
+
+    def __init__(self, workers=None, max_upload_mb=DEFAULT_MAX_UPLOAD_MB,
+                 max_pending=DEFAULT_MAX_PENDING, xref_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.xref_path = xref_path
+        self.max_upload = max_upload_mb * 1024 * 1024
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = None
+
+    def start_workers(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+        # Start every worker now rather than on the first requests
+        futures = [self.executor.submit(warm_worker) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """Serve one request per connection"""
+        try:
+            try:
+                await self.dispatch(reader, writer)
+            except RequestError as e:
+                await self.send_json(writer, e.status, {'error': str(e)})
+                await self.discard_input(reader, writer)
+            except asyncio.TimeoutError:
+                await self.send_json(writer, 400, {'error': "Timed out reading the request"})
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # Client went away
+                pass
+            except ResponseStarted:
+                # A status line was sent already; closing without the rest of
+                # the promised Content-Length tells the client it failed
+                pass
+            except Exception as e:
+                await self.send_json(writer, 500, {'error': str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def discard_input(self, reader, writer):
+        """
+        End the response and read and drop the rest of the request (such as
+        an upload refused with 411 or 413) for up to LINGER_SECONDS, so the
+        close that follows does not reset the connection
+        """
+        if writer.can_write_eof():
+            writer.write_eof()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LINGER_SECONDS
+        try:
+            while await asyncio.wait_for(reader.read(STREAM_CHUNK), deadline - loop.time()):
+                pass
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+    async def read_body(self, reader, length, write):
+        """Pass the request body to write chunk by chunk"""
+        remaining = length
+        while remaining:
+            chunk = await asyncio.wait_for(reader.readexactly(min(STREAM_CHUNK, remaining)),
+                                           BODY_TIMEOUT)
+            write(chunk)
+            remaining -= len(chunk)
+
+    async def dispatch(self, reader, writer):
+        request_line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise RequestError(400, "Malformed request line")
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+
+        if url.path == '/health':
+            if method != 'GET':
+                raise RequestError(405, "Use GET")
+            await self.send_json(writer, 200, {'status': 'ok', 'vendors': po_engine.vendor_names()})
+        elif url.path == '/format':
+            if method != 'POST':
+                raise RequestError(405, "Use POST")
+            await self.format_request(reader, writer, headers, params)
+        else:
+            raise RequestError(404, f"Unknown path: {url.path}")
+
+    def upload_length(self, headers):
+        """Length of an upload the server can take now, from its headers"""
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise RequestError(411, "Send the PO with a Content-Length")
+        try:
+            length = int(headers['content-length'])
+        except (KeyError, ValueError):
+            raise RequestError(411, "Send the PO with a Content-Length")
+        if length <= 0:
+            raise RequestError(400, "Empty upload")
+        if length > self.max_upload:
+            raise RequestError(413, f"Upload larger than {self.max_upload // (1024 * 1024)} MB")
+        if self.pending >= self.workers + self.max_pending:
+            raise RequestError(503, "Too many requests waiting, try again later")
+        return length
+
+    async def receive_upload(self, reader, headers, params, length, work_dir):
+        """
+        Spool the uploaded PO into work_dir rather than holding it in memory;
+        returns its path and params with any multipart form fields added
+        """
+        content_type = headers.get('content-type', '')
+        if not content_type.lower().startswith('multipart/form-data'):
+            filename = first_value(params, 'filename', headers.get('x-filename'))
+            input_path = os.path.join(work_dir, upload_name(filename))
+            with open(input_path, 'wb') as f:
+                await self.read_body(reader, length, f.write)
+            return input_path, params
+
+        # Spooled to disk like a raw body, then split into its parts off the
+        # event loop
+        body_path = os.path.join(work_dir, 'upload.multipart')
+        with open(body_path, 'wb') as f:
+            await self.read_body(reader, length, f.write)
+        upload_path = os.path.join(work_dir, 'upload.part')
+        with open(body_path, 'rb') as f:
+            fields, filename = await asyncio.get_running_loop().run_in_executor(
+                None, parse_multipart, content_type, f, upload_path
+            )
+        os.remove(body_path)
+        params = {**params, **fields}
+        input_path = os.path.join(work_dir, upload_name(filename or first_value(params, 'filename')))
+        os.replace(upload_path, input_path)
+        return input_path, params
+
+    async def format_request(self, reader, writer, headers, params):
+        length = self.upload_length(headers)
+
+        self.pending += 1
+        work_dir = tempfile.mkdtemp(prefix='po_server_')
+        try:
+            input_path, params = await self.receive_upload(reader, headers, params, length, work_dir)
+
+            vendor = first_value(params, 'vendor', 'auto')
+            try:
+                vendor = 'auto' if vendor == 'auto' else po_engine.resolve_vendor(vendor)
+            except ValueError as e:
+                raise RequestError(400, str(e))
+
+            out_dir = os.path.join(work_dir, 'out')
+            os.mkdir(out_dir)
+            job = partial(po_batch.format_file, input_path, vendor, out_dir,
+                          is_true(first_value(params, 'template', '')),
+                          first_value(params, 'po_number'),
+                          consolidate=is_true(first_value(params, 'consolidate', '')),
+                          xref_path=self.xref_path)
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, job)
+            if result['status'] != 'ok':
+                raise RequestError(422, result['error'])
+
+            await self.send_file(writer, result)
+        finally:
+            self.pending -= 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def send_file(self, writer, result):
+        """Stream the formatted output file back to the client"""
+        output_path = result['output']
+        name = os.path.basename(output_path)
+        extension = os.path.splitext(name)[1].lower()
+        headers = {
+            'Content-Type': CONTENT_TYPES.get(extension, 'application/octet-stream'),
+            'Content-Length': str(os.path.getsize(output_path)),
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(name)}",
+            'X-PO-Number': quote(str(result['po_number'])),
+            'X-PO-Rows': str(result['rows']),
+            'X-PO-Cached': 'yes' if result['cached'] else 'no',
+            'X-PO-Rejected': str(result['rejected']),
+            'X-PO-Unmapped': str(result['unmapped']),
+        }
+        text_header(headers, 'X-PO-Vendor', result['vendor'])
+        if result['rejected']:
+            rows = result['rejected_rows'][:MAX_REJECTED_ROWS_HEADER]
+            headers['X-PO-Rejected-Rows'] = ','.join(str(row['row']) for row in rows)
+        self.write_head(writer, 200, headers)
+        try:
+            with open(output_path, 'rb') as f:
+                while True:
+                    chunk = f.read(STREAM_CHUNK)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+                    await writer.drain()
+        except Exception as e:
+            raise ResponseStarted(str(e)) from e
+
+    async def send_json(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        self.write_head(writer, status, {
+            'Content-Type': 'application/json',
+            'Content-Length': str(len(body)),
+        })
+        writer.write(body)
+        await writer.drain()
+
+    def write_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        lines.append('Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+async def serve(server, host, port):
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving PO formatting on http://{host}:{port} with {server.workers} workers "
+          f"(Ctrl+C to stop)")
+    async with listener:
+        await listener.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='po_formatter serve',
+        description='Run a local HTTP service that formats uploaded PO files'
+    )
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f'Address to listen on (default: {DEFAULT_HOST}, local only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--max-upload-mb', type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                        help=f'Largest accepted upload in MB (default: {DEFAULT_MAX_UPLOAD_MB})')
+    parser.add_argument('--xref', default=None,
+                        help='SKU cross-reference file (default: [Cross Reference] file in '
+                             'po_formatter.ini)')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='Requests allowed to wait for a worker before new ones get '
+                             f'503 (default: {DEFAULT_MAX_PENDING})')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.workers is not None and args.workers < 1:
+        print("Error: --workers must be at least 1")
+        return 2
+
+    server = FormatServer(args.workers, args.max_upload_mb, args.max_pending,
+                          args.xref or po_engine.xref_file())
+    print("Starting workers...")
+    server.start_workers()
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        print("Stopped")
+    except OSError as e:
+        print(f"Error: {str(e)}")
+        return 1
+    finally:
+        server.shutdown()
+    return 0
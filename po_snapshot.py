@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshots of loaded PO DataFrames
+
+A snapshot lays each column out as flat buffers, described by a small JSON
+layout, so a file that was already parsed once can be rebuilt from a
+memory-mapped copy instead of being read again with pd.read_excel or
+pd.read_csv.
+
+Numeric, boolean and datetime columns are stored as their numpy arrays.
+Text and mixed columns (a workbook's SKU column often holds both numbers
+and text) store a type code per value, the text as one UTF-8 blob with
+the length of each string, and the numbers as int64/float64 arrays, so
+every value comes back with its original type. Frames holding anything
+else, or repeating a column name, raise Unsupported and are simply not
+cached.
+"""
+
+import numpy as np
+
+
+# Bump when the layout changes so older snapshots are not read
+FORMAT_VERSION = 1
+
+# Type codes of the values in text/mixed columns
+MISSING, TEXT, INT, FLOAT, BOOL, NA = range(6)
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+class Unsupported(Exception):
+    """The frame holds values a snapshot cannot store"""
+
+
+def value_codes(values):
+    """Type code of each value of an object array"""
+    import pandas as pd
+
+    codes = np.empty(len(values), dtype=np.uint8)
+    for index, value in enumerate(values):
+        kind = type(value)
+        if kind is str:
+            codes[index] = TEXT
+        elif kind is float or kind is np.float64:
+            codes[index] = FLOAT
+        elif kind is bool or kind is np.bool_:
+            codes[index] = BOOL
+        elif kind is int or isinstance(value, np.integer):
+            if not INT64_MIN <= value <= INT64_MAX:
+                raise Unsupported("Integer too large")
+            codes[index] = INT
+        elif value is None:
+            codes[index] = MISSING
+        elif value is pd.NA:
+            codes[index] = NA
+        else:
+            raise Unsupported(f"Cannot store {kind.__name__} values")
+    return codes
+
+
+def encode_values(values):
+    """Buffers of a text/mixed column: codes, text, text lengths, ints, floats, bools"""
+    codes = value_codes(values)
+    texts = values[codes == TEXT].tolist()
+    text = ''.join(texts).encode('utf-8', 'surrogatepass')
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    return [
+        codes,
+        np.frombuffer(text, dtype=np.uint8),
+        lengths,
+        values[codes == INT].astype(np.int64),
+        values[codes == FLOAT].astype(np.float64),
+        values[codes == BOOL].astype(bool),
+    ]
+
+
+def decode_values(codes, text, lengths, ints, floats, bools):
+    import pandas as pd
+
+    values = np.full(len(codes), None, dtype=object)
+    if len(lengths):
+        text = text.tobytes().decode('utf-8', 'surrogatepass')
+        ends = np.cumsum(lengths).tolist()
+        starts = [0] + ends[:-1]
+        strings = np.empty(len(lengths), dtype=object)
+        strings[:] = [text[start:end] for start, end in zip(starts, ends)]
+        values[codes == TEXT] = strings
+    # astype(object) gives Python ints, floats and bools
+    values[codes == INT] = ints.astype(object)
+    values[codes == FLOAT] = floats.astype(object)
+    values[codes == BOOL] = bools.astype(object)
+    values[codes == NA] = pd.NA
+    return values
+
+
+def encode(df):
+    """
+    (layout, buffers) of a DataFrame: layout is JSON-compatible, buffers
+    the numpy arrays to store one after another
+    """
+    import pandas as pd
+
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise Unsupported("Only frames with a default index are stored")
+    if not df.shape[1]:
+        raise Unsupported("Frame has no columns")
+    if not all(isinstance(name, str) for name in df.columns):
+        raise Unsupported("Column names must be text")
+    if not df.columns.is_unique:
+        # decode() rebuilds the frame from a dict keyed by name
+        raise Unsupported("Column names must be unique")
+
+    columns = []
+    buffers = []
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        dtype = series.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in 'biufmM':
+            parts = [np.ascontiguousarray(series.to_numpy())]
+            kind = 'array'
+        elif dtype == object or isinstance(dtype, pd.StringDtype):
+            parts = encode_values(series.to_numpy(dtype=object))
+            kind = 'values'
+        else:
+            raise Unsupported(f"Cannot store {dtype} columns")
+        columns.append({
+            'name': df.columns[position],
+            'kind': kind,
+            'dtype': str(dtype),
+            'buffers': [[part.dtype.str, len(part)] for part in parts],
+        })
+        buffers.extend(parts)
+    return {'version': FORMAT_VERSION, 'rows': len(df), 'columns': columns}, buffers
+
+
+def decode(layout, data, offset=0):
+    """
+    DataFrame from a layout and the buffer holding its arrays (such as an
+    mmap) from offset on
+
+    Numeric columns are views of data, not copies, and keep it alive; only
+    text/mixed columns are decoded into new Python objects.
+    """
+    import pandas as pd
+
+    if layout.get('version') != FORMAT_VERSION:
+        raise ValueError("Snapshot format changed")
+    names = [column['name'] for column in layout['columns']]
+    if len(set(names)) != len(names):
+        # Written before encode() refused them; columns would be lost
+        raise ValueError("Snapshot has repeated column names")
+
+    frame = {}
+    for column in layout['columns']:
+        parts = []
+        for dtype, count in column['buffers']:
+            dtype = np.dtype(dtype)
+            parts.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset))
+            offset += dtype.itemsize * count
+        if column['kind'] == 'array':
+            frame[column['name']] = parts[0]
+        else:
+            frame[column['name']] = pd.Series(decode_values(*parts), dtype=column['dtype'])
+
+    # copy=False keeps the numeric columns as views of data
+    df = pd.DataFrame(frame, columns=names, copy=False)
+    if len(df) != layout['rows']:
+        raise ValueError("Snapshot is truncated")
+    return df
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and memory tracing
+
+The engine marks its stages (read, column detection, vendor detection,
+transform, write, and the GUI's save dialog) with
+
+    with po_trace.stage('read', file=file_path) as stage:
+        ...
+        stage.set(rows=len(df))
+
+Tracing is off unless a command runs with --trace, and stage() then
+returns one shared do-nothing object, so the marks cost a function call.
+When it is on, each stage records its wall time, the rows it handled and
+the peak memory it allocated (tracemalloc, started only then), and the
+trace is written as JSON or in the Chrome trace format (open it in
+chrome://tracing or https://ui.perfetto.dev). tracemalloc slows down
+Python-heavy stages, so --trace-no-memory records times only.
+
+Memory is traced per process: a peak includes whatever other threads
+allocated during the stage. Pool workers record their own stages and send
+them back with each result (see in_pool and collect).
+"""
+
+import json
+import os
+import threading
+import time
+from functools import partial
+
+
+TRACE_FORMATS = ('json', 'chrome')
+
+MB = 1024 * 1024
+
+_recorder = None
+
+
+class NullStage:
+    """What stage() returns while tracing is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, rows=None, **args):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    """One timed stage; nested stages pass their memory peak on to the outer one"""
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+        self.rows = None
+
+    def set(self, rows=None, **args):
+        """Record the number of rows handled and any other details"""
+        if rows is not None:
+            self.rows = rows
+        self.args.update(args)
+
+    def __enter__(self):
+        self.parent = self.recorder.push(self)
+        if self.recorder.memory:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                # Resetting below would lose the outer stage's peak so far
+                self.parent.peak = max(self.parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.base = self.peak = current
+        self.start = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        event = {
+            'name': self.name,
+            'start': self.start,
+            'seconds': seconds,
+            'rows': self.rows,
+            'peak_mb': None,
+            'pid': os.getpid(),
+            'thread': threading.get_native_id(),
+            'args': self.args,
+        }
+        if self.recorder.memory:
+            import tracemalloc
+
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+            event['peak_mb'] = round((self.peak - self.base) / MB, 3)
+        if exc is not None:
+            # Failed runs are the ones worth looking at
+            event['error'] = str(exc)
+        self.recorder.pop(event)
+        return False
+
+
+class Recorder:
+    """Collects the stages of one process"""
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.events = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def push(self, stage):
+        """Enter a stage; returns the enclosing stage of this thread, if any"""
+        stack = self.local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(stage)
+        return parent
+
+    def pop(self, event):
+        self.local.stack.pop()
+        with self.lock:
+            self.events.append(event)
+
+    def take(self):
+        """Remove and return the stages recorded so far"""
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+    def add(self, events):
+        with self.lock:
+            self.events.extend(events)
+
+
+def enable(memory=True):
+    """Start recording stages; memory=False leaves tracemalloc off"""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(memory)
+        if memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+    return _recorder
+
+
+def stage(name, **args):
+    """Context manager timing one stage; args are stored with it"""
+    if _recorder is None:
+        return NULL_STAGE
+    return Stage(_recorder, name, args)
+
+
+def events():
+    """The stages recorded so far, in the order they finished"""
+    if _recorder is None:
+        return []
+    with _recorder.lock:
+        return list(_recorder.events)
+
+
+def run_traced(function, memory, *args, **kwargs):
+    """Run function in a pool worker with tracing on: (result, stages it recorded)"""
+    recorder = enable(memory)
+    recorder.take()
+    result = function(*args, **kwargs)
+    return result, recorder.take()
+
+
+def in_pool(function):
+    """
+    function, wrapped to send its stages back from a pool worker while
+    tracing is on; pass what the pool returns through collect()
+    """
+    if _recorder is None:
+        return function
+    return partial(run_traced, function, _recorder.memory)
+
+
+def collect(value):
+    """Result of an in_pool function, adding the stages it sent to this trace"""
+    if _recorder is None:
+        return value
+    result, stages = value
+    _recorder.add(stages)
+    return result
+
+
+def summary(stages):
+    """Totals per stage name, in the order each name first finished"""
+    totals = {}
+    for event in stages:
+        total = totals.setdefault(event['name'], {
+            'name': event['name'], 'count': 0, 'seconds': 0.0, 'rows': 0,
+            'peak_mb': None, 'errors': 0,
+        })
+        total['count'] += 1
+        total['seconds'] += event['seconds']
+        total['rows'] += event['rows'] or 0
+        if event['peak_mb'] is not None:
+            total['peak_mb'] = max(total['peak_mb'] or 0, event['peak_mb'])
+        if 'error' in event:
+            total['errors'] += 1
+    for total in totals.values():
+        total['seconds'] = round(total['seconds'], 6)
+    return list(totals.values())
+
+
+def as_json(stages):
+    """Stages with start times in seconds from the first one, plus totals"""
+    origin = min((event['start'] for event in stages), default=0)
+    records = []
+    for event in sorted(stages, key=lambda event: event['start']):
+        record = dict(event, start=round(event['start'] - origin, 6),
+                      seconds=round(event['seconds'], 6))
+        records.append(record)
+    return {'stages': records, 'summary': summary(stages)}
+
+
+def as_chrome(stages):
+    """Stages as complete ('X') events of the Chrome trace event format"""
+    origin = min((event['start'] for event in stages), default=0)
+    trace_events = []
+    for event in sorted(stages, key=lambda event: event['start']):
+        args = dict(event['args'])
+        for key in ('rows', 'peak_mb', 'error'):
+            if event.get(key) is not None:
+                args[key] = event[key]
+        trace_events.append({
+            'name': event['name'],
+            'cat': 'po_formatter',
+            'ph': 'X',
+            'ts': round((event['start'] - origin) * 1e6, 1),
+            'dur': round(event['seconds'] * 1e6, 1),
+            'pid': event['pid'],
+            'tid': event['thread'],
+            'args': args,
+        })
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+
+def write(path, trace_format='json'):
+    """Write the recorded stages to path as JSON or a Chrome trace"""
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {trace_format}")
+    stages = events()
+    data = as_chrome(stages) if trace_format == 'chrome' else as_json(stages)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1, default=str)
+    return path
+
+
+def add_arguments(parser):
+    """Add the --trace options to a command's argparse parser"""
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help='Record the time, rows and peak memory of each stage and write '
+                             'them to PATH')
+    parser.add_argument('--trace-format', choices=TRACE_FORMATS, default='json',
+                        help="Trace file format: 'json', or 'chrome' for chrome://tracing and "
+                             "Perfetto (default: json)")
+    parser.add_argument('--trace-no-memory', action='store_true',
+                        help='Leave out peak memory; tracemalloc slows Python-heavy stages '
+                             'such as Excel reads several times over')
+
+
+def parse_known_args(argv):
+    """
+    Take the --trace options out of a raw argv (for the GUI and scripts
+    without argparse): (options, remaining argv)
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(add_help=False)
+    add_arguments(parser)
+    return parser.parse_known_args(argv)
+
+
+def start(options):
+    """Start tracing if the command was given --trace"""
+    if options.trace:
+        enable(memory=not options.trace_no_memory)
+
+
+def finish(options):
+    """Write the trace of a command given --trace"""
+    if options.trace:
+        write(options.trace, options.trace_format)
+        print(f"Trace written to {options.trace}")
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+Vendor format registry
+
+Each vendor output format is a declarative spec (a dict, or a JSON file in
+the vendors/ folder next to the application) that is compiled once into a
+VendorFormat writer. The engine looks vendors up by name or alias, so a new
+vendor can be added by dropping a spec file into vendors/ without a code
+change.
+
+Text vendors write a header (the PO number), alternating SKU and quantity
+lines and a trailer (end marker and SKU count):
+
+    {
+        "name": "Stephens",
+        "aliases": ["stephens"],
+        "type": "text",
+        "filename": "{po_number}_Stephens.txt",
+        "end_marker": "END",
+        "newline": "platform"
+    }
+
+CSV vendors write one row per SKU with the listed columns:
+
+    {
+        "name": "HRP",
+        "type": "csv",
+        "filename": "{po_number}_HRP.csv",
+        "delimiter": ",",
+        "columns": [
+            {"name": "PART #", "source": "sku"},
+            {"name": "QTY", "source": "qty"},
+            {"name": "WAREHOUSE(Optional)", "value": ""}
+        ]
+    }
+
+Optional keys:
+    aliases            Short names accepted on the command line
+    fastserve_layout   Prefer the FastServe CSV columns when present (default true)
+    header, trailer    Text lines before/after the SKU lines; may use
+                       {po_number}, {count} and {end_marker}. A {count}
+                       in the header makes streamed outputs hold the
+                       SKU lines back (in a temp file) until it is known
+    header_row         Write the CSV column names (default true)
+    integer_qty        Write quantities as whole numbers (default true)
+    sku_transforms     Applied to each SKU in order: strip_tra, upper, lower, strip
+    detect_columns     Columns that identify this vendor's PO layout
+    detect_extensions  Input file extensions that imply this vendor (e.g. .inv)
+    template           Overrides for the variant template format; with
+                       split_color the color code of SKUs such as 1234-RED
+                       goes to the "variant" column source
+"""
+
+import json
+import os
+import string
+import sys
+
+import po_engine
+
+
+# Vendor spec files (*.json) loaded in addition to the built-in vendors;
+# next to the executable in frozen builds (see po_engine.app_dir)
+VENDOR_DIR = os.path.join(po_engine.APP_DIR, 'vendors')
+
+VENDOR_TYPES = ('text', 'csv')
+
+COLUMN_SOURCES = ('sku', 'qty', 'variant')
+
+SKU_TRANSFORMS = ('strip_tra', 'upper', 'lower', 'strip')
+
+# Placeholders allowed in file names and in text header/trailer lines
+FILENAME_FIELDS = ('po_number',)
+TEXT_LINE_FIELDS = ('po_number', 'count', 'end_marker')
+
+# Streamed text bodies kept in memory before spilling to a temp file, for
+# headers that need the SKU count
+SPOOL_BYTES = 16 * 1024 * 1024
+
+BUILTIN_SPECS = [
+    {
+        # Line 1: PO number, then alternating SKU and quantity lines,
+        # "end" (lowercase) and the count of SKUs
+        'name': po_engine.FASTSERVE,
+        'aliases': ['fastserve', 'horizon'],
+        'type': 'text',
+        'filename': 'FastServe-{po_number}.txt',
+        'end_marker': 'end',
+        'newline': '\n',
+        'detect_columns': po_engine.FASTSERVE_COLUMNS,
+    },
+    {
+        # Same layout as FastServe with an "END" marker, written with
+        # platform line endings
+        'name': po_engine.STEPHENS,
+        'aliases': ['stephens'],
+        'type': 'text',
+        'filename': '{po_number}_Stephens.txt',
+        'end_marker': 'END',
+        'newline': 'platform',
+    },
+    {
+        # CSV with columns PART #, QTY and WAREHOUSE(Optional); an empty
+        # warehouse uses the customer's default warehouse
+        'name': po_engine.HRP,
+        'aliases': ['hrp'],
+        'type': 'csv',
+        'filename': '{po_number}_HRP.csv',
+        'columns': [
+            {'name': 'PART #', 'source': 'sku'},
+            {'name': 'QTY', 'source': 'qty'},
+            {'name': 'WAREHOUSE(Optional)', 'value': ''},
+        ],
+    },
+    {
+        # CSV with Sku, Qty columns
+        'name': po_engine.AMAIN,
+        'aliases': ['amain'],
+        'type': 'csv',
+        'fastserve_layout': False,
+        'filename': '{po_number}.csv',
+        'columns': [
+            {'name': 'Sku', 'source': 'sku'},
+            {'name': 'Qty', 'source': 'qty'},
+        ],
+    },
+    {
+        # CSV with SKU, QTY columns and the "tra" prefix removed, or the
+        # template format with sku, qty, variant and comment columns
+        'name': po_engine.TRAXXAS,
+        'aliases': ['traxxas'],
+        'type': 'csv',
+        'fastserve_layout': False,
+        'filename': '{po_number}_Traxxas.csv',
+        'integer_qty': False,
+        'sku_transforms': ['strip_tra'],
+        'columns': [
+            {'name': 'SKU', 'source': 'sku'},
+            {'name': 'QTY', 'source': 'qty'},
+        ],
+        'detect_columns': ['SKU', 'QTY'],
+        # INV files are typically for Traxxas
+        'detect_extensions': ['.inv'],
+        'template': {
+            'filename': '{po_number}_Traxxas_Template.csv',
+            'split_color': True,
+            'columns': [
+                {'name': 'sku', 'source': 'sku'},
+                {'name': 'qty', 'source': 'qty'},
+                {'name': 'variant', 'source': 'variant'},
+                {'name': 'comment', 'value': ''},
+            ],
+        },
+    },
+]
+
+
+class VendorFormat:
+    """A vendor spec compiled into a writer for Sku/Qty frames"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec.get('name')
+        if not self.name or not isinstance(self.name, str):
+            raise ValueError("Vendor spec is missing a name")
+
+        self.type = spec.get('type')
+        if self.type not in VENDOR_TYPES:
+            raise ValueError(f"Vendor {self.name}: type must be one of {', '.join(VENDOR_TYPES)}")
+
+        extension = '.txt' if self.type == 'text' else '.csv'
+        self.filename = spec.get('filename', '{po_number}_' + self.name + extension)
+        self.check_template(self.filename, FILENAME_FIELDS)
+        self.fastserve_layout = spec.get('fastserve_layout', True)
+        self.integer_qty = spec.get('integer_qty', True)
+        self.split_color = spec.get('split_color', False)
+
+        self.aliases = self.string_list('aliases')
+        self.string_list('detect_columns')
+        self.string_list('detect_extensions')
+
+        self.sku_transforms = self.string_list('sku_transforms')
+        for transform in self.sku_transforms:
+            if transform not in SKU_TRANSFORMS:
+                raise ValueError(f"Vendor {self.name}: unknown SKU transform {transform}")
+
+        if self.type == 'text':
+            self.end_marker = spec.get('end_marker', 'END')
+            newline = spec.get('newline', '\n')
+            self.newline = os.linesep if newline == 'platform' else newline
+            self.header = self.string_list('header', ['{po_number}'])
+            self.trailer = self.string_list('trailer', ['{end_marker}', '{count}'])
+            for line in self.header + self.trailer:
+                self.check_template(line, TEXT_LINE_FIELDS)
+            # Streaming has to hold the body back until the count is known
+            self.header_count = any('count' in template_fields(line) for line in self.header)
+        else:
+            self.delimiter = spec.get('delimiter', ',')
+            self.header_row = spec.get('header_row', True)
+            self.columns = [self.compile_column(column) for column in spec.get('columns', [])]
+            if not self.columns:
+                raise ValueError(f"Vendor {self.name}: CSV vendors need columns")
+
+        template = spec.get('template')
+        if template:
+            merged = {key: value for key, value in spec.items() if key != 'template'}
+            merged.update(template)
+            self.template = VendorFormat(merged)
+        else:
+            self.template = None
+
+    def string_list(self, key, default=()):
+        """A spec entry that must be a list of strings"""
+        values = self.spec.get(key, default)
+        if not isinstance(values, (list, tuple)) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"Vendor {self.name}: {key} must be a list of strings")
+        return list(values)
+
+    def check_template(self, template, fields):
+        """Reject templates with placeholders that would fail when formatted"""
+        if not isinstance(template, str):
+            raise ValueError(f"Vendor {self.name}: {template!r} is not text")
+        try:
+            unknown = template_fields(template) - set(fields)
+        except ValueError as e:
+            raise ValueError(f"Vendor {self.name}: bad template {template!r}: {e}")
+        if unknown:
+            raise ValueError(f"Vendor {self.name}: unknown placeholder "
+                             f"{{{sorted(unknown)[0]}}} in {template!r}; "
+                             f"use {', '.join('{' + field + '}' for field in fields)}")
+
+    def compile_column(self, column):
+        """(name, source, value) for a column entry of a CSV spec"""
+        name = column.get('name')
+        source = column.get('source')
+        if name is None:
+            raise ValueError(f"Vendor {self.name}: column is missing a name")
+        if source is None:
+            return name, None, column.get('value', '')
+        if source not in COLUMN_SOURCES:
+            raise ValueError(f"Vendor {self.name}: unknown column source {source}")
+        if source == 'variant' and not self.split_color:
+            raise ValueError(f"Vendor {self.name}: variant columns need split_color")
+        return name, source, None
+
+    def output_name(self, po_number, template=False):
+        """Default output file name, as offered in the save dialog"""
+        if template and self.template:
+            return self.template.output_name(po_number)
+        return self.filename.format(po_number=po_number)
+
+    def skus(self, formatted_df):
+        """The SKU column with the spec's transforms applied"""
+        if not self.sku_transforms:
+            return formatted_df['Sku']
+
+        skus = po_engine.sku_strings(formatted_df['Sku'])
+        for transform in self.sku_transforms:
+            if transform == 'strip_tra':
+                skus = po_engine.strip_tra_prefix(skus)
+            else:
+                skus = getattr(skus.str, transform)()
+        return skus
+
+    def qtys(self, formatted_df):
+        if self.integer_qty:
+            return formatted_df['Qty'].astype(int)
+        return formatted_df['Qty']
+
+    def text_lines(self, lines, po_number, count):
+        return [line.format(po_number=po_number, count=count, end_marker=self.end_marker)
+                for line in lines]
+
+    def body_lines(self, formatted_df):
+        """Alternating SKU and quantity lines"""
+        if self.sku_transforms:
+            formatted_df = formatted_df.assign(Sku=self.skus(formatted_df))
+        return po_engine.sku_qty_lines(formatted_df)
+
+    def merge_skus(self, formatted_df):
+        """Sku/Qty rows merged per SKU after the transforms, quantities summed"""
+        return po_engine.sum_duplicates(formatted_df, [self.skus(formatted_df)], ['Qty'])
+
+    def merge_frame(self, frame):
+        """Output frame rows merged per SKU and variant, quantities summed"""
+        keys = [frame[name] for name, source, _ in self.columns if source in ('sku', 'variant')]
+        if not keys:
+            return frame
+        qty_columns = [name for name, source, _ in self.columns if source == 'qty']
+        return po_engine.sum_duplicates(frame, keys, qty_columns)
+
+    def frame(self, formatted_df, color_map=None):
+        """Output frame for a CSV vendor"""
+        import pandas as pd
+
+        variants = None
+        if self.split_color:
+            if color_map is None:
+                color_map = po_engine.load_color_map()
+
+            # Extract the color code from SKUs like 1234-RED in one pass;
+            # unknown codes are used as is
+            skus = po_engine.sku_strings(formatted_df['Sku'])
+            color_codes = skus.str.extract(po_engine.COLOR_RE, expand=False)
+            variants = color_codes.map(color_map).fillna(color_codes).fillna("")
+
+            # Remove the color code before the SKU transforms
+            formatted_df = formatted_df.assign(Sku=skus.str.replace(po_engine.COLOR_RE, '', regex=True))
+
+        values = {'sku': self.skus(formatted_df), 'qty': self.qtys(formatted_df), 'variant': variants}
+        data = {}
+        for name, source, value in self.columns:
+            data[name] = values[source] if source else value
+        return pd.DataFrame(data, index=formatted_df.index, columns=[name for name, _, _ in self.columns])
+
+    def format(self, df, po_number, template=False, consolidate=False, rejected=None):
+        """
+        Format a PO DataFrame and return the file content as bytes
+
+        consolidate merges lines for the same SKU into one, summing their
+        quantities, so the SKU count in the trailer drops accordingly.
+        Rows with invalid quantities are handled as in
+        po_engine.check_quantities.
+        """
+        if template and self.template:
+            return self.template.format(df, po_number, consolidate=consolidate,
+                                        rejected=rejected)
+
+        formatted_df = po_engine.select_sku_qty(df, self.fastserve_layout)
+        formatted_df = po_engine.check_quantities(formatted_df, rejected)
+        if self.type == 'text':
+            if consolidate:
+                formatted_df = self.merge_skus(formatted_df)
+            lines = (self.text_lines(self.header, po_number, len(formatted_df))
+                     + self.body_lines(formatted_df)
+                     + self.text_lines(self.trailer, po_number, len(formatted_df)))
+            return self.newline.join(lines).encode()
+
+        frame = self.frame(formatted_df)
+        if consolidate:
+            frame = self.merge_frame(frame)
+        return frame.to_csv(index=False, sep=self.delimiter, header=self.header_row).encode()
+
+    def stream(self, chunks, po_number, out, consolidate=False, rejected=None):
+        """
+        Write Sku/Qty frames from chunks to the binary file object out as
+        they arrive; returns the number of valid rows formatted, counted
+        before consolidate merges any
+        """
+        kept = 0
+
+        def checked(chunks):
+            nonlocal kept
+            for formatted_df in chunks:
+                formatted_df = po_engine.check_quantities(formatted_df, rejected)
+                kept += len(formatted_df)
+                yield formatted_df
+
+        chunks = checked(chunks)
+        if consolidate:
+            # Duplicates can be in any chunk, so merge the whole PO at once
+            import pandas as pd
+            frames = list(chunks)
+            chunks = [pd.concat(frames, ignore_index=True)] if frames else []
+
+        if self.type == 'text':
+            if self.header_count:
+                # Spool the body and copy it in after the header once the
+                # count is known
+                import shutil
+                import tempfile
+
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as body:
+                    row_count, started = self.stream_body(chunks, body, bool(self.header),
+                                                          consolidate)
+                    header = self.text_lines(self.header, po_number, row_count)
+                    out.write(self.newline.join(header).encode())
+                    body.seek(0)
+                    shutil.copyfileobj(body, out)
+            else:
+                header = self.text_lines(self.header, po_number, None)
+                out.write(self.newline.join(header).encode())
+                row_count, started = self.stream_body(chunks, out, bool(header), consolidate)
+            trailer = self.newline.join(self.text_lines(self.trailer, po_number, row_count))
+            out.write(((self.newline if started else '') + trailer).encode())
+            return kept
+
+        header = self.header_row
+        color_map = po_engine.load_color_map() if self.split_color else None
+        for formatted_df in chunks:
+            frame = self.frame(formatted_df, color_map)
+            if consolidate:
+                frame = self.merge_frame(frame)
+            out.write(frame.to_csv(index=False, sep=self.delimiter, header=header).encode())
+            header = False
+        if header:
+            # Empty input still gets a header line
+            empty_df = po_engine.as_dataframe([]).reindex(columns=['Sku', 'Qty'])
+            out.write(self.frame(empty_df, color_map).to_csv(
+                index=False, sep=self.delimiter
+            ).encode())
+        return kept
+
+    def stream_body(self, chunks, out, started, consolidate=False):
+        """
+        Write the SKU and quantity lines of a text vendor to out; started
+        says whether a line was written before them. Returns the row count
+        and whether any line has been written now.
+        """
+        row_count = 0
+        for formatted_df in chunks:
+            if consolidate:
+                formatted_df = self.merge_skus(formatted_df)
+            if len(formatted_df):
+                body = self.newline.join(self.body_lines(formatted_df))
+                out.write(((self.newline if started else '') + body).encode())
+                started = True
+            row_count += len(formatted_df)
+        return row_count, started
+
+
+class VendorRegistry:
+    """Compiled vendor formats, looked up by name or alias"""
+
+    def __init__(self, specs):
+        self.formats = {}
+        self.aliases = {}
+        for spec in specs:
+            vendor_format = VendorFormat(spec)
+            # A spec with the name of an earlier one replaces it
+            self.formats.pop(vendor_format.name, None)
+            self.formats[vendor_format.name] = vendor_format
+            for alias in [vendor_format.name] + vendor_format.aliases:
+                self.aliases[alias.strip().lower()] = vendor_format.name
+
+        self.detect_columns = [
+            (name, list(vendor_format.spec['detect_columns']))
+            for name, vendor_format in self.formats.items()
+            if vendor_format.spec.get('detect_columns')
+        ]
+        self.detect_extensions = {
+            extension.lower(): name
+            for name, vendor_format in self.formats.items()
+            for extension in vendor_format.spec.get('detect_extensions', [])
+        }
+
+        # Changes to the detection rules invalidate cached header results
+        self.detection_key = json.dumps([self.detect_columns, sorted(self.detect_extensions.items())])
+
+        # Changes to any spec invalidate cached outputs
+        self.fingerprint = json.dumps([vendor_format.spec for vendor_format in self.formats.values()],
+                                      sort_keys=True)
+
+    def names(self):
+        return list(self.formats)
+
+    def get(self, name):
+        """The compiled format for a vendor name; raises ValueError if unknown"""
+        vendor_format = self.formats.get(name)
+        if vendor_format is None:
+            raise ValueError(f"Unknown vendor: {name}")
+        return vendor_format
+
+    def resolve(self, name):
+        """Map a vendor name or alias (any case) to the vendor name"""
+        if name in self.formats:
+            return name
+        vendor = self.aliases.get(name.strip().lower())
+        if vendor is None:
+            raise ValueError(f"Unknown vendor: {name}")
+        return vendor
+
+    def match_columns(self, columns):
+        """Vendor whose detect_columns are all present; later vendors win"""
+        vendor = None
+        for name, detect_columns in self.detect_columns:
+            if all(col in columns for col in detect_columns):
+                vendor = name
+        return vendor
+
+    def match_extension(self, file_path):
+        """Vendor implied by the file extension, or None"""
+        return self.detect_extensions.get(os.path.splitext(file_path)[1].lower())
+
+
+def template_fields(template):
+    """Names of the {placeholders} in a header, trailer or file name template"""
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+
+def load_specs(vendor_dir=VENDOR_DIR):
+    """
+    Built-in vendor specs followed by the *.json specs in vendor_dir
+
+    Spec files that cannot be read are reported and skipped.
+    """
+    specs = list(BUILTIN_SPECS)
+    if not os.path.isdir(vendor_dir):
+        return specs
+
+    for file_name in sorted(os.listdir(vendor_dir)):
+        if not file_name.lower().endswith('.json'):
+            continue
+        path = os.path.join(vendor_dir, file_name)
+        try:
+            with open(path, 'r') as f:
+                spec = json.load(f)
+            # Compile now so a broken spec is skipped instead of breaking the registry
+            VendorFormat(spec)
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            print(f"Skipping vendor spec {path}: {e}", file=sys.stderr)
+            continue
+        specs.append(spec)
+    return specs
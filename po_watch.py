@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Watch-folder PO formatting
+
+Formats every PO file dropped into an inbox folder and writes the output to
+an outbox folder with the usual default names. Processed inputs are moved to
+inbox/processed (or inbox/failed if they could not be formatted). Names
+already taken in those folders get a -2, -3, ... suffix, and a file replaced
+while it was being formatted is formatted again rather than moved.
+
+On Linux the inbox is watched with inotify, which reports each file once its
+writer closes it; elsewhere the folder is polled and a file is picked up once
+its size and modification time stop changing. Files already in the inbox
+when the watcher starts are picked up the same way, as they may still be
+being copied.
+
+Usage: python po_formatter.py watch <inbox> --out <outbox> [--vendor auto]
+"""
+
+import argparse
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import po_batch
+import po_engine
+import po_trace
+
+
+# Seconds between scans when polling
+POLL_INTERVAL = 1.0
+
+# Seconds a file must go without new inotify events before it is queued,
+# for writers that close and reopen a file while copying it
+SETTLE_SECONDS = 1.0
+
+# Files queued per worker before the watcher stops taking new ones
+QUEUE_PER_WORKER = 4
+
+# Rejected rows listed per file; the rest are only counted
+MAX_REJECTED_SHOWN = 10
+
+# Sub-folders of the inbox that processed and failed inputs are moved to
+PROCESSED_DIR = 'processed'
+FAILED_DIR = 'failed'
+
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def init_worker():
+    """Worker initializer: leave Ctrl+C to the watcher, then load pandas"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    po_engine.preload()
+
+
+def is_po_file(name):
+    """PO input files, skipping hidden files and Office lock files (~$...)"""
+    return (name.lower().endswith(po_engine.INPUT_EXTENSIONS)
+            and not name.startswith(('.', '~$')))
+
+
+def scan_inbox(inbox):
+    """Names of the PO files currently in the inbox"""
+    with os.scandir(inbox) as entries:
+        return sorted(entry.name for entry in entries
+                      if entry.is_file() and is_po_file(entry.name))
+
+
+def file_signature(path):
+    """(size, modification time) of a file, or None if it is gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class InotifyWatcher:
+    """Reports files written or moved into a folder (Linux only)"""
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Closing a written file means the write is complete; moved-in
+        # files are complete already
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Cannot watch {path}")
+
+    def read_events(self, timeout):
+        """
+        Wait up to timeout seconds and return (names, overflow)
+
+        overflow is set when the kernel dropped events, in which case the
+        caller should scan the folder once to catch up.
+        """
+        names = []
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return names, overflow
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names, overflow
+
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif mask & IN_IGNORED:
+                raise OSError("Inbox folder was removed")
+            elif name and not mask & IN_ISDIR:
+                names.append(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Reports files in a folder once their size and modification time are
+    unchanged between two scans
+    """
+
+    def __init__(self, path, interval=POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.pending = {}     # name -> (size, mtime) at the last scan
+        self.reported = {}    # name -> (size, mtime) when reported
+
+    def read_events(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        names = []
+        current = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_po_file(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Removed while scanning
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                current[entry.name] = signature
+                if self.reported.get(entry.name) == signature:
+                    continue
+                if self.pending.get(entry.name) == signature:
+                    names.append(entry.name)
+                    self.reported[entry.name] = signature
+
+        self.pending = {name: sig for name, sig in current.items() if name not in names}
+        self.reported = {name: sig for name, sig in self.reported.items() if name in current}
+        return sorted(names), False
+
+    def close(self):
+        pass
+
+
+def make_watcher(inbox, poll=False):
+    """An inotify watcher where available, otherwise a polling one"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(inbox)
+        except (OSError, AttributeError):
+            # No inotify (e.g. some network file systems); fall back to polling
+            pass
+    return PollingWatcher(inbox)
+
+
+class WatchFolder:
+    """Feeds files reported by a watcher to a pool of formatting workers"""
+
+    def __init__(self, inbox, out_dir, vendor='auto', traxxas_template=False, workers=None,
+                 settle=SETTLE_SECONDS, consolidate=False, xref_path=None):
+        self.inbox = inbox
+        self.out_dir = out_dir
+        self.vendor = vendor
+        self.traxxas_template = traxxas_template
+        self.workers = workers or os.cpu_count() or 1
+        self.settle = settle
+        self.consolidate = consolidate
+        self.xref_path = xref_path
+        self.processed_dir = os.path.join(inbox, PROCESSED_DIR)
+        self.failed_dir = os.path.join(inbox, FAILED_DIR)
+
+        # Blocks the watcher once this many files are queued (back-pressure);
+        # unread inotify events wait in the kernel queue meanwhile
+        self.slots = threading.BoundedSemaphore(self.workers * QUEUE_PER_WORKER)
+        self.lock = threading.Lock()
+        self.in_flight = {}     # name -> its size and mtime when it was queued
+        self.changed = []       # names replaced while being formatted, to queue again
+        self.jobs = 0
+        self.counts = {'ok': 0, 'error': 0}
+        self.executor = None
+
+    def submit(self, name):
+        """Queue a file for formatting unless it is already queued"""
+        path = os.path.join(self.inbox, name)
+        with self.lock:
+            signature = file_signature(path)
+            if name in self.in_flight or not is_po_file(name) or signature is None:
+                return
+            self.in_flight[name] = signature
+            # Outputs are written under a name of their own until finished
+            # gives them their final one
+            suffix = po_batch.partial_suffix(self.jobs)
+            self.jobs += 1
+
+        self.slots.acquire()
+        future = self.executor.submit(po_trace.in_pool(po_batch.format_file), path, self.vendor,
+                                      self.out_dir, self.traxxas_template,
+                                      consolidate=self.consolidate, xref_path=self.xref_path,
+                                      suffix=suffix)
+        future.add_done_callback(lambda done: self.finished(name, done))
+
+    def take_changed(self):
+        """Names of the files to queue again because they changed while being formatted"""
+        with self.lock:
+            names, self.changed = self.changed, []
+        return names
+
+    def replaced(self, name, result):
+        """
+        Whether the file changed since it was queued; its output is then out
+        of date and removed, and archiving the file would lose the new version
+        """
+        current = file_signature(os.path.join(self.inbox, name))
+        if current is None or current == self.in_flight[name]:
+            return False
+        if result['output'] and os.path.exists(result['output']):
+            os.remove(result['output'])
+        print(f"CHANGED {name} was replaced while being formatted, formatting it again")
+        sys.stdout.flush()
+        return True
+
+    def report(self, name, result):
+        """Print the outcome of a file; returns the folder to archive it in"""
+        if result['status'] != 'ok':
+            print(f"ERROR {name}: {result['error']}")
+            return self.failed_dir
+
+        rejected = f", {result['rejected']} rejected" if result['rejected'] else ''
+        unmapped = f", {result['unmapped']} unmapped SKUs" if result['unmapped'] else ''
+        cached = ', cached' if result['cached'] else ''
+        print(f"OK    {name} -> {result['output']} "
+              f"({result['rows']} rows{rejected}{unmapped}{cached})")
+        for row in result['rejected_rows'][:MAX_REJECTED_SHOWN]:
+            print(f"      row {row['row']} ({row['sku']}): {row['reason']}, "
+                  f"got '{row['qty']}'")
+        if result['rejected'] > MAX_REJECTED_SHOWN:
+            print(f"      ... and {result['rejected'] - MAX_REJECTED_SHOWN} more")
+        if result['unmapped']:
+            skus = ', '.join(result['unmapped_skus'][:MAX_REJECTED_SHOWN])
+            more = ', ...' if result['unmapped'] > MAX_REJECTED_SHOWN else ''
+            print(f"      not in cross-reference: {skus}{more}")
+        return self.processed_dir
+
+    def finished(self, name, future):
+        path = os.path.join(self.inbox, name)
+        again = False
+        try:
+            try:
+                result = po_trace.collect(future.result())
+            except Exception as e:
+                # A worker process died
+                result = {'file': name, 'status': 'error', 'error': str(e), 'output': ''}
+
+            if self.replaced(name, result):
+                again = True
+                return
+
+            with self.lock:
+                po_batch.claim_output(result)
+            target_dir = self.report(name, result)
+            self.counts[result['status']] += 1
+
+            try:
+                with self.lock:
+                    os.replace(path, po_batch.free_path(os.path.join(target_dir, name)))
+            except OSError as e:
+                print(f"Could not move {name}: {str(e)}")
+            sys.stdout.flush()
+        finally:
+            with self.lock:
+                del self.in_flight[name]
+                if again:
+                    self.changed.append(name)
+            self.slots.release()
+
+    def submit_ready(self, waiting, now, settle):
+        """Queue the waiting files whose size and mtime held still until now"""
+        for name, (ready_at, signature) in list(waiting.items()):
+            if ready_at > now:
+                continue
+            current = file_signature(os.path.join(self.inbox, name))
+            if current is None:
+                del waiting[name]
+            elif current != signature:
+                # Still being written without new events; check again later
+                waiting[name] = (now + (settle or POLL_INTERVAL), current)
+            else:
+                del waiting[name]
+                self.submit(name)
+
+    def run(self, watcher):
+        """Process the files already in the inbox, then new ones until interrupted"""
+        for directory in (self.out_dir, self.processed_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=init_worker)
+        try:
+            if isinstance(watcher, PollingWatcher):
+                # It only reports files that stopped changing, including
+                # the ones already in the inbox
+                settle = 0
+                names = []
+            else:
+                # Files already in the inbox may still be being copied
+                settle = self.settle
+                names = scan_inbox(self.inbox)
+
+            waiting = {}    # name -> (time it can be queued, its size and mtime then)
+            while True:
+                now = time.monotonic()
+                for name in names:
+                    waiting[name] = (now + settle, file_signature(os.path.join(self.inbox, name)))
+                for name in self.take_changed():
+                    # The new version may still be being copied
+                    waiting[name] = (now + (settle or POLL_INTERVAL),
+                                     file_signature(os.path.join(self.inbox, name)))
+                self.submit_ready(waiting, now, settle)
+
+                timeout = POLL_INTERVAL
+                if waiting:
+                    next_ready = min(ready_at for ready_at, _ in waiting.values())
+                    timeout = min(max(next_ready - time.monotonic(), 0), POLL_INTERVAL)
+                names, overflow = watcher.read_events(timeout)
+                if overflow:
+                    # Events were lost during a burst; one scan catches up
+                    names = scan_inbox(self.inbox)
+        finally:
+            # Let queued files finish so none is left half-processed
+            self.executor.shutdown(wait=True)
+            watcher.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='po_formatter watch',
+        description='Format PO files as they are dropped into a folder'
+    )
+    parser.add_argument('inbox', help='Folder to watch for PO files')
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--vendor', default='auto',
+                        help="Vendor format, or 'auto' to detect it per file")
+    parser.add_argument('--traxxas-template', action='store_true',
+                        help='Use the Traxxas template format when color variants are found')
+    parser.add_argument('--consolidate', action='store_true',
+                        help='Merge repeated SKUs into one line with the summed quantity')
+    parser.add_argument('--xref', default=None,
+                        help='SKU cross-reference file (default: [Cross Reference] file in '
+                             'po_formatter.ini)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help='Seconds a file must stay unchanged before it is formatted '
+                             f'(default: {SETTLE_SECONDS})')
+    parser.add_argument('--poll', action='store_true',
+                        help='Poll the folder instead of using inotify')
+    po_trace.add_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        vendor = 'auto' if args.vendor == 'auto' else po_engine.resolve_vendor(args.vendor)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 2
+
+    if args.workers is not None and args.workers < 1:
+        print("Error: --workers must be at least 1")
+        return 2
+
+    if not os.path.isdir(args.inbox):
+        print(f"Error: {args.inbox} is not a directory")
+        return 2
+
+    if os.path.abspath(args.out) == os.path.abspath(args.inbox):
+        # CSV output written to the inbox would be picked up again
+        print("Error: --out must be a different folder than the inbox")
+        return 2
+
+    folder = WatchFolder(args.inbox, args.out, vendor, args.traxxas_template, args.workers,
+                         args.settle, args.consolidate, args.xref or po_engine.xref_file())
+    po_trace.start(args)
+    watcher = make_watcher(args.inbox, args.poll)
+    mode = 'polling' if isinstance(watcher, PollingWatcher) else 'inotify'
+    print(f"Watching {args.inbox} ({mode}), writing to {args.out} (Ctrl+C to stop)")
+    sys.stdout.flush()
+
+    try:
+        folder.run(watcher)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {str(e)}")
+        return 1
+    finally:
+        # Stages of the files formatted until the watcher stopped
+        po_trace.finish(args)
+
+    print(f"Stopped: {folder.counts['ok']} formatted, {folder.counts['error']} failed")
+    return 0
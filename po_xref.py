@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+SKU cross-reference index
+
+Maps internal item numbers to each vendor's part numbers, so POs exported
+with our own item numbers can be formatted without editing SKUs by hand.
+
+The cross-reference table is a CSV file or an SQLite database (table
+"xref", or its only table) with an Item column and one column of part
+numbers per vendor, named after the vendor or one of its aliases. A
+Vendor_SKU column applies to every vendor without a column of its own:
+
+    Item,Vendor_SKU,Traxxas,HRP
+    1001,V-1001,TRA5301,HRP-1001
+    1002,V-1002,,HRP-1002
+
+Blank cells fall back to Vendor_SKU. The table is loaded once into a hash
+index and loaded again only when the file's modification time or size
+changes.
+"""
+
+import os
+from contextlib import closing
+from pathlib import Path
+
+
+ITEM_COLUMN = 'Item'
+DEFAULT_COLUMN = 'Vendor_SKU'
+SQLITE_TABLE = 'xref'
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def sku_keys(skus):
+    """SKUs as lookup keys: text without surrounding spaces, 1001.0 as 1001"""
+    if skus.dtype.kind == 'f':
+        try:
+            # Item numbers read from Excel often come back as floats
+            skus = skus.astype('Int64')
+        except (TypeError, ValueError):
+            pass
+    return skus.astype(str).str.strip()
+
+
+def read_table(path):
+    """The cross-reference table as a DataFrame of strings"""
+    import pandas as pd
+
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        import sqlite3
+
+        # as_uri() escapes characters such as ? and # in the path; the
+        # connection's own context manager only commits, closing() closes it
+        uri = Path(path).absolute().as_uri() + '?mode=ro'
+        with closing(sqlite3.connect(uri, uri=True)) as connection:
+            tables = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+            if SQLITE_TABLE in tables:
+                table = SQLITE_TABLE
+            elif len(tables) == 1:
+                table = tables[0]
+            else:
+                raise ValueError(f"{path} has no '{SQLITE_TABLE}' table")
+            df = pd.read_sql_query(f'SELECT * FROM "{table}"', connection)
+        return df.astype(str).where(df.notna(), '')
+
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+class CrossReference:
+    """In-memory index of a cross-reference file, reloaded when it changes"""
+
+    def __init__(self, path, registry):
+        self.path = path
+        self.registry = registry
+        self.stamp = None
+        self.items = None
+        self.targets = {}
+
+    def refresh(self):
+        """Reload the table if the file changed since it was last read"""
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self.stamp:
+            self.load()
+            self.stamp = stamp
+        return self
+
+    def load(self):
+        import numpy as np
+        import pandas as pd
+
+        df = read_table(self.path)
+        columns = {str(column).strip().lower(): column for column in df.columns}
+        item_column = columns.get(ITEM_COLUMN.lower())
+        if item_column is None:
+            raise ValueError(f"Cross-reference file has no {ITEM_COLUMN} column: {self.path}")
+
+        # Later rows override earlier ones for the same item
+        df = df.drop_duplicates(subset=item_column, keep='last')
+        items = pd.Index(sku_keys(df[item_column]))
+
+        def part_numbers(column):
+            return df[column].astype(str).str.strip().to_numpy(dtype=object)
+
+        default_column = columns.get(DEFAULT_COLUMN.lower())
+        default = part_numbers(default_column) if default_column is not None else None
+
+        targets = {}
+        for name, column in columns.items():
+            if column in (item_column, default_column):
+                continue
+            try:
+                vendor = self.registry.resolve(name)
+            except ValueError:
+                # Other columns (descriptions, prices...) are ignored
+                continue
+            values = part_numbers(column)
+            if default is not None:
+                values = np.where(values == '', default, values)
+            targets[vendor] = values
+        if default is not None:
+            targets[None] = default
+
+        self.items = items
+        self.targets = targets
+
+    def map(self, skus, vendor):
+        """
+        The vendor's part numbers for a Series of SKUs, and the distinct
+        SKUs not in the table in first-seen order (these are kept as they are)
+        """
+        import numpy as np
+        import pandas as pd
+
+        values = self.targets.get(vendor, self.targets.get(None))
+        if values is None:
+            raise ValueError(f"Cross-reference file has no {vendor} or {DEFAULT_COLUMN} column")
+
+        # Look up each distinct SKU once; POs repeat SKUs far more often
+        # than the table changes size. Missing SKUs get code -1.
+        codes, uniques = pd.factorize(skus)
+        keys = sku_keys(pd.Series(uniques))
+        positions = self.items.get_indexer(keys)
+        found = positions >= 0
+        if len(values):
+            part_numbers = np.where(found, values[positions], '')
+        else:
+            part_numbers = np.full(len(uniques), '', dtype=object)
+        found &= part_numbers != ''
+
+        mapped = np.where(found, part_numbers, np.asarray(uniques, dtype=object))
+        # Code -1 picks the trailing NaN
+        mapped = np.append(mapped, np.nan).astype(object)
+        unmapped = keys[~found].tolist()
+        return pd.Series(mapped[codes], index=skus.index, dtype=object), unmapped
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Tests of batch mode (po_batch): file collection, result order, summaries,
+output naming and --split-po
+
+Run with: python -m pytest test_batch.py
+"""
+
+import os
+
+import pytest
+
+import po_batch
+
+
+FASTSERVE_HEADER = 'PO_NUMBER,ITEM_NUMBER,DESCRIPTION,QTY,UNIT_PRICE,TOTAL'
+
+
+def write_fastserve(path, rows):
+    """A FastServe export of (po_number, sku, qty) rows"""
+    lines = [FASTSERVE_HEADER] + [f'{po},{sku},Part,{qty},1.00,1.00' for po, sku, qty in rows]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def names(results):
+    return [os.path.basename(result['output']) for result in results]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_split_writes_one_output_per_po(tmp_path, workers):
+    source = write_fastserve(tmp_path / 'export.csv', [
+        (101, 'AAN1', 2), (102, 'AAN2', 3), (101, 'AAN3', 1), ('', 'AAN4', 5), (103, 'AAN5', 4),
+    ])
+    out = tmp_path / 'out'
+    out.mkdir()
+
+    results = po_batch.run_split([source], 'auto', str(out), workers=workers)
+
+    assert [result['status'] for result in results] == ['ok'] * 4
+    # In order of first appearance; rows without a PO number go under the file's
+    assert [result['po_number'] for result in results] == ['101', '102', 'export', '103']
+    assert [result['rows'] for result in results] == [2, 1, 1, 1]
+    assert read(results[0]['output']) == read(out / 'FastServe-101.txt')
+    assert sorted(os.listdir(out)) == sorted(names(results))
+    for result in results:
+        assert result['vendor'] == 'HorizonHobby/FastServe'
+        assert '.partial' not in result['output']
+
+
+def test_split_same_po_in_two_exports(tmp_path):
+    first = write_fastserve(tmp_path / 'a.csv', [(7, 'AAN1', 1), (8, 'AAN2', 1)])
+    second = write_fastserve(tmp_path / 'b.csv', [(7, 'AAN3', 2)])
+
+    results = po_batch.run_split([first, second], 'auto', str(tmp_path), workers=1)
+
+    assert names(results) == ['FastServe-7.txt', 'FastServe-8.txt', 'FastServe-7-2.txt']
+    assert [result['suffix'] for result in results] == ['', '', '-2']
+    assert 'AAN3' in read(results[2]['output'])
+    assert 'AAN1' in read(results[0]['output'])
+
+
+def test_split_unreadable_file(tmp_path):
+    source = tmp_path / 'broken.csv'
+    source.write_text('no,po,columns\n1,2,3\n')
+
+    results = po_batch.run_split([str(source)], 'auto', str(tmp_path), workers=1)
+
+    assert len(results) == 1
+    assert results[0]['status'] == 'error'
+    assert results[0]['suffix'] == ''
+
+
+def test_same_po_number_same_name_gets_suffix(tmp_path):
+    first = write_fastserve(tmp_path / 'PO55.csv', [(55, 'AAN1', 1)])
+    second = write_fastserve(tmp_path / '55.csv', [(55, 'AAN2', 2)])
+    out = tmp_path / 'out'
+    out.mkdir()
+
+    results = po_batch.run_batch([first, second], 'auto', str(out), workers=1)
+
+    assert names(results) == ['FastServe-55.txt', 'FastServe-55-2.txt']
+    assert 'AAN1' in read(results[0]['output'])
+    assert 'AAN2' in read(results[1]['output'])
+
+
+def test_same_po_number_different_vendors_keeps_names(tmp_path):
+    fastserve = write_fastserve(tmp_path / 'PO55.csv', [(55, 'AAN1', 1)])
+    traxxas = tmp_path / '55.csv'
+    traxxas.write_text('SKU,QTY\n1234,2\n')
+    out = tmp_path / 'out'
+    out.mkdir()
+
+    results = po_batch.run_batch([fastserve, str(traxxas)], 'auto', str(out), workers=1)
+
+    assert names(results) == ['FastServe-55.txt', '55_Traxxas.csv']
+    assert [result['suffix'] for result in results] == ['', '']
+    assert sorted(os.listdir(out)) == ['55_Traxxas.csv', 'FastServe-55.txt']
+
+
+def test_rerun_overwrites_earlier_outputs(tmp_path):
+    source = write_fastserve(tmp_path / 'PO9.csv', [(9, 'AAN1', 1)])
+    out = tmp_path / 'out'
+    out.mkdir()
+
+    po_batch.run_batch([source], 'auto', str(out), workers=1)
+    results = po_batch.run_batch([source], 'auto', str(out), workers=1)
+
+    assert results[0]['cached']
+    assert os.listdir(out) == ['FastServe-9.txt']
+
+
+def test_free_path(tmp_path):
+    path = tmp_path / 'FastServe-1.txt'
+    assert po_batch.free_path(str(path)) == str(path)
+    path.write_text('')
+    (tmp_path / 'FastServe-1-2.txt').write_text('')
+    assert po_batch.free_path(str(path)) == str(tmp_path / 'FastServe-1-3.txt')
+
+
+def test_collect_files(tmp_path):
+    for name in ('b.csv', 'A.xlsx', 'c.INV', 'notes.txt', 'd.xls'):
+        (tmp_path / name).write_text('')
+    (tmp_path / 'sub.csv').mkdir()
+
+    assert [os.path.basename(path) for path in po_batch.collect_files(str(tmp_path))] == [
+        'A.xlsx', 'b.csv', 'c.INV', 'd.xls'
+    ]
+    assert [os.path.basename(path) for path in
+            po_batch.collect_files(str(tmp_path / '*.csv'))] == ['b.csv']
+    assert po_batch.collect_files(str(tmp_path / 'missing')) == []
+
+
+def test_batch_results_in_input_order(tmp_path):
+    files = [
+        write_fastserve(tmp_path / 'PO3.csv', [(3, 'AAN3', 3)]),
+        str(tmp_path / 'PO1.csv'),
+        write_fastserve(tmp_path / 'PO2.csv', [(2, 'AAN2', 2), (2, 'AAN4', 'ten')]),
+    ]
+    (tmp_path / 'PO1.csv').write_text('Nothing,Useful\n1,2\n')
+    out = tmp_path / 'out'
+    out.mkdir()
+
+    results = po_batch.run_batch(files, 'auto', str(out), workers=1)
+
+    assert [result['file'] for result in results] == files
+    assert [result['status'] for result in results] == ['ok', 'error', 'ok']
+    assert 'Could not detect vendor' in results[1]['error']
+    assert [result['rows'] for result in results] == [1, 0, 1]
+    assert results[2]['rejected'] == 1
+
+
+def test_main_writes_summaries(tmp_path, capsys):
+    source = tmp_path / 'in'
+    source.mkdir()
+    write_fastserve(source / 'PO1.csv', [(1, 'AAN1', 1), (1, 'AAN2', '10 EA')])
+    (source / 'PO2.csv').write_text('Nothing,Useful\n1,2\n')
+    out = tmp_path / 'out'
+
+    code = po_batch.main([str(source), '--out', str(out), '--workers', '1'])
+
+    assert code == 1
+    printed = capsys.readouterr().out
+    assert 'Processed 2 files' in printed and '(1 failed)' in printed
+    summary = read(out / po_batch.SUMMARY_FILE).splitlines()
+    assert summary[0] == ','.join(po_batch.SUMMARY_COLUMNS)
+    assert [line.split(',')[3] for line in summary[1:]] == ['ok', 'error']
+    rejected = read(out / po_batch.REJECTED_FILE).splitlines()
+    # Rows are numbered as in the file, header first
+    assert rejected[1].endswith('PO1.csv,1,3,AAN2,10 EA,quantity is not a number')
+    assert sorted(os.listdir(out)) == sorted(['FastServe-1.txt', po_batch.SUMMARY_FILE,
+                                              po_batch.REJECTED_FILE])
+
+
+def test_main_arguments(tmp_path, capsys):
+    assert po_batch.main([str(tmp_path), '--out', str(tmp_path / 'out')]) == 1
+    assert 'No PO files' in capsys.readouterr().out
+    assert po_batch.main([str(tmp_path), '--out', str(tmp_path), '--vendor', 'nobody']) == 2
+    assert po_batch.main([str(tmp_path), '--out', str(tmp_path), '--workers', '0']) == 2
+
+
+def many_files(tmp_path, count=12):
+    return [write_fastserve(tmp_path / f'PO{index}.csv', [(index, f'AAN{index}', index + 1)])
+            for index in range(count)]
+
+
+def test_pool_matches_single_process(tmp_path):
+    files = many_files(tmp_path)
+    single = tmp_path / 'single'
+    pooled = tmp_path / 'pooled'
+    single.mkdir()
+    pooled.mkdir()
+
+    expected = po_batch.run_batch(files, 'auto', str(single), workers=1, use_cache=False)
+    results = po_batch.run_batch(files, 'auto', str(pooled), workers=3, use_cache=False)
+
+    assert [result['file'] for result in results] == files
+    assert names(results) == names(expected)
+    for result, single_result in zip(results, expected):
+        assert read(result['output']) == read(single_result['output'])
+
+
+def test_pool_sends_trace_stages_back(tmp_path, monkeypatch):
+    import po_trace
+
+    monkeypatch.setattr(po_trace, '_recorder', None)
+    po_trace.enable(memory=False)
+    files = many_files(tmp_path, 4)
+
+    po_batch.run_batch(files, 'auto', str(tmp_path), workers=2, use_cache=False)
+
+    stages = po_trace.events()
+    assert [event['name'] for event in stages].count('vendor detection') == 4
+    # Recorded in the workers, not in this process
+    assert os.getpid() not in {event['pid'] for event in stages}
+
+
+def test_split_files_share_one_pool(tmp_path, monkeypatch):
+    pools = []
+
+    class CountingPool(po_batch.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(po_batch, 'ProcessPoolExecutor', CountingPool)
+    files = [write_fastserve(tmp_path / f'export{index}.csv',
+                             [(index * 10 + po, f'AAN{po}', 1) for po in range(5)])
+             for index in range(3)]
+
+    results = po_batch.run_split(files, 'auto', str(tmp_path), workers=2)
+
+    assert len(pools) == 1
+    assert [result['po_number'] for result in results] == [
+        str(index * 10 + po) for index in range(3) for po in range(5)
+    ]
+    assert all(result['status'] == 'ok' for result in results)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests of the persistent caches (po_cache) and the engine's use of them
+
+Run with: python -m pytest test_cache.py
+"""
+
+import json
+import os
+
+import po_cache
+import po_engine
+
+
+FASTSERVE_COLUMNS = ['PO_NUMBER', 'ITEM_NUMBER', 'DESCRIPTION', 'QTY', 'UNIT_PRICE', 'TOTAL']
+
+
+def test_json_cache_persists_entries(tmp_path):
+    path = str(tmp_path / 'columns.json')
+    po_cache.JsonCache(path).put('a', {'vendor': 'Stephens'})
+
+    assert po_cache.JsonCache(path).get('a') == {'vendor': 'Stephens'}
+    assert po_cache.JsonCache(path).get('b') is None
+
+
+def test_json_cache_drops_least_recently_used(tmp_path):
+    path = str(tmp_path / 'columns.json')
+    cache = po_cache.JsonCache(path, max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    with open(path) as f:
+        assert json.load(f) == {'a': 1, 'c': 3}
+
+
+def test_json_cache_ignores_unreadable_and_unwritable_files(tmp_path):
+    (tmp_path / 'columns.json').write_text('not json')
+    cache = po_cache.JsonCache(str(tmp_path / 'columns.json'))
+    assert cache.get('a') is None
+
+    cache = po_cache.JsonCache(str(tmp_path / 'missing' / 'columns.json'))
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert not (tmp_path / 'missing').exists()
+
+
+def test_header_info_detects_once_per_layout(monkeypatch):
+    info = po_engine.header_info(FASTSERVE_COLUMNS)
+    assert info['load'] == ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']
+    assert info['sku_qty'] == ['ITEM_NUMBER', 'QTY']
+
+    def detect(columns):
+        raise AssertionError('detection ran again')
+
+    monkeypatch.setattr(po_engine, 'match_vendor_columns', detect)
+    assert po_engine.header_info(FASTSERVE_COLUMNS) == info
+    # The cache file is shared by later runs
+    reloaded = po_cache.JsonCache(po_engine.header_cache().path)
+    assert reloaded.get(po_engine.header_signature(FASTSERVE_COLUMNS)) == info
+
+
+def test_header_info_without_sku_qty_columns():
+    info = po_engine.header_info(['Part Name', 'Count'])
+
+    assert info['load'] is None
+    assert info['sku_qty'] is None and info['sku_qty_plain'] is None
+
+
+def test_header_signature_depends_on_names_types_and_rules(monkeypatch):
+    signature = po_engine.header_signature(['SKU', 'QTY'])
+
+    assert po_engine.header_signature(['SKU', 'QTY']) == signature
+    assert po_engine.header_signature(['QTY', 'SKU']) != signature
+    assert po_engine.header_signature([2024]) != po_engine.header_signature(['2024'])
+
+    # New detection rules must not reuse results cached under the old ones
+    monkeypatch.setattr(po_engine.vendor_registry(), 'detection_key', '[["Bin"], []]')
+    assert po_engine.header_signature(['SKU', 'QTY']) != signature
+
+
+def test_header_signature_depends_on_detection_version(monkeypatch):
+    signature = po_engine.header_signature(['SKU', 'QTY'])
+    monkeypatch.setattr(po_engine, 'DETECTION_VERSION', po_engine.DETECTION_VERSION + 1)
+
+    assert po_engine.header_signature(['SKU', 'QTY']) != signature
+
+
+def set_mtime(cache, key, mtime):
+    os.utime(cache.entry_path(key), (mtime, mtime))
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = po_cache.ResultCache(str(tmp_path / 'results'))
+    cache.put('k', {'vendor': 'Stephens', 'rows': 2}, b'A1\n2\n')
+
+    assert cache.lookup('k') == {'vendor': 'Stephens', 'rows': 2}
+    assert cache.read('k') == ({'vendor': 'Stephens', 'rows': 2}, b'A1\n2\n')
+    assert cache.copy_to('k', str(tmp_path / 'out.txt'))
+    assert (tmp_path / 'out.txt').read_bytes() == b'A1\n2\n'
+    assert cache.lookup('missing') is None
+    assert not cache.copy_to('missing', str(tmp_path / 'other.txt'))
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = po_cache.ResultCache(str(tmp_path / 'results'), max_bytes=400)
+    for index, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, {}, b'x' * 90)
+        set_mtime(cache, key, 1000 + index)
+
+    # A hit marks the entry as recently used, so 'b' is the oldest now
+    assert cache.lookup('a') == {}
+    cache.put('d', {}, b'x' * 90)
+    cache.put('e', {}, b'x' * 90)
+
+    assert cache.read('b') is None
+    assert [cache.lookup(key) for key in 'acde'] == [{}, {}, {}, {}]
+
+
+def test_result_cache_hits_when_touch_fails(tmp_path, monkeypatch):
+    cache = po_cache.ResultCache(str(tmp_path / 'results'))
+    cache.put('k', {'rows': 1}, b'A1\n1\n')
+
+    def read_only(*args, **kwargs):
+        raise PermissionError('read-only folder')
+
+    monkeypatch.setattr(os, 'utime', read_only)
+    assert cache.lookup('k') == {'rows': 1}
+    assert cache.read('k') == ({'rows': 1}, b'A1\n1\n')
+
+
+def test_result_cache_skips_oversized_entries(tmp_path):
+    cache = po_cache.ResultCache(str(tmp_path / 'results'), max_bytes=400)
+    cache.put('big', {}, b'x' * 101)
+    (tmp_path / 'big.txt').write_bytes(b'x' * 101)
+    cache.put_file('big file', {}, str(tmp_path / 'big.txt'))
+    cache.put_file('missing', {}, str(tmp_path / 'missing.txt'))
+
+    assert cache.lookup('big') is None
+    assert cache.lookup('big file') is None
+    assert cache.lookup('missing') is None
+
+
+def test_result_cache_disabled_at_zero(tmp_path):
+    cache = po_cache.ResultCache(str(tmp_path / 'results'), max_bytes=0)
+    cache.put('k', {}, b'A1\n1\n')
+
+    assert cache.lookup('k') is None
+    assert not (tmp_path / 'results').exists()
+
+
+def test_result_cache_size_from_settings(tmp_path):
+    config_file = tmp_path / 'po_formatter.ini'
+    config_file.write_text('[Cache]\nresults_mb = 0\ninputs_mb = many\n')
+
+    assert po_engine.cache_size_mb('results_mb', 256, str(config_file)) == 0
+    assert po_engine.cache_size_mb('inputs_mb', 512, str(config_file)) == 512
+    assert po_engine.cache_size_mb('results_mb', 256, str(tmp_path / 'missing.ini')) == 256
+
+
+def test_result_key_covers_the_formatting_choices():
+    key = po_engine.result_key('digest', 'Stephens', '17633')
+
+    assert po_engine.result_key('digest', 'Stephens', '17633') == key
+    assert len({
+        key,
+        po_engine.result_key('other', 'Stephens', '17633'),
+        po_engine.result_key('digest', 'auto', '17633'),
+        po_engine.result_key('digest', 'Stephens', '17634'),
+        po_engine.result_key('digest', 'Stephens', '17633', consolidate=True),
+    }) == 5
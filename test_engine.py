@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Checks that the fast paths of the engine give the same results as the
+plain pandas ones: streamed against in-memory formatting for every vendor,
+and column-pruned CSV loads against the full file. Also covers the
+quantity checks that decide which rows are rejected.
+
+Run with: python -m pytest test_engine.py
+"""
+
+import io
+
+import pandas as pd
+import pytest
+
+import po_engine
+
+
+# Covers duplicate SKUs, Traxxas prefixes and colors, numeric SKUs, an
+# invalid quantity and a float quantity
+FASTSERVE_ROWS = [
+    ('17633', 'TRA1234-RED', 'Body, red', '2', '9.99', '19.98'),
+    ('17633', 'AAN463', 'Nose', '1', '1.50', '1.50'),
+    ('17633', 'tra1234-RED', 'Body, red', '3', '9.99', '29.97'),
+    ('17633', '5566', 'Plain', '10 EA', '1', '10'),
+    ('17633', 'AAN463', 'Nose', '4.0', '1.50', '6.00'),
+    ('17633', '7788-SLV', 'Silver', '1', '2', '2'),
+]
+FASTSERVE_HEADER = 'PO_NUMBER,ITEM_NUMBER,DESCRIPTION,QTY,UNIT_PRICE,TOTAL'
+
+
+def write_csv(path, header, rows):
+    lines = [header] + [','.join(f'"{value}"' if ',' in value else value for value in row)
+                        for row in rows]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.fixture
+def fastserve_csv(tmp_path):
+    return write_csv(tmp_path / 'PO17633.csv', FASTSERVE_HEADER, FASTSERVE_ROWS)
+
+
+@pytest.fixture
+def sku_qty_csv(tmp_path):
+    rows = [(row[1], row[3]) for row in FASTSERVE_ROWS]
+    return write_csv(tmp_path / 'PO555.csv', 'Sku,Qty', rows)
+
+
+def in_memory(file_path, vendor, consolidate):
+    rejected = []
+    content = po_engine.format_po(po_engine.load_dataframe(file_path), vendor, '17633',
+                                  consolidate=consolidate, rejected=rejected)
+    return content, rejected
+
+
+def streamed(file_path, vendor, consolidate, chunksize=po_engine.CSV_CHUNK_ROWS, fast=True):
+    out = io.BytesIO()
+    rejected = []
+    rows = po_engine.stream_format_csv(file_path, vendor, '17633', out, chunksize,
+                                       consolidate=consolidate, rejected=rejected, fast=fast)
+    return out.getvalue(), rejected, rows
+
+
+@pytest.mark.parametrize('vendor', po_engine.vendor_names())
+@pytest.mark.parametrize('consolidate', [False, True])
+@pytest.mark.parametrize('chunksize', [1, 4, po_engine.CSV_CHUNK_ROWS])
+@pytest.mark.parametrize('layout', ['fastserve_csv', 'sku_qty_csv'])
+def test_streamed_matches_in_memory(request, layout, chunksize, consolidate, vendor):
+    file_path = request.getfixturevalue(layout)
+    expected, expected_rejected = in_memory(file_path, vendor, consolidate)
+    content, rejected, rows = streamed(file_path, vendor, consolidate, chunksize, fast=False)
+
+    assert content == expected
+    assert rejected == expected_rejected
+    # Rows are counted before duplicates are merged, as po_batch reports them
+    assert rows == len(FASTSERVE_ROWS) - len(rejected)
+
+
+@pytest.mark.parametrize('vendor', po_engine.vendor_names())
+def test_streamed_empty_file(tmp_path, vendor):
+    file_path = write_csv(tmp_path / 'PO1.csv', FASTSERVE_HEADER, [])
+    content, rejected, rows = streamed(file_path, vendor, False, fast=False)
+
+    assert content == in_memory(file_path, vendor, False)[0]
+    assert rows == 0
+
+
+def test_load_dataframe_reads_only_needed_columns(fastserve_csv):
+    df = po_engine.load_dataframe(fastserve_csv)
+
+    assert list(df.columns) == ['PO_NUMBER', 'ITEM_NUMBER', 'QTY']
+    # SKUs stay text, so numeric SKUs keep their form
+    assert df['ITEM_NUMBER'].tolist()[3] == '5566'
+
+
+@pytest.mark.parametrize('vendor', po_engine.vendor_names())
+def test_load_dataframe_progress_formats_the_same(fastserve_csv, monkeypatch, vendor):
+    expected = in_memory(fastserve_csv, vendor, False)
+    monkeypatch.setattr(po_engine, 'CSV_CHUNK_ROWS', 2)
+    reported = []
+
+    df = po_engine.load_dataframe(fastserve_csv, reported.append)
+
+    assert reported == [2, 4, 6]
+    # Chunks infer their own dtypes, so compare what gets written
+    rejected = []
+    content = po_engine.format_po(df, vendor, '17633', consolidate=False, rejected=rejected)
+    assert (content, rejected) == expected
+
+
+def test_unknown_layout_loads_every_column(tmp_path):
+    file_path = write_csv(tmp_path / 'PO1.csv', 'Part Name,Count,Notes', [('A', '1', 'x')])
+
+    assert list(po_engine.load_dataframe(file_path).columns) == ['Part Name', 'Count', 'Notes']
+
+
+def test_read_columns(fastserve_csv):
+    assert po_engine.read_columns(fastserve_csv) == FASTSERVE_HEADER.split(',')
+    assert po_engine.is_csv_file('PO1.INV') and not po_engine.is_csv_file('PO1.xlsx')
+
+
+def test_check_quantities_reasons():
+    df = pd.DataFrame({
+        'Sku': ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'],
+        'Qty': ['2', '', None, 'ten', '1.5', '0', '-3', ' 2.0 '],
+    })
+    rejected = []
+
+    checked = po_engine.check_quantities(df, rejected)
+
+    assert checked['Sku'].tolist() == ['A', 'H']
+    assert checked['Qty'].tolist() == [2, 2]
+    assert checked['Qty'].dtype == 'int64'
+    assert [(row['row'], row['sku'], row['qty'], row['reason']) for row in rejected] == [
+        (3, 'B', '', 'missing quantity'),
+        (4, 'C', '', 'missing quantity'),
+        (5, 'D', 'ten', 'quantity is not a number'),
+        (6, 'E', '1.5', 'quantity is not a whole number'),
+        (7, 'F', '0', 'quantity is not positive'),
+        (8, 'G', '-3', 'quantity is not positive'),
+    ]
+
+
+def test_check_quantities_numeric_column():
+    df = pd.DataFrame({'Sku': ['A', 'B', 'C'], 'Qty': [2.0, float('nan'), 4.0]})
+    rejected = []
+
+    checked = po_engine.check_quantities(df, rejected)
+
+    assert checked['Qty'].tolist() == [2, 4]
+    assert [(row['row'], row['reason']) for row in rejected] == [(3, 'missing quantity')]
+    # Valid frames keep their rows and only change the dtype
+    assert po_engine.check_quantities(df.iloc[[0, 2]])['Qty'].tolist() == [2, 4]
+
+
+def test_check_quantities_keeps_file_row_numbers():
+    # Rows already filtered out keep the numbers they had in the file
+    df = pd.DataFrame({'Sku': ['A', 'B'], 'Qty': ['1', 'x']}, index=[4, 9])
+    rejected = []
+
+    po_engine.check_quantities(df, rejected)
+
+    assert rejected[0]['row'] == 11
+
+
+def test_check_quantities_without_list_raises():
+    df = pd.DataFrame({'Sku': ['A', 'B', 'C'], 'Qty': ['x', '0', '1']})
+
+    with pytest.raises(ValueError, match=r"Invalid quantity 'x' for SKU A on row 2: "
+                                         r"quantity is not a number \(and 1 more\)"):
+        po_engine.check_quantities(df)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Tests of the column-pruned .xlsx reader (po_excel) against pd.read_excel
+
+Run with: python -m pytest test_excel.py
+"""
+
+import datetime
+import math
+import zipfile
+
+import pandas as pd
+import pytest
+
+import po_engine
+import po_excel
+
+
+def outcome(function, *args, **kwargs):
+    """What function returns, or its error message, so failures compare too"""
+    try:
+        return function(*args, **kwargs)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def write_xlsx(path, frame):
+    frame.to_excel(path, index=False)
+    return str(path)
+
+
+def write_sheet(path, rows_xml, shared=None, styles=None):
+    """A minimal workbook whose only sheet holds rows_xml (the <row> elements)"""
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rels = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/workbook.xml', (
+            f'<workbook xmlns="{main}" xmlns:r="{rels}"><sheets>'
+            '<sheet name="Orders" sheetId="1" r:id="rId7"/></sheets></workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<Relationships><Relationship Id="rId7" Target="worksheets/orders.xml"/>'
+            '</Relationships>'
+        ))
+        archive.writestr('xl/worksheets/orders.xml',
+                         f'<worksheet xmlns="{main}"><sheetData>{rows_xml}</sheetData></worksheet>')
+        if shared is not None:
+            items = ''.join(f'<si>{item}</si>' for item in shared)
+            archive.writestr('xl/sharedStrings.xml', f'<sst xmlns="{main}">{items}</sst>')
+        if styles is not None:
+            archive.writestr('xl/styles.xml', f'<styleSheet xmlns="{main}">{styles}</styleSheet>')
+    return str(path)
+
+
+def read_all(file_path):
+    return po_excel.read_xlsx_columns(file_path, lambda names: names)
+
+
+@pytest.mark.parametrize('frame', [
+    pd.DataFrame({
+        'PO_NUMBER': [17633, 17633, 17633, 17633],
+        'ITEM_NUMBER': ['TRA1234-RED', 5566, 'AAN463', None],
+        'DESCRIPTION': ['Body', 'Plain', None, 'Blank SKU'],
+        'QTY': [2, 1.5, 3, 4],
+        'UNIT_PRICE': [9.99, 1, 2.5, 3],
+        'TOTAL': [19.98, 1.5, 7.5, 12],
+    }),
+    pd.DataFrame({'Sku': ['A1', 'B2', 'C3'], 'Qty': [1, 2, 3], 'Note': ['x', 'y', 'z']}),
+    pd.DataFrame({'Sku': ['A1', '00123', 'ÄÖ'], 'Qty': ['1', '2', '3']}),
+    pd.DataFrame({'Sku': ['00123', '00456', 'NA'], 'Qty': [' 7', 'N/A', 2.5]}),
+], ids=['fastserve', 'sku qty', 'text quantities', 'numbers as text'])
+def test_excel_reader_matches_read_excel(tmp_path, frame):
+    file_path = write_xlsx(tmp_path / 'PO1.xlsx', frame)
+    # Raises UnsupportedWorkbook if the engine would fall back to pd.read_excel
+    columns, _ = po_excel.read_xlsx_columns(
+        file_path, lambda names: po_engine.header_info(names)['load']
+    )
+    fast = po_engine.load_excel_columns(file_path)
+    expected = pd.read_excel(file_path)[columns]
+
+    pd.testing.assert_frame_equal(fast, expected)
+    for vendor in po_engine.vendor_names():
+        assert (outcome(po_engine.format_po, fast, vendor, '1', rejected=[])
+                == outcome(po_engine.format_po, expected, vendor, '1', rejected=[]))
+
+
+def test_only_selected_columns_are_read(tmp_path):
+    file_path = write_xlsx(tmp_path / 'PO1.xlsx', pd.DataFrame({
+        'Note': ['a', 'b'], 'Qty': [1, 2], 'Sku': ['X1', 'X2'], 'Price': [1.5, 2.5],
+    }))
+    seen = []
+
+    def select(names):
+        seen.append(names)
+        return ['Sku', 'Qty']
+
+    columns, data = po_excel.read_xlsx_columns(file_path, select)
+
+    assert seen == [['Note', 'Qty', 'Sku', 'Price']]
+    assert columns == ['Sku', 'Qty']
+    assert data == [['X1', 'X2'], [1, 2]]
+
+
+def test_cell_types(tmp_path):
+    file_path = write_sheet(tmp_path / 'types.xlsx', (
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="inlineStr"><is><t>Qty</t></is></c>'
+        '<c r="C1" t="str"><v>Flag</v></c></row>'
+        '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="B2"><v>2.0</v></c>'
+        '<c r="C2" t="b"><v>1</v></c></row>'
+        '<row r="3"><c r="A3" t="e"><v>#N/A</v></c><c r="B3"><v>2.5</v></c>'
+        '<c r="C3" t="b"><v>0</v></c></row>'
+    ), shared=['<t>Sku</t>', '<r><t>AB</t></r><r><t>C</t></r><rPh><t>phonetic</t></rPh>'])
+
+    columns, data = read_all(file_path)
+
+    assert columns == ['Sku', 'Qty', 'Flag']
+    assert data[0][0] == 'ABC' and math.isnan(data[0][1])
+    assert data[1] == [2, 2.5] and type(data[1][0]) is int
+    assert data[2] == [True, False]
+
+
+def test_gaps_and_trailing_rows(tmp_path):
+    # Row 3 is missing from the XML, rows 5-6 only have empty cells
+    file_path = write_sheet(tmp_path / 'gaps.xlsx', (
+        '<row r="1"><c r="A1" t="inlineStr"><is><t>Sku</t></is></c>'
+        '<c r="C1" t="inlineStr"><is><t>Qty</t></is></c></row>'
+        '<row r="2"><c r="A2" t="inlineStr"><is><t>A</t></is></c><c r="C2"><v>1</v></c></row>'
+        '<row r="4"><c r="C4"><v>4</v></c></row>'
+        '<row r="5"><c r="A5" s="0"/></row><row r="6"/>'
+    ))
+
+    columns, data = read_all(file_path)
+
+    # Unnamed header cells are named like pd.read_excel names them
+    assert columns == ['Sku', 'Unnamed: 1', 'Qty']
+    assert len(data[0]) == 3
+    assert data[0][0] == 'A' and math.isnan(data[0][1]) and math.isnan(data[0][2])
+    assert data[2][0] == 1 and math.isnan(data[2][1]) and data[2][2] == 4
+
+
+def test_header_names():
+    assert po_excel.header_names(['Qty', None, 'Qty', po_excel.MISSING, 'Qty']) == [
+        'Qty', 'Unnamed: 1', 'Qty.1', 'Unnamed: 3', 'Qty.2'
+    ]
+
+
+def test_column_index():
+    assert [po_excel._column_index(ref) for ref in ('A1', 'z9', 'AA10', 'AB3')] == [0, 25, 26, 27]
+
+
+def test_header_only(tmp_path):
+    file_path = write_sheet(tmp_path / 'header.xlsx',
+                            '<row r="1"><c t="inlineStr"><is><t>Sku</t></is></c></row>')
+
+    assert read_all(file_path) == (['Sku'], [[]])
+
+
+HEADER = '<row r="1"><c r="A1" t="inlineStr"><is><t>Sku</t></is></c></row>'
+
+
+@pytest.mark.parametrize('rows_xml, styles, message', [
+    ('', None, 'Empty worksheet'),
+    ('<row r="2"><c r="A2"><v>1</v></c></row>', None, 'Missing header row'),
+    ('<row r="1"/><row r="2"><c r="A2"><v>1</v></c></row>', None, 'Missing header row'),
+    (HEADER + '<row r="2"><c r="A2" t="d"><v>2024-01-01</v></c></row>', None,
+     'Unsupported cell type'),
+    (HEADER + '<row r="2"><c r="A2" s="1"><v>45000</v></c></row>',
+     '<cellXfs count="2"><xf numFmtId="0"/><xf numFmtId="14"/></cellXfs>', 'Date values'),
+    (HEADER + '<row r="2"><c r="A2" s="1"><v>45000</v></c></row>',
+     '<numFmts><numFmt numFmtId="170" formatCode="yyyy-mm-dd"/></numFmts>'
+     '<cellXfs><xf numFmtId="0"/><xf numFmtId="170"/></cellXfs>', 'Date values'),
+    (HEADER + '<row r="2"><c r="A2" t="s"><v>5</v></c></row>', None, 'list index'),
+    (HEADER + '<row r="2"><c r="A2"><v>abc</v></c></row>', None, 'could not convert'),
+], ids=['empty', 'no row 1', 'blank row 1', 'cell type', 'builtin date', 'custom date',
+        'bad shared string', 'bad number'])
+def test_unsupported_sheets(tmp_path, rows_xml, styles, message):
+    file_path = write_sheet(tmp_path / 'odd.xlsx', rows_xml, shared=[], styles=styles)
+
+    with pytest.raises(po_excel.UnsupportedWorkbook, match=message):
+        read_all(file_path)
+
+
+def test_needed_columns_not_found(tmp_path):
+    file_path = write_sheet(tmp_path / 'cols.xlsx', HEADER)
+
+    with pytest.raises(po_excel.UnsupportedWorkbook, match='Needed columns'):
+        po_excel.read_xlsx_columns(file_path, lambda names: None)
+
+
+def test_not_a_workbook(tmp_path):
+    path = tmp_path / 'PO1.xlsx'
+    path.write_text('Sku,Qty\n')
+
+    with pytest.raises(po_excel.UnsupportedWorkbook):
+        read_all(str(path))
+
+
+def test_sheet_path_fallback(tmp_path):
+    path = tmp_path / 'bare.xlsx'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/worksheets/sheet1.xml', f'<worksheet><sheetData>{HEADER}</sheetData></worksheet>')
+
+    with zipfile.ZipFile(path) as archive:
+        assert po_excel._first_sheet_path(archive) == 'xl/worksheets/sheet1.xml'
+    assert read_all(str(path)) == (['Sku'], [[]])
+
+
+def test_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(po_excel, 'PROGRESS_ROWS', 2)
+    file_path = write_xlsx(tmp_path / 'PO1.xlsx', pd.DataFrame({'Sku': list('abcde'), 'Qty': range(5)}))
+    reported = []
+
+    po_excel.read_xlsx_columns(file_path, lambda names: names, reported.append)
+
+    assert reported == [1, 3, 5]
+
+
+def test_dates_outside_needed_columns(tmp_path):
+    frame = pd.DataFrame({'Sku': ['A1', 'B2'], 'Qty': [1, 2],
+                          'Due': [datetime.datetime(2024, 1, 2)] * 2})
+    file_path = write_xlsx(tmp_path / 'PO1.xlsx', frame)
+
+    # Only a needed date column sends the read to pd.read_excel
+    with pytest.raises(po_excel.UnsupportedWorkbook, match='Date values'):
+        read_all(file_path)
+    pd.testing.assert_frame_equal(po_engine.load_excel_columns(file_path),
+                                  pd.read_excel(file_path)[['Sku', 'Qty']])
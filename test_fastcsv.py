@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Checks that po_fastcsv, which copies text vendors' output from the file
+bytes, writes exactly what the pandas CSV path writes, including for the
+inputs it hands back to pandas.
+
+Run with: python -m pytest test_fastcsv.py
+"""
+
+import io
+
+import pytest
+
+import po_engine
+
+
+FASTSERVE_EXPORT = (
+    'PO_NUMBER,ITEM_NUMBER,DESCRIPTION,QTY,UNIT_PRICE,TOTAL\n'
+    '17633,TRA1234-RED,"Body, red",2,9.99,19.98\n'
+    '17633,AAN463,Nose,1,1.50,1.50\n'
+    '17633,5566,Plain,10 EA,1,10\n'
+    '17633,AAN463,Nose,4.0,1.50,6.00\n'
+)
+
+FASTCSV_CASES = {
+    'plain': 'SKU,QTY\nA1,2\nB2,3\n',
+    'no final newline': 'SKU,QTY\nA1,2\nB2,3',
+    'crlf': 'SKU,QTY\r\nA1,2\r\nB2,3\r\n',
+    'blank lines': 'SKU,QTY\n\nA1,2\n\nB2,3\n\n',
+    'quoted other column': 'SKU,DESC,QTY\nA1,"x, ""y""\nz",2\nB2,"",3\n',
+    'quoted sku': 'SKU,QTY\n"A1",2\n',
+    'NA sku': 'SKU,QTY\nNA,2\nB2,3\n',
+    'float quantity': 'SKU,QTY\nA1,2.0\n',
+    'invalid quantity': 'SKU,QTY\nA1,10 EA\nB,2\n',
+    'leading zeros': 'SKU,QTY\nA1,007\n',
+    'spaces': 'SKU,QTY\n A1 ,2\n',
+    'utf-8': 'SKU,DESC,QTY\nÄ1,é,2\n',
+    'header only': 'SKU,QTY\n',
+    'quantity first': 'QTY,SKU\n2,A1\r\n3,B2\r\n',
+    'fastserve export': FASTSERVE_EXPORT,
+}
+
+TEXT_VENDORS = [name for name in po_engine.vendor_names()
+                if po_engine.vendor_format(name).type == 'text']
+
+
+def streamed(file_path, vendor, fast):
+    """Output, rejected rows and row count, or the error message"""
+    out = io.BytesIO()
+    rejected = []
+    try:
+        rows = po_engine.stream_format_csv(file_path, vendor, '17633', out,
+                                           rejected=rejected, fast=fast)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return out.getvalue(), rejected, rows
+
+
+@pytest.mark.parametrize('vendor', TEXT_VENDORS)
+@pytest.mark.parametrize('case', list(FASTCSV_CASES))
+def test_fastcsv_matches_pandas(tmp_path, case, vendor):
+    file_path = tmp_path / 'PO7.csv'
+    file_path.write_bytes(FASTCSV_CASES[case].encode('utf-8'))
+
+    assert (streamed(str(file_path), vendor, fast=True)
+            == streamed(str(file_path), vendor, fast=False))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Tests of the local formatting service (po_server)
+
+Run with: python -m pytest test_server.py
+"""
+
+import asyncio
+import builtins
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import po_batch
+import po_server
+
+
+PO_CSV = b'Sku,Qty\nAAN1,2\nAAN2,10 EA\nAAN3,1\n'
+
+
+def run_request(server, raw):
+    """Send raw bytes to a running server and return (status, headers, body)"""
+    async def scenario():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    response = asyncio.run(scenario())
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return int(lines[0].split()[1]), headers, body
+
+
+def post(target, body, content_type=None, length=None):
+    head = [f'POST {target} HTTP/1.1', 'Host: localhost',
+            f'Content-Length: {len(body) if length is None else length}']
+    if content_type:
+        head.append(f'Content-Type: {content_type}')
+    return ('\r\n'.join(head) + '\r\n\r\n').encode() + body
+
+
+def multipart(parts, boundary='po-boundary'):
+    """A multipart/form-data body of (name, filename, data) parts"""
+    body = b'preamble to ignore\r\n'
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        body += (f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n').encode()
+        body += data + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    return f'multipart/form-data; boundary="{boundary}"', body
+
+
+@pytest.fixture
+def server():
+    server = po_server.FormatServer(workers=1, max_upload_mb=1)
+    server.executor = ThreadPoolExecutor(max_workers=1)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def expected(tmp_path):
+    """What batch mode writes for PO_CSV with the Stephens format"""
+    path = tmp_path / 'PO77.csv'
+    path.write_bytes(PO_CSV)
+    out = tmp_path / 'expected'
+    out.mkdir()
+    result = po_batch.format_file(str(path), 'Stephens', str(out), use_cache=False)
+    with open(result['output'], 'rb') as f:
+        return f.read()
+
+
+def test_health(server):
+    status, headers, body = run_request(server, b'GET /health HTTP/1.1\r\n\r\n')
+
+    assert status == 200
+    assert 'Stephens' in json.loads(body)['vendors']
+
+
+def test_raw_upload(server, expected):
+    status, headers, body = run_request(
+        server, post('/format?vendor=stephens&filename=PO77.csv', PO_CSV)
+    )
+
+    assert status == 200
+    assert body == expected
+    assert headers['x-po-vendor'] == 'Stephens'
+    assert headers['x-po-number'] == '77'
+    assert headers['x-po-rows'] == '2'
+    assert headers['x-po-rejected'] == '1'
+    assert headers['x-po-rejected-rows'] == '3'
+    assert headers['content-disposition'] == "attachment; filename*=UTF-8''77_Stephens.txt"
+
+
+def test_multipart_upload(server, expected):
+    # The form fields may come after the file
+    content_type, body = multipart([
+        ('file', 'PO77.csv', PO_CSV),
+        ('vendor', None, b'stephens'),
+    ])
+    status, headers, response = run_request(server, post('/format', body, content_type))
+
+    assert status == 200
+    assert response == expected
+    assert headers['x-po-vendor'] == 'Stephens'
+
+
+def test_multipart_boundary_across_chunks(server, monkeypatch):
+    monkeypatch.setattr(po_server, 'STREAM_CHUNK', 7)
+    content_type, body = multipart([
+        ('note', None, b'\r\n--po-boundar'),
+        ('file', 'PO5.csv', PO_CSV),
+        ('vendor', None, b'Stephens'),
+        ('po_number', None, b'555'),
+    ])
+    status, headers, _ = run_request(server, post('/format', body, content_type))
+
+    assert status == 200
+    assert headers['x-po-number'] == '555'
+
+
+def test_parse_multipart_keeps_file_bytes(tmp_path):
+    # Text that starts like the boundary but is not one stays in the file
+    data = b'SKU,QTY\r\n--po-boundar,1\r\n\r\n-\r\n--\r\n'
+    content_type, body = multipart([('po_number', None, b' 9 '), ('file', 'a.csv', data)])
+
+    fields, filename = po_server.parse_multipart(content_type, io.BytesIO(body),
+                                                 str(tmp_path / 'upload'))
+
+    assert fields == {'po_number': ['9']}
+    assert filename == 'a.csv'
+    assert (tmp_path / 'upload').read_bytes() == data
+
+
+@pytest.mark.parametrize('content_type, body', [
+    multipart([('vendor', None, b'stephens')]),
+    ('multipart/form-data', b'--x\r\n\r\nno boundary\r\n--x--\r\n'),
+    ('multipart/form-data; boundary=x', b'--x\r\nContent-Disposition: form-data; name="file"'
+                                        b'\r\n\r\nnever closed'),
+], ids=['no file', 'no boundary', 'truncated'])
+def test_malformed_multipart(server, content_type, body):
+    status, _, response = run_request(server, post('/format', body, content_type))
+
+    assert status == 400
+    assert 'error' in json.loads(response)
+
+
+def test_upload_limits(server):
+    status, _, _ = run_request(server, post('/format?filename=a.csv', b'', length=2 * 1024 * 1024))
+    assert status == 413
+
+    status, _, _ = run_request(server, b'POST /format HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n')
+    assert status == 411
+
+    status, _, _ = run_request(server, post('/format?filename=a.pdf', b'x'))
+    assert status == 400
+
+
+def test_unformattable_upload(server):
+    status, _, body = run_request(server, post('/format?filename=PO1.csv', b'Nothing,Useful\n1,2\n'))
+
+    assert status == 422
+    assert 'error' in json.loads(body)
+
+
+def test_failure_after_head_closes_connection(server, monkeypatch):
+    def failing_open(path, mode='r', *args, **kwargs):
+        if str(path).endswith('_Stephens.txt') and 'r' in mode:
+            raise OSError("disk went away")
+        return builtins.open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(po_server, 'open', failing_open, raising=False)
+    status, headers, body = run_request(
+        server, post('/format?vendor=stephens&filename=PO77.csv', PO_CSV)
+    )
+
+    # One response only, cut short, rather than a 500 appended to the 200
+    assert status == 200
+    assert len(body) < int(headers['content-length'])
+    assert b'HTTP/1.1' not in body
+
+
+def test_text_header():
+    headers = {}
+    po_server.text_header(headers, 'X-PO-Vendor', 'Stephens')
+    po_server.text_header(headers, 'X-Other', 'Hobby Käse')
+
+    assert headers == {'X-PO-Vendor': 'Stephens', 'X-Other*': "UTF-8''Hobby%20K%C3%A4se"}
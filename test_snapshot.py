@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests of columnar snapshots (po_snapshot) and the input cache that stores
+them (po_cache.InputCache)
+
+Run with: python -m pytest test_snapshot.py
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import po_cache
+import po_engine
+import po_snapshot
+
+
+def sample_frame():
+    return pd.DataFrame({
+        'Sku': ['A1', 1001, 2.5, None, True, 'Äö', '', pd.NA],
+        'Qty': [1, 2, 3, 4, 5, 6, 7, 8],
+        'Price': [1.5, np.nan, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+        'Rush': [True, False] * 4,
+        'Due': pd.date_range('2024-01-01', periods=8),
+        'Note': pd.Series(['x', None, 'z', 'w', 'v', 'u', 't', 's'], dtype='string'),
+    })
+
+
+def round_trip(df):
+    layout, buffers = po_snapshot.encode(df)
+    data = b''.join(buffer.view('uint8').tobytes() for buffer in buffers)
+    return po_snapshot.decode(layout, data)
+
+
+def test_round_trip_keeps_types():
+    df = sample_frame()
+    back = round_trip(df)
+
+    pd.testing.assert_frame_equal(back, df)
+    assert [type(value) for value in back['Sku'][:5]] == [str, int, float, type(None), bool]
+    assert back['Sku'][7] is pd.NA
+
+
+def test_empty_frame():
+    df = pd.DataFrame({'Sku': pd.Series([], dtype=object), 'Qty': pd.Series([], dtype='int64')})
+
+    pd.testing.assert_frame_equal(round_trip(df), df)
+
+
+@pytest.mark.parametrize('df, message', [
+    (pd.DataFrame([[1, 2]], columns=['Qty', 'Qty']), 'unique'),
+    (pd.DataFrame({'Sku': ['A']}, index=[5]), 'default index'),
+    (pd.DataFrame({0: ['A']}), 'text'),
+    (pd.DataFrame(index=range(2)), 'no columns'),
+    (pd.DataFrame({'Sku': [2 ** 70]}), 'too large'),
+    (pd.DataFrame({'Sku': [b'raw']}), 'bytes'),
+    (pd.DataFrame({'Sku': pd.Categorical(['a'])}), 'category'),
+])
+def test_unsupported_frames(df, message):
+    with pytest.raises(po_snapshot.Unsupported, match=message):
+        po_snapshot.encode(df)
+
+
+def test_decode_rejects_repeated_names():
+    layout, buffers = po_snapshot.encode(pd.DataFrame({'Qty': [1], 'Sku': [2]}))
+    layout['columns'][1]['name'] = 'Qty'
+
+    with pytest.raises(ValueError, match='repeated'):
+        po_snapshot.decode(layout, b''.join(buffer.tobytes() for buffer in buffers))
+
+
+def test_decode_rejects_other_versions():
+    layout, buffers = po_snapshot.encode(pd.DataFrame({'Qty': [1]}))
+    layout['version'] = po_snapshot.FORMAT_VERSION + 1
+
+    with pytest.raises(ValueError):
+        po_snapshot.decode(layout, buffers[0].tobytes())
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return po_cache.InputCache(str(tmp_path / 'inputs'), 16 * 1024 * 1024)
+
+
+def test_input_cache_round_trip(cache):
+    df = sample_frame()
+    cache.put_frame('key', df)
+
+    back = cache.get_frame('key')
+
+    pd.testing.assert_frame_equal(back, df)
+    # Numeric columns are views of the mapped entry, writable without changing it
+    assert not back['Qty'].to_numpy().flags.owndata
+    back.loc[0, 'Qty'] = 99
+    assert cache.get_frame('key')['Qty'][0] == 1
+
+
+def test_input_cache_misses(cache, tmp_path):
+    assert cache.get_frame('missing') is None
+
+    # Frames a snapshot cannot hold are left out
+    cache.put_frame('repeated', pd.DataFrame([[1, 2]], columns=['Qty', 'Qty']))
+    assert cache.get_frame('repeated') is None
+
+    cache.put_frame('cut', sample_frame())
+    path = cache.entry_path('cut')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 8)
+    assert cache.get_frame('cut') is None
+
+
+def test_input_cache_off(tmp_path):
+    cache = po_cache.InputCache(str(tmp_path / 'inputs'), 0)
+    cache.put_frame('key', sample_frame())
+
+    assert cache.get_frame('key') is None
+    assert not os.path.exists(tmp_path / 'inputs')
+
+
+def test_load_cached_dataframe(tmp_path, monkeypatch):
+    path = tmp_path / 'PO1.xlsx'
+    pd.DataFrame({'Sku': ['A1', 'B2'], 'Qty': [1, 2]}).to_excel(path, index=False)
+    first = po_engine.load_cached_dataframe(str(path))
+    load_dataframe = po_engine.load_dataframe
+
+    def no_read(*args, **kwargs):
+        raise AssertionError("read the workbook again")
+
+    monkeypatch.setattr(po_engine, 'load_dataframe', no_read)
+    pd.testing.assert_frame_equal(po_engine.load_cached_dataframe(str(path)), first)
+
+    # A changed file is read again
+    monkeypatch.setattr(po_engine, 'load_dataframe', load_dataframe)
+    pd.DataFrame({'Sku': ['C3'], 'Qty': [3]}).to_excel(path, index=False)
+    os.utime(path, ns=(0, 10 ** 18))
+    assert po_engine.load_cached_dataframe(str(path))['Sku'].tolist() == ['C3']
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests of the declarative vendor formats (po_vendors)
+
+Run with: python -m pytest test_vendors.py
+"""
+
+import io
+import json
+
+import pandas as pd
+import pytest
+
+import po_vendors
+
+
+COUNTED = {
+    'name': 'Counted',
+    'aliases': ['counted'],
+    'type': 'text',
+    'header': ['PO {po_number}', 'LINES {count}'],
+    'trailer': ['{end_marker}'],
+    'end_marker': 'DONE',
+    'sku_transforms': ['strip_tra', 'upper'],
+}
+
+WAREHOUSE = {
+    'name': 'Warehouse',
+    'type': 'csv',
+    'delimiter': ';',
+    'detect_columns': ['Sku', 'Qty', 'Bin'],
+    'detect_extensions': ['.whs'],
+    'columns': [
+        {'name': 'Part', 'source': 'sku'},
+        {'name': 'Count', 'source': 'qty'},
+        {'name': 'Site', 'value': 'MAIN'},
+    ],
+}
+
+
+def po_frame():
+    return pd.DataFrame({'Sku': ['tra123', 'b7', 'TRA123', 'c9'], 'Qty': [2, 1, '3.0', 'ten']})
+
+
+def stream(vendor_format, frames, consolidate=False):
+    out = io.BytesIO()
+    rejected = []
+    rows = vendor_format.stream(iter(frames), '42', out, consolidate, rejected)
+    return out.getvalue(), rows, rejected
+
+
+def test_text_spec_with_count_in_header():
+    vendor_format = po_vendors.VendorFormat(COUNTED)
+    rejected = []
+
+    content = vendor_format.format(po_frame(), '42', rejected=rejected)
+
+    assert content == b'PO 42\nLINES 3\n123\n2\nB7\n1\n123\n3\nDONE'
+    assert [row['sku'] for row in rejected] == ['c9']
+
+
+@pytest.mark.parametrize('consolidate', [False, True])
+def test_streamed_spec_matches_in_memory(consolidate):
+    vendor_format = po_vendors.VendorFormat(COUNTED)
+    frame = po_frame()
+    expected = vendor_format.format(frame, '42', consolidate=consolidate, rejected=[])
+
+    # One row per chunk, so the count is only known after the last one
+    content, rows, rejected = stream(vendor_format, [frame[i:i + 1] for i in range(len(frame))],
+                                     consolidate)
+
+    assert content == expected
+    assert rows == 3
+    assert len(rejected) == 1
+
+
+def test_streamed_count_spills_to_disk(monkeypatch):
+    monkeypatch.setattr(po_vendors, 'SPOOL_BYTES', 8)
+    vendor_format = po_vendors.VendorFormat(COUNTED)
+
+    content, rows, _ = stream(vendor_format, [po_frame()])
+
+    assert content == vendor_format.format(po_frame(), '42', rejected=[])
+
+
+def test_csv_spec():
+    vendor_format = po_vendors.VendorFormat(WAREHOUSE)
+
+    content = vendor_format.format(po_frame(), '42', consolidate=True, rejected=[])
+
+    assert content.decode().splitlines() == ['Part;Count;Site', 'tra123;2;MAIN', 'b7;1;MAIN',
+                                             'TRA123;3;MAIN']
+    assert vendor_format.output_name('42') == '42_Warehouse.csv'
+
+
+def test_registry_lookups():
+    registry = po_vendors.VendorRegistry(po_vendors.BUILTIN_SPECS + [COUNTED, WAREHOUSE])
+
+    assert registry.resolve(' COUNTED ') == 'Counted'
+    assert registry.resolve('Warehouse') == 'Warehouse'
+    assert registry.match_columns(['Sku', 'Qty', 'Bin']) == 'Warehouse'
+    assert registry.match_columns(['Sku', 'Qty']) is None
+    assert registry.match_extension('order.WHS') == 'Warehouse'
+    with pytest.raises(ValueError):
+        registry.resolve('nobody')
+
+
+def test_later_spec_replaces_earlier():
+    replacement = dict(WAREHOUSE, delimiter=',')
+    registry = po_vendors.VendorRegistry([WAREHOUSE, replacement])
+
+    assert registry.names() == ['Warehouse']
+    assert registry.get('Warehouse').delimiter == ','
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'type': 'text'}, 'missing a name'),
+    ({'name': 'X', 'type': 'xml'}, 'type must be'),
+    ({'name': 'X', 'type': 'text', 'filename': '{po}.txt'}, 'unknown placeholder {po}'),
+    ({'name': 'X', 'type': 'text', 'header': ['{po_number']}, 'bad template'),
+    ({'name': 'X', 'type': 'text', 'aliases': 'x'}, 'aliases must be a list'),
+    ({'name': 'X', 'type': 'text', 'sku_transforms': ['title']}, 'unknown SKU transform'),
+    ({'name': 'X', 'type': 'csv'}, 'need columns'),
+    ({'name': 'X', 'type': 'csv', 'columns': [{'name': 'V', 'source': 'variant'}]},
+     'need split_color'),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(ValueError, match=message):
+        po_vendors.VendorFormat(spec)
+
+
+def test_load_specs_skips_broken_files(tmp_path, capsys):
+    (tmp_path / 'b_counted.json').write_text(json.dumps(COUNTED))
+    (tmp_path / 'a_broken.json').write_text('{"name": "Broken", "type": "pdf"}')
+    (tmp_path / 'c_not_json.json').write_text('{')
+    (tmp_path / 'notes.txt').write_text('ignored')
+
+    specs = po_vendors.load_specs(str(tmp_path))
+
+    assert specs == po_vendors.BUILTIN_SPECS + [COUNTED]
+    errors = capsys.readouterr().err
+    assert 'a_broken.json' in errors and 'c_not_json.json' in errors
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Tests of watch-folder mode (po_watch)
+
+Run with: python -m pytest test_watch.py
+"""
+
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import po_watch
+
+
+def write_po(path, skus):
+    path.write_text('Sku,Qty\n' + ''.join(f'{sku},1\n' for sku in skus))
+    return path
+
+
+class ManualExecutor:
+    """Runs submitted jobs only when the test says so"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, function, *args, **kwargs):
+        future = Future()
+        self.jobs.append((future, function, args, kwargs))
+        return future
+
+    def run_next(self):
+        future, function, args, kwargs = self.jobs.pop(0)
+        future.set_result(function(*args, **kwargs))
+
+
+class ScriptedWatcher:
+    """Reports nothing and stops the watcher once done() is true"""
+
+    def __init__(self, done, timeout=30):
+        self.done = done
+        self.deadline = time.monotonic() + timeout
+
+    def read_events(self, timeout):
+        time.sleep(min(timeout, 0.05))
+        if self.done() or time.monotonic() > self.deadline:
+            raise KeyboardInterrupt
+        return [], False
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def folder(tmp_path):
+    inbox = tmp_path / 'inbox'
+    out = tmp_path / 'out'
+    for directory in (inbox, out, inbox / po_watch.PROCESSED_DIR, inbox / po_watch.FAILED_DIR):
+        directory.mkdir()
+    folder = po_watch.WatchFolder(str(inbox), str(out), vendor='Stephens', workers=1, settle=0)
+    folder.executor = ManualExecutor()
+    return folder
+
+
+def test_is_po_file():
+    assert po_watch.is_po_file('PO1.xlsx')
+    assert po_watch.is_po_file('po1.CSV')
+    assert not po_watch.is_po_file('~$PO1.xlsx')
+    assert not po_watch.is_po_file('.PO1.csv')
+    assert not po_watch.is_po_file('notes.txt')
+
+
+def test_formatted_file_is_archived(folder, tmp_path):
+    write_po(tmp_path / 'inbox' / 'PO1.csv', ['AAN1'])
+
+    folder.submit('PO1.csv')
+    folder.executor.run_next()
+
+    assert os.listdir(tmp_path / 'out') == ['1_Stephens.txt']
+    assert os.listdir(tmp_path / 'inbox' / 'processed') == ['PO1.csv']
+    assert folder.counts == {'ok': 1, 'error': 0}
+    assert folder.in_flight == {}
+
+
+def test_failed_file_goes_to_failed(folder, tmp_path):
+    (tmp_path / 'inbox' / 'PO2.csv').write_text('Nothing,Useful\n1,2\n')
+
+    folder.submit('PO2.csv')
+    folder.executor.run_next()
+
+    assert os.listdir(tmp_path / 'out') == []
+    assert os.listdir(tmp_path / 'inbox' / 'failed') == ['PO2.csv']
+    assert folder.counts == {'ok': 0, 'error': 1}
+
+
+def test_file_queued_once_while_in_flight(folder, tmp_path):
+    write_po(tmp_path / 'inbox' / 'PO1.csv', ['AAN1'])
+
+    folder.submit('PO1.csv')
+    folder.submit('PO1.csv')
+
+    assert len(folder.executor.jobs) == 1
+
+
+def test_file_replaced_while_formatting_is_queued_again(folder, tmp_path):
+    po = write_po(tmp_path / 'inbox' / 'PO1.csv', ['OLD1'])
+    folder.submit('PO1.csv')
+    # A new version dropped under the same name before the first is done
+    write_po(po, ['NEW1', 'NEW2'])
+    folder.submit('PO1.csv')
+    folder.executor.run_next()
+
+    # Neither the stale output is kept nor the new upload archived
+    assert os.listdir(tmp_path / 'out') == []
+    assert os.listdir(tmp_path / 'inbox' / 'processed') == []
+    assert po.exists()
+    assert folder.take_changed() == ['PO1.csv']
+    assert folder.take_changed() == []
+
+    folder.submit('PO1.csv')
+    folder.executor.run_next()
+    assert 'NEW2' in (tmp_path / 'out' / '1_Stephens.txt').read_text()
+    assert os.listdir(tmp_path / 'inbox' / 'processed') == ['PO1.csv']
+
+
+def test_names_already_taken_get_suffixes(folder, tmp_path):
+    for skus in (['FIRST'], ['SECOND']):
+        write_po(tmp_path / 'inbox' / 'PO1.csv', skus)
+        folder.submit('PO1.csv')
+        folder.executor.run_next()
+
+    assert sorted(os.listdir(tmp_path / 'out')) == ['1_Stephens-2.txt', '1_Stephens.txt']
+    assert 'FIRST' in (tmp_path / 'out' / '1_Stephens.txt').read_text()
+    assert 'SECOND' in (tmp_path / 'out' / '1_Stephens-2.txt').read_text()
+    processed = tmp_path / 'inbox' / 'processed'
+    assert sorted(os.listdir(processed)) == ['PO1-2.csv', 'PO1.csv']
+    assert 'SECOND' in (processed / 'PO1-2.csv').read_text()
+
+
+def test_polling_watcher_reports_unchanged_files(tmp_path):
+    watcher = po_watch.PollingWatcher(str(tmp_path), interval=0)
+    po = write_po(tmp_path / 'PO1.csv', ['AAN1'])
+
+    # Reported once its size and mtime are the same on two scans
+    assert watcher.read_events(0) == ([], False)
+    assert watcher.read_events(0) == (['PO1.csv'], False)
+    assert watcher.read_events(0) == ([], False)
+
+    write_po(po, ['AAN1', 'AAN2'])
+    assert watcher.read_events(0) == ([], False)
+    assert watcher.read_events(0) == (['PO1.csv'], False)
+
+
+def test_run_formats_files_already_in_the_inbox(tmp_path):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    write_po(inbox / 'PO1.csv', ['AAN1'])
+    write_po(inbox / 'PO2.csv', ['AAN2'])
+    (inbox / '~$PO3.xlsx').write_text('lock file')
+    out = tmp_path / 'out'
+    folder = po_watch.WatchFolder(str(inbox), str(out), vendor='Stephens', workers=1, settle=0.1)
+
+    processed = inbox / po_watch.PROCESSED_DIR
+    with pytest.raises(KeyboardInterrupt):
+        folder.run(ScriptedWatcher(lambda: len(os.listdir(processed)) == 2))
+
+    assert sorted(os.listdir(out)) == ['1_Stephens.txt', '2_Stephens.txt']
+    assert sorted(os.listdir(processed)) == ['PO1.csv', 'PO2.csv']
+    assert os.listdir(inbox / po_watch.FAILED_DIR) == []
+    assert folder.counts == {'ok': 2, 'error': 0}
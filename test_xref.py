@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests of the SKU cross-reference index (po_xref) for CSV and SQLite tables
+
+Run with: python -m pytest test_xref.py
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+import po_engine
+import po_xref
+
+
+XREF_CSV = 'Item,Vendor_SKU,Traxxas,HRP,Notes\n1001,V-1001,TRA5301,HRP-1001,x\n1002,V-1002,,HRP-1002,\n'
+
+
+def write_sqlite(path, tables):
+    with closing(sqlite3.connect(path)) as connection:
+        for table, rows in tables.items():
+            connection.execute(f'CREATE TABLE "{table}" (Item, Vendor_SKU, Traxxas)')
+            connection.executemany(f'INSERT INTO "{table}" VALUES (?, ?, ?)', rows)
+        connection.commit()
+    return str(path)
+
+
+def mapped(xref, skus, vendor):
+    values, unmapped = xref.map(pd.Series(skus, dtype=object), vendor)
+    return values.tolist(), unmapped
+
+
+@pytest.fixture
+def xref_csv(tmp_path):
+    path = tmp_path / 'xref.csv'
+    path.write_text(XREF_CSV)
+    return str(path)
+
+
+def test_csv_vendor_columns_and_fallback(xref_csv):
+    xref = po_xref.CrossReference(xref_csv, po_engine.vendor_registry()).refresh()
+
+    assert mapped(xref, ['1001', '1002', ' 1001 '], 'Traxxas') == (['TRA5301', 'V-1002', 'TRA5301'], [])
+    assert mapped(xref, ['1002'], 'HRP') == (['HRP-1002'], [])
+    # Vendors without a column of their own use Vendor_SKU
+    assert mapped(xref, ['1001'], 'Stephens') == (['V-1001'], [])
+
+
+def test_unmapped_skus_are_kept(xref_csv):
+    xref = po_xref.CrossReference(xref_csv, po_engine.vendor_registry()).refresh()
+
+    values, unmapped = mapped(xref, ['9', '1001', '8', '9', None], 'Traxxas')
+
+    assert values[:4] == ['9', 'TRA5301', '8', '9']
+    assert pd.isna(values[4])
+    assert unmapped == ['9', '8']
+
+
+def test_float_item_numbers_match(xref_csv):
+    xref = po_xref.CrossReference(xref_csv, po_engine.vendor_registry()).refresh()
+
+    values, _ = xref.map(pd.Series([1001.0, 1002.0]), 'HRP')
+
+    assert values.tolist() == ['HRP-1001', 'HRP-1002']
+
+
+def test_table_without_item_or_vendor_column(tmp_path):
+    path = tmp_path / 'xref.csv'
+    path.write_text('Part,Traxxas\n1,T1\n')
+    with pytest.raises(ValueError, match='no Item column'):
+        po_xref.CrossReference(str(path), po_engine.vendor_registry()).refresh()
+
+    path.write_text('Item,Traxxas\n1,T1\n')
+    xref = po_xref.CrossReference(str(path), po_engine.vendor_registry()).refresh()
+    with pytest.raises(ValueError, match='no HRP or Vendor_SKU column'):
+        mapped(xref, ['1'], 'HRP')
+
+
+def test_reloaded_when_the_file_changes(xref_csv):
+    xref = po_engine.cross_reference(xref_csv)
+    assert mapped(xref, ['1003'], 'Traxxas') == (['1003'], ['1003'])
+
+    with open(xref_csv, 'a') as f:
+        f.write('1003,V-1003,TRA5303,,\n')
+
+    assert po_engine.cross_reference(xref_csv) is xref
+    assert mapped(xref, ['1003'], 'Traxxas') == (['TRA5303'], [])
+
+
+def test_sqlite_xref_table(tmp_path):
+    path = write_sqlite(tmp_path / 'parts.db', {
+        'xref': [(1001, 'V-1001', 'TRA5301'), (1002, 'V-1002', None)],
+        'other': [(1001, 'X', 'X')],
+    })
+    xref = po_xref.CrossReference(path, po_engine.vendor_registry()).refresh()
+
+    assert mapped(xref, ['1001', '1002'], 'Traxxas') == (['TRA5301', 'V-1002'], [])
+
+
+def test_sqlite_only_table(tmp_path):
+    # Characters that mean something in a URI are escaped
+    path = write_sqlite(tmp_path / 'parts #1?.sqlite', {'items': [('1001', 'V-1001', 'TRA5301')]})
+    xref = po_xref.CrossReference(path, po_engine.vendor_registry()).refresh()
+
+    assert mapped(xref, ['1001'], 'Traxxas') == (['TRA5301'], [])
+
+
+def test_sqlite_several_tables_without_xref(tmp_path):
+    path = write_sqlite(tmp_path / 'parts.db', {'a': [], 'b': []})
+
+    with pytest.raises(ValueError, match="no 'xref' table"):
+        po_xref.read_table(path)
+
+
+def test_sqlite_opened_read_only(tmp_path):
+    with pytest.raises(sqlite3.OperationalError):
+        po_xref.read_table(str(tmp_path / 'missing.db'))
+    assert not os.path.exists(tmp_path / 'missing.db')
+
+
+def test_map_skus_lists_each_unmapped_sku_once(xref_csv):
+    xref = po_engine.cross_reference(xref_csv)
+    unmapped = []
+    chunks = [pd.DataFrame({'Sku': ['1001', '7'], 'Qty': [1, 2]}),
+              pd.DataFrame({'Sku': ['7', '8'], 'Qty': [3, 4]})]
+
+    frames = [po_engine.map_skus(chunk, 'Traxxas', xref, unmapped) for chunk in chunks]
+
+    assert [frame['Sku'].tolist() for frame in frames] == [['TRA5301', '7'], ['7', '8']]
+    assert unmapped == ['7', '8']